@@ -137,6 +137,8 @@ chown $API_USER:$API_USER $API_DIR
 log "Copying API files..."
 if [[ -f "simple-rag-api/rag_api.py" ]]; then
     cp -r simple-rag-api/* $API_DIR/
+    # Modules shared with the main RAG system
+    cp rag-system/scripts/embedding_cache.py rag-system/scripts/lexical_index.py $API_DIR/
 else
     # Download from repository if files not present
     warn "API files not found locally. Please ensure simple-rag-api/ directory exists"
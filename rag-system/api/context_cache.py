@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Context memoization for the RAG API
+Assembled /context responses per normalized patient profile, valid for one index generation
+"""
+
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_CACHE_SIZE = int(os.getenv("CONTEXT_CACHE_SIZE", "512"))
+CONTEXT_CACHE_TTL = float(os.getenv("CONTEXT_CACHE_TTL", "3600"))
+
+
+def normalize_profile_value(value: Any) -> str:
+    """Lowercase, trimmed, single-spaced form of a profile field"""
+    return re.sub(r"\s+", " ", str(value or "")).strip().lower()
+
+
+def profile_key(motor_type: int, objective: str, activity_level: str, specific_request: str) -> Tuple:
+    """Key of a context build: motor type, objective, activity level and a digest of the request text"""
+    digest = hashlib.sha256(specific_request.encode("utf-8")).hexdigest()[:16] if specific_request else ""
+    return motor_type, objective, activity_level, digest
+
+
+class ContextCache:
+    """LRU of assembled contexts keyed by ``profile_key``.
+
+    An entry is returned only for the generation it was built against and for at most
+    ``ttl`` seconds, so a reindex (here or in another process) makes every profile
+    rebuild against the new index on its next request.
+    """
+
+    def __init__(self, max_entries: int = CONTEXT_CACHE_SIZE, ttl: float = CONTEXT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self._entries: "OrderedDict[Tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple, generation: int) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, entry_generation, expires_at = entry
+                if entry_generation == generation and expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expired += 1
+            self.misses += 1
+            return None
+
+    def put(self, key: Tuple, value: Any, generation: int):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, generation, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expired": self.expired
+        }
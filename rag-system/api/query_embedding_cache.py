@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Query embedding cache for the RAG API
+Maps normalized query text to its embedding in Redis, stored as raw float32 bytes
+"""
+
+import os
+import hashlib
+import logging
+import threading
+from typing import Callable, Dict, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+QUERY_EMBEDDING_TTL = int(os.getenv("QUERY_EMBEDDING_TTL", str(7 * 24 * 3600)))
+# Little-endian float32, independent of the host byte order
+VECTOR_DTYPE = np.dtype("<f4")
+
+
+def normalize_query(query: str) -> str:
+    """Case and whitespace differences don't change the cached embedding"""
+    return " ".join(query.lower().split())
+
+
+class QueryEmbeddingCache:
+    """Redis cache of query embeddings, independent of n_results and filters.
+
+    Keys are ``qemb:{model}:{sha256(normalized query)}`` so a model change never reads
+    vectors from another embedding space. Values are the vector's raw bytes (4 bytes
+    per dimension instead of a JSON float list), so the client must not decode
+    responses. Redis errors degrade to computing the embeddings.
+    """
+
+    def __init__(self, client, model_name: str, ttl: int = QUERY_EMBEDDING_TTL):
+        self.client = client
+        self.model_name = model_name
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def key(self, query: str) -> str:
+        digest = hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+        return f"qemb:{self.model_name}:{digest}"
+
+    def embed(self, queries: List[str], compute: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """Embeddings for ``queries``, calling ``compute`` once for the normalized texts not in Redis"""
+        keys = [self.key(query) for query in queries]
+        try:
+            blobs = self.client.mget(keys)
+        except Exception as e:
+            logger.warning(f"Query embedding cache read error: {e}")
+            blobs = [None] * len(keys)
+            with self._lock:
+                self.errors += 1
+
+        vectors = [np.frombuffer(blob, dtype=VECTOR_DTYPE).tolist() if blob else None for blob in blobs]
+        with self._lock:
+            self.hits += sum(1 for vector in vectors if vector is not None)
+            self.misses += sum(1 for vector in vectors if vector is None)
+
+        missing = list(dict.fromkeys(
+            normalize_query(query) for query, vector in zip(queries, vectors) if vector is None
+        ))
+        if not missing:
+            return vectors
+
+        computed = dict(zip(missing, compute(missing)))
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for text, vector in computed.items():
+                pipe.setex(self.key(text), self.ttl, np.asarray(vector, dtype=VECTOR_DTYPE).tobytes())
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Query embedding cache write error: {e}")
+            with self._lock:
+                self.errors += 1
+
+        return [
+            vector if vector is not None else list(computed[normalize_query(query)])
+            for query, vector in zip(queries, vectors)
+        ]
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
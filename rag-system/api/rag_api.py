@@ -4,31 +4,44 @@ RAG API for Nutrition Bot
 FastAPI service for semantic search in nutrition knowledge base + Telegram integration
 """
 
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import os
 import json
+import signal
+import asyncio
 import logging
 import hashlib
-from typing import List, Dict, Optional
+import functools
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, TYPE_CHECKING
 from datetime import datetime, timedelta
 
-import uvicorn
-import redis
 from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel, Field
 
-# Import our custom RAG indexer
+# Our modules; the RAG indexer (chromadb, tiktoken, openai), redis and the Telegram
+# handler are imported during startup instead of at module load
 import sys
 sys.path.append('/app/scripts')
 sys.path.append('/app/api')
-from rag_indexer import NutritionRAGIndexer
+from reindex_jobs import ReindexJobRunner, JobAlreadyRunning
+from query_embedding_cache import QueryEmbeddingCache
+from semantic_cache import SemanticCache
+from search_cache import SearchResultCache
+from single_flight import SingleFlight
+from response_cache import ResponseCache, listen_for_invalidations
+from context_cache import ContextCache, normalize_profile_value, profile_key
 
-# Import Telegram handler
-try:
-    from telegram_webhook import TelegramBot, TelegramUpdate
-except ImportError:
-    TelegramBot = None
-    TelegramUpdate = None
+if TYPE_CHECKING:
+    import redis
+    import redis.asyncio
+    from rag_indexer import NutritionRAGIndexer
+    from telegram_webhook import TelegramBot
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -50,16 +63,69 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Search and stats run on a bounded thread pool so a slow query never blocks the event loop
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", str(min(32, (os.cpu_count() or 1) * 4))))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "64"))
+
 # Global variables
-rag_indexer: Optional[NutritionRAGIndexer] = None
-redis_client: Optional[redis.Redis] = None
-telegram_bot: Optional[TelegramBot] = None
+rag_indexer: Optional["NutritionRAGIndexer"] = None
+# Sync client for the Telegram bot and worker threads, async pool for request handlers
+redis_client: Optional["redis.Redis"] = None
+redis_async: Optional["redis.asyncio.Redis"] = None
+redis_async_binary: Optional["redis.asyncio.Redis"] = None
+# Same server without response decoding, for binary values (query embeddings)
+redis_binary: Optional["redis.Redis"] = None
+search_cache: Optional[SearchResultCache] = None
+# In-process coalescing of identical searches (the Redis lock covers other processes)
+search_flights = SingleFlight()
+# L1 in front of search_cache: serialized /search responses, kept coherent through Redis pub/sub
+response_cache = ResponseCache()
+invalidation_listener: Optional[asyncio.Task] = None
+search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search")
+event_loop: Optional[asyncio.AbstractEventLoop] = None
+telegram_bot: Optional["TelegramBot"] = None
+reindex_runner: Optional[ReindexJobRunner] = None
+# Results of recent queries, reused for near-identical ones (per process)
+semantic_cache = SemanticCache()
+# Modes that always embed the query; lexical and auto may answer without an embedding
+SEMANTIC_CACHE_MODES = ("vector", "hybrid")
+# Assembled /context responses per patient profile, and the profiles built ahead of time
+context_cache = ContextCache()
+context_flights = SingleFlight()
+CONTEXT_PRECOMPUTE = os.getenv("CONTEXT_PRECOMPUTE", "true").lower() == "true"
+# Options offered by the Telegram bot; motor 3 depends on free text and is built on demand
+CONTEXT_MOTOR_TYPES = (1, 2)
+CONTEXT_OBJECTIVES = ("-1kg", "-0.5kg", "mantener", "+0.5kg", "+1kg")
+CONTEXT_ACTIVITY_LEVELS = ("sedentario", "ligero", "moderado", "intenso", "atleta")
+
+# Startup runs in the background; /ready flips once the index is loaded and warm
+index_ready = False
+startup_task: Optional[asyncio.Task] = None
+# Redis and the index are retried with exponential backoff before the process gives up and exits
+STARTUP_RETRIES = int(os.getenv("STARTUP_RETRIES", "5"))
+STARTUP_RETRY_SECONDS = float(os.getenv("STARTUP_RETRY_SECONDS", "2"))
+startup_report: Dict = {
+    "imports": {"rag_api": round(time.perf_counter() - _IMPORT_STARTED, 4)},
+    "phases": {},
+    "errors": {},
+    "started_at": None,
+    "ready_at": None,
+    "total_seconds": None
+}
 
 # Pydantic models
 class SearchRequest(BaseModel):
     query: str = Field(..., min_length=1, max_length=500, description="Search query")
     n_results: int = Field(5, ge=1, le=20, description="Number of results to return")
     category_filter: Optional[str] = Field(None, description="Filter by category")
+    mode: Optional[str] = Field(
+        None,
+        pattern="^(vector|hybrid|auto|lexical)$",
+        description="Retrieval mode (defaults to RAG_SEARCH_MODE)"
+    )
+    meal_type: Optional[str] = Field(None, description="Recipe meal type (desayuno, almuerzo, merienda, cena, general)")
+    difficulty: Optional[str] = Field(None, pattern="^(facil|moderado|dificil)$", description="Recipe difficulty")
+    max_prep_minutes: Optional[int] = Field(None, ge=1, description="Maximum recipe preparation time in minutes")
     use_cache: bool = Field(True, description="Use cached results if available")
 
 class SearchResult(BaseModel):
@@ -84,72 +150,231 @@ class ContextResponse(BaseModel):
     recommendations: List[str]
     relevant_sources: List[str]
 
+class ReindexRequest(BaseModel):
+    full: bool = Field(False, description="Rebuild every file instead of only changed ones")
+
 class HealthResponse(BaseModel):
     status: str
     timestamp: str
     components: Dict[str, bool]
 
 # Dependency injection
-def get_rag_indexer() -> NutritionRAGIndexer:
+def get_rag_indexer() -> "NutritionRAGIndexer":
     if rag_indexer is None:
+        if startup_report["total_seconds"] is None:
+            raise HTTPException(status_code=503, detail="RAG indexer is still loading")
         raise HTTPException(status_code=500, detail="RAG indexer not initialized")
     return rag_indexer
 
-def get_redis_client() -> redis.Redis:
+def get_redis_client() -> "redis.Redis":
     if redis_client is None:
         raise HTTPException(status_code=500, detail="Redis client not available")
     return redis_client
 
-def get_telegram_bot() -> TelegramBot:
+def get_search_cache() -> SearchResultCache:
+    if search_cache is None:
+        raise HTTPException(status_code=500, detail="Redis client not available")
+    return search_cache
+
+def get_reindex_runner() -> ReindexJobRunner:
+    if reindex_runner is None:
+        raise HTTPException(status_code=500, detail="Reindex runner not initialized")
+    return reindex_runner
+
+def get_telegram_bot() -> "TelegramBot":
     if telegram_bot is None:
         raise HTTPException(status_code=500, detail="Telegram bot not initialized")
     return telegram_bot
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize services on startup"""
-    global rag_indexer, redis_client, telegram_bot
-    
+def _timed_import(name: str):
+    """Import a module, recording how long its first import took"""
+    already_loaded = name in sys.modules
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    if not already_loaded:
+        startup_report["imports"][name] = round(time.perf_counter() - started, 4)
+    return module
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking indexer call on the search thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(search_executor, functools.partial(func, *args, **kwargs))
+
+async def _run_phase(name: str, phase):
+    """Run a startup phase (blocking ones in a worker thread) and time it"""
+    started = time.perf_counter()
     try:
-        # Initialize Redis
-        redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
-        redis_client = redis.from_url(redis_url, decode_responses=True)
-        redis_client.ping()
-        logger.info("Redis connection established")
-        
-        # Initialize RAG indexer
-        data_path = "/app/data"
-        embeddings_path = "/app/embeddings"
-        openai_api_key = os.getenv("OPENAI_API_KEY")
-        
-        if not openai_api_key:
-            raise ValueError("OPENAI_API_KEY not set")
-        
-        rag_indexer = NutritionRAGIndexer(data_path, embeddings_path, openai_api_key)
-        logger.info("RAG indexer initialized")
-        
-        # Test the indexer
-        stats = rag_indexer.get_stats()
-        logger.info(f"Knowledge base stats: {stats}")
-        
-        # Initialize Telegram Bot
-        telegram_token = os.getenv("TELEGRAM_BOT_TOKEN")
-        if telegram_token:
-            telegram_bot = TelegramBot(telegram_token, redis_client)
-            logger.info("Telegram bot initialized")
-        else:
-            logger.warning("TELEGRAM_BOT_TOKEN not set - Telegram functionality disabled")
-        
+        if asyncio.iscoroutinefunction(phase):
+            return await phase()
+        return await asyncio.to_thread(phase)
     except Exception as e:
-        logger.error(f"Startup error: {e}")
-        raise e
+        startup_report["errors"][name] = str(e)
+        logger.error(f"Startup phase {name} failed: {e}")
+        raise
+    finally:
+        startup_report["phases"][name] = round(time.perf_counter() - started, 4)
+
+async def _run_required_phase(name: str, phase):
+    """Run a phase the API can't serve without, retrying it with exponential backoff"""
+    for attempt in range(1, STARTUP_RETRIES + 1):
+        try:
+            result = await _run_phase(name, phase)
+            startup_report["errors"].pop(name, None)
+            return result
+        except Exception:
+            if attempt >= STARTUP_RETRIES:
+                raise
+            delay = STARTUP_RETRY_SECONDS * 2 ** (attempt - 1)
+            logger.warning(f"Retrying startup phase {name} in {delay:g}s (attempt {attempt + 1}/{STARTUP_RETRIES})")
+            await asyncio.sleep(delay)
+
+def _connect_redis():
+    global redis_client, redis_async, redis_async_binary, redis_binary, search_cache
+    redis = _timed_import("redis")
+    redis_asyncio = _timed_import("redis.asyncio")
+    redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+    client = redis.from_url(redis_url, decode_responses=True)
+    client.ping()
+    redis_client = client
+    redis_binary = redis.from_url(redis_url)
+    # Connections are opened lazily on the event loop and shared by every request
+    redis_async = redis_asyncio.Redis(connection_pool=redis_asyncio.ConnectionPool.from_url(
+        redis_url, decode_responses=True, max_connections=REDIS_MAX_CONNECTIONS
+    ))
+    redis_async_binary = redis_asyncio.Redis(connection_pool=redis_asyncio.ConnectionPool.from_url(
+        redis_url, max_connections=REDIS_MAX_CONNECTIONS
+    ))
+    search_cache = SearchResultCache(redis_async, redis_async_binary)
+    logger.info("Redis connection established")
+
+def _load_indexer():
+    global rag_indexer, reindex_runner
+    data_path = "/app/data"
+    embeddings_path = "/app/embeddings"
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    
+    if not openai_api_key:
+        raise ValueError("OPENAI_API_KEY not set")
+    
+    indexer = _timed_import("rag_indexer").NutritionRAGIndexer(data_path, embeddings_path, openai_api_key)
+    rag_indexer = indexer
+    reindex_runner = ReindexJobRunner(indexer, on_complete=_after_reindex)
+    logger.info("RAG indexer initialized")
+
+def _after_reindex(summary: Dict):
+    # Only entries holding changed or deleted chunks go; the rest stay valid for the new generation.
+    # Runs in the reindex thread, the async Redis pool belongs to the event loop
+    if event_loop is None:
+        return
+    if search_cache is not None:
+        asyncio.run_coroutine_threadsafe(
+            search_cache.invalidate(summary.get("changed_chunk_ids"), summary["generation"]), event_loop
+        ).result(timeout=60)
+    if CONTEXT_PRECOMPUTE:
+        # Memoized contexts belong to the previous generation; rebuild the common ones
+        future = asyncio.run_coroutine_threadsafe(_precompute_contexts(), event_loop)
+        future.add_done_callback(
+            lambda f: not f.cancelled() and f.exception() and logger.warning(f"Context precompute failed: {f.exception()}")
+        )
+
+def _warm_index():
+    # Loads the embedding model and touches the active index before traffic arrives
+    rag_indexer.warm_up()
+    stats = rag_indexer.get_stats()
+    logger.info(f"Knowledge base stats: {stats}")
+
+def _setup_telegram():
+    global telegram_bot
+    telegram_token = os.getenv("TELEGRAM_BOT_TOKEN")
+    if not telegram_token:
+        logger.warning("TELEGRAM_BOT_TOKEN not set - Telegram functionality disabled")
+        return
+    try:
+        telegram_webhook = _timed_import("telegram_webhook")
+    except ImportError as e:
+        logger.warning(f"Telegram handler unavailable: {e}")
+        return
+    telegram_bot = telegram_webhook.TelegramBot(telegram_token, redis_client)
+    logger.info("Telegram bot initialized")
+
+def _attach_query_embedding_cache():
+    # Queries are embedded once no matter which n_results or filters they come with
+    rag_indexer.query_embedding_cache = QueryEmbeddingCache(redis_binary, _timed_import("rag_indexer").EMBEDDING_MODEL)
+    logger.info("Query embedding cache enabled")
+
+async def _initialize():
+    """Connect Redis, load the index and set up Telegram concurrently"""
+    global index_ready
+    started = time.perf_counter()
+
+    redis_phase = asyncio.create_task(_run_required_phase("redis", _connect_redis))
+
+    async def index_phases():
+        await _run_required_phase("indexer", _load_indexer)
+        await _run_required_phase("warmup", _warm_index)
+
+    async def telegram_phase():
+        # The bot keeps its sessions in Redis
+        await redis_phase
+        await _run_phase("telegram", _setup_telegram)
+
+    async def listener_phase():
+        # Start before any search can fill the response cache
+        global invalidation_listener
+        await redis_phase
+        invalidation_listener = asyncio.create_task(listen_for_invalidations(redis_async, response_cache))
+
+    async def cache_phase():
+        # Needs both Redis and the indexer; searches before this just skip the cache
+        await asyncio.gather(redis_phase, indexer_phase)
+        await _run_phase("query_embedding_cache", _attach_query_embedding_cache)
+
+    async def context_phase():
+        # Common profiles are served from memory from the first request
+        await indexer_phase
+        if CONTEXT_PRECOMPUTE:
+            await _run_phase("contexts", _precompute_contexts)
+
+    indexer_phase = asyncio.ensure_future(index_phases())
+    results = await asyncio.gather(
+        redis_phase, indexer_phase, telegram_phase(), listener_phase(), cache_phase(), context_phase(),
+        return_exceptions=True
+    )
+    index_ready = not any(isinstance(result, Exception) for result in results[:2])
+    if index_ready:
+        startup_report["ready_at"] = datetime.now().isoformat()
+    startup_report["total_seconds"] = round(time.perf_counter() - started, 4)
+    logger.info(f"Startup report: {json.dumps(startup_report)}")
+    if not index_ready:
+        # Without Redis or the index every request would get a 503 forever; stop the server
+        # (as the old blocking startup did) so the container's restart policy brings it back
+        logger.critical(f"Required startup phases failed: {startup_report['errors']}, shutting down")
+        os.kill(os.getpid(), signal.SIGTERM)
+
+@app.on_event("startup")
+async def startup_event():
+    """Start initializing services without blocking uvicorn from accepting connections"""
+    global startup_task, event_loop
+    event_loop = asyncio.get_running_loop()
+    startup_report["started_at"] = datetime.now().isoformat()
+    startup_task = asyncio.create_task(_initialize())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the invalidation listener, close the async Redis pools and stop the search workers"""
+    if invalidation_listener is not None:
+        invalidation_listener.cancel()
+    for client in (redis_async, redis_async_binary):
+        if client is not None:
+            await client.aclose()
+    search_executor.shutdown(wait=False, cancel_futures=True)
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
     components = {
         "rag_indexer": rag_indexer is not None,
-        "redis": redis_client is not None and redis_client.ping(),
+        "redis": redis_async is not None and await redis_async.ping(),
         "openai_key": bool(os.getenv("OPENAI_API_KEY"))
     }
     
@@ -161,43 +386,143 @@ async def health_check():
         components=components
     )
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once the index is loaded and warm, 503 before, with the boot timing report"""
+    return JSONResponse(
+        status_code=200 if index_ready else 503,
+        content={"ready": index_ready, "startup": startup_report}
+    )
+
+async def _rehydrate(indexer: "NutritionRAGIndexer", hits: List) -> Optional[List[Dict]]:
+    """Cached ``(chunk_id, distance)`` hits as results; None if a chunk is no longer in the index"""
+    chunks = await run_blocking(indexer.get_chunks, [chunk_id for chunk_id, _ in hits])
+    if len(chunks) < len(set(chunk_id for chunk_id, _ in hits)):
+        return None
+    return [dict(chunks[chunk_id], distance=distance) for chunk_id, distance in hits]
+
+def _cached_response(results: List[Dict]) -> SearchResponse:
+    return SearchResponse(
+        results=[SearchResult(**r) for r in results],
+        cached=True,
+        query_time=0.0,
+        total_results=len(results)
+    )
+
 @app.post("/search", response_model=SearchResponse)
 async def search_knowledge(
     request: SearchRequest,
-    indexer: NutritionRAGIndexer = Depends(get_rag_indexer),
-    redis: redis.Redis = Depends(get_redis_client)
+    indexer: "NutritionRAGIndexer" = Depends(get_rag_indexer),
+    cache: SearchResultCache = Depends(get_search_cache)
 ):
     """Search nutrition knowledge base"""
-    start_time = datetime.now()
-    
     try:
         # Generate cache key
         cache_key = hashlib.md5(
-            f"{request.query}_{request.n_results}_{request.category_filter}".encode()
+            f"{request.query}_{request.n_results}_{request.category_filter}_{request.mode}_"
+            f"{request.meal_type}_{request.difficulty}_{request.max_prep_minutes}".encode()
         ).hexdigest()
         
-        # Check cache if enabled
-        cached_result = None
-        if request.use_cache:
-            try:
-                cached_result = redis.get(f"search:{cache_key}")
-                if cached_result:
-                    cached_data = json.loads(cached_result)
-                    logger.info(f"Cache hit for query: {request.query}")
-                    return SearchResponse(
-                        results=[SearchResult(**r) for r in cached_data["results"]],
-                        cached=True,
-                        query_time=0.0,
-                        total_results=len(cached_data["results"])
-                    )
-            except Exception as e:
-                logger.warning(f"Cache read error: {e}")
+        if request.use_cache and indexer.generation_is_current():
+            # Hot queries are answered from memory; a stat of the generation pointer catches
+            # reindexes published by other processes (e.g. make index-rag), which then take
+            # the path below that reloads the index
+            body = response_cache.get(cache_key, indexer.generation)
+            if body is not None:
+                return Response(content=body, media_type="application/json")
+        
+        # Cached entries are checked against the active index generation
+        generation = await run_blocking(indexer.active_generation)
+        # A request arriving after a reindex must not join a search started on the previous generation
+        flight_key = f"{cache_key}:{generation}"
+        
+        if not request.use_cache:
+            return await _run_search(request, indexer, cache, cache_key, generation)
+        
+        # Check cache
+        cached = None
+        try:
+            cached = await cache.get(cache_key, generation)
+        except Exception as e:
+            logger.warning(f"Cache read error: {e}")
+        
+        # Entries hold chunk ids and distances; text and metadata come from the index
+        cached_results = await _rehydrate(indexer, cached[0]) if cached is not None else None
+        if cached_results is not None:
+            fresh = cached[1]
+            response = _cached_response(cached_results)
+            if fresh:
+                response_cache.put(cache_key, response.model_dump_json().encode(), generation)
+            else:
+                # Answer with the expired entry and refresh it once in the background
+                search_flights.start(flight_key, lambda: _run_search(request, indexer, cache, cache_key, generation))
+            logger.info(f"Cache hit for query: {request.query}")
+            return response
+        
+        # Concurrent misses for the same key share one computation
+        response, shared = await search_flights.do(
+            flight_key, lambda: _run_search(request, indexer, cache, cache_key, generation)
+        )
+        return response.model_copy(update={"cached": True}) if shared else response
+        
+    except Exception as e:
+        logger.error(f"Search error: {e}")
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+
+async def _run_search(
+    request: SearchRequest,
+    indexer: "NutritionRAGIndexer",
+    cache: SearchResultCache,
+    cache_key: str,
+    generation: int
+) -> SearchResponse:
+    """Run a search and cache it; with caching on, one process at a time computes a given key"""
+    start_time = datetime.now()
+    
+    lock_token = None
+    if request.use_cache:
+        try:
+            lock_token = await cache.acquire(cache_key)
+            if lock_token is None:
+                # Another API process is computing this key
+                cached = await cache.wait(cache_key, generation)
+                cached_results = await _rehydrate(indexer, cached[0]) if cached is not None else None
+                if cached_results is not None:
+                    return _cached_response(cached_results)
+        except Exception as e:
+            logger.warning(f"Cache lock error: {e}")
+    
+    try:
+        # Near-identical queries with the same filters share results
+        query_embedding = None
+        semantic_filters = None
+        if request.use_cache and (request.mode or indexer.search_mode) in SEMANTIC_CACHE_MODES:
+            query_embedding = (await run_blocking(indexer.embed_queries, [request.query]))[0]
+            semantic_filters = (
+                request.category_filter, request.mode or indexer.search_mode,
+                request.meal_type, request.difficulty, request.max_prep_minutes
+            )
+            semantic_hit = semantic_cache.lookup(query_embedding, semantic_filters, request.n_results, generation)
+            if semantic_hit is not None:
+                logger.info(f"Semantic cache hit for query: {request.query}")
+                return SearchResponse(
+                    results=[SearchResult(**r) for r in semantic_hit],
+                    cached=True,
+                    query_time=(datetime.now() - start_time).total_seconds(),
+                    total_results=len(semantic_hit)
+                )
         
         # Perform search
-        results = indexer.search(
+        results = await run_blocking(
+            indexer.search,
             query=request.query,
             n_results=request.n_results,
-            category_filter=request.category_filter
+            category_filter=request.category_filter,
+            mode=request.mode,
+            query_embedding=query_embedding,
+            meal_type=request.meal_type,
+            difficulty=request.difficulty,
+            max_prep_minutes=request.max_prep_minutes
         )
         
         # Calculate query time
@@ -223,126 +548,211 @@ async def search_knowledge(
         # Cache results if enabled
         if request.use_cache and results:
             try:
-                cache_data = {
-                    "results": [r.dict() for r in search_results],
-                    "timestamp": datetime.now().isoformat()
-                }
-                redis.setex(f"search:{cache_key}", 3600, json.dumps(cache_data))
+                await cache.put(cache_key, [(r["id"], r["distance"]) for r in results], generation)
+                cached_body = response.model_copy(update={"cached": True, "query_time": 0.0}).model_dump_json()
+                response_cache.put(cache_key, cached_body.encode(), generation)
             except Exception as e:
                 logger.warning(f"Cache write error: {e}")
+            if semantic_filters is not None:
+                semantic_cache.store(
+                    query_embedding, semantic_filters, request.n_results, [r.model_dump() for r in search_results], generation
+                )
         
         logger.info(f"Search completed: '{request.query}' -> {len(results)} results in {query_time:.3f}s")
         return response
-        
-    except Exception as e:
-        logger.error(f"Search error: {e}")
-        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+    finally:
+        if lock_token is not None:
+            try:
+                await cache.release(cache_key, lock_token)
+            except Exception as e:
+                logger.warning(f"Cache unlock error: {e}")
 
 @app.post("/context", response_model=ContextResponse)
 async def generate_context(
     request: ContextRequest,
-    indexer: NutritionRAGIndexer = Depends(get_rag_indexer)
+    indexer: "NutritionRAGIndexer" = Depends(get_rag_indexer)
 ):
     """Generate contextual information for meal plan generation"""
     try:
-        # Build search queries based on motor type and patient data
-        queries = []
-        
-        # Base query from patient data
-        patient_query = f"plan alimentario {request.patient_data.get('objective', '')} {request.patient_data.get('activity_level', '')}"
-        queries.append(patient_query)
-        
-        # Motor-specific queries
-        if request.motor_type == 1:  # Nuevo paciente
-            queries.extend([
-                "plan alimentario nuevo paciente tres dias",
-                f"desayuno almuerzo cena {request.patient_data.get('objective', 'mantener')}",
-                "macronutrientes equilibrados proteina carbohidratos"
-            ])
-        elif request.motor_type == 2:  # Control
-            queries.extend([
-                "control plan alimentario ajustes",
-                "seguimiento nutricion modificaciones"
-            ])
-        elif request.motor_type == 3:  # Reemplazo
-            queries.extend([
-                f"reemplazo {request.specific_request}",
-                "alternativas comida equivalente"
-            ])
-        
-        # Search for relevant information
-        all_results = []
-        for query in queries:
-            results = indexer.search(query, n_results=3)
-            all_results.extend(results)
-        
-        # Remove duplicates and get best results
-        seen_texts = set()
-        unique_results = []
-        for result in all_results:
-            if result["text"] not in seen_texts:
-                unique_results.append(result)
-                seen_texts.add(result["text"])
-        
-        # Sort by relevance (distance)
-        unique_results.sort(key=lambda x: x["distance"])
-        best_results = unique_results[:10]
-        
-        # Build context
-        context_parts = []
-        recommendations = []
-        sources = set()
-        
-        for result in best_results:
-            context_parts.append(result["text"])
-            sources.add(result["metadata"]["source"])
-            
-            # Extract recommendations
-            text = result["text"].lower()
-            if "preparación:" in text or "macros:" in text:
-                recommendations.append(result["text"][:200] + "...")
-        
-        context = "\n\n---\n\n".join(context_parts[:5])  # Top 5 results
-        
-        return ContextResponse(
-            context=context,
-            recommendations=recommendations[:5],
-            relevant_sources=list(sources)
+        # Only these fields shape the context; patients with the same profile share it
+        profile = (
+            request.motor_type,
+            normalize_profile_value(request.patient_data.get("objective")),
+            normalize_profile_value(request.patient_data.get("activity_level")),
+            normalize_profile_value(request.specific_request) if request.motor_type == 3 else ""
         )
+        return await _profile_context(indexer, profile)
         
     except Exception as e:
         logger.error(f"Context generation error: {e}")
         raise HTTPException(status_code=500, detail=f"Context generation failed: {str(e)}")
 
+async def _profile_context(
+    indexer: "NutritionRAGIndexer",
+    profile: tuple,
+    embeddings: Optional[Dict[str, List[float]]] = None
+) -> ContextResponse:
+    """Memoized context of a profile; concurrent requests for the same profile share one build"""
+    key = profile_key(*profile)
+    generation = await run_blocking(indexer.active_generation)
+    cached = context_cache.get(key, generation)
+    if cached is not None:
+        return cached
+    
+    response, _ = await context_flights.do(
+        f"{generation}:{key}", lambda: _build_context(indexer, profile, key, generation, embeddings)
+    )
+    return response
+
+def _context_queries(motor_type: int, objective: str, activity_level: str, specific_request: str) -> List[str]:
+    """Search queries for a profile, from its normalized fields"""
+    # Base query from patient data
+    queries = [f"plan alimentario {objective} {activity_level}"]
+    
+    # Motor-specific queries
+    if motor_type == 1:  # Nuevo paciente
+        queries.extend([
+            "plan alimentario nuevo paciente tres dias",
+            f"desayuno almuerzo cena {objective or 'mantener'}",
+            "macronutrientes equilibrados proteina carbohidratos"
+        ])
+    elif motor_type == 2:  # Control
+        queries.extend([
+            "control plan alimentario ajustes",
+            "seguimiento nutricion modificaciones"
+        ])
+    elif motor_type == 3:  # Reemplazo
+        queries.extend([
+            f"reemplazo {specific_request}",
+            "alternativas comida equivalente"
+        ])
+    return queries
+
+async def _build_context(
+    indexer: "NutritionRAGIndexer",
+    profile: tuple,
+    key: tuple,
+    generation: int,
+    embeddings: Optional[Dict[str, List[float]]] = None
+) -> ContextResponse:
+    queries = _context_queries(*profile)
+    # Precomputed profiles reuse embeddings computed in one batch for all of them
+    query_embeddings = [embeddings[query] for query in queries] if embeddings is not None else None
+    
+    # Search for relevant information (one batched embedding + query for all of them)
+    all_results = []
+    for results in await run_blocking(indexer.search_many, queries, n_results=3, query_embeddings=query_embeddings):
+        all_results.extend(results)
+    
+    # Remove duplicates and get best results
+    seen_texts = set()
+    unique_results = []
+    for result in all_results:
+        if result["text"] not in seen_texts:
+            unique_results.append(result)
+            seen_texts.add(result["text"])
+    
+    # Sort by relevance (distance)
+    unique_results.sort(key=lambda x: x["distance"])
+    best_results = unique_results[:10]
+    
+    # Build context
+    context_parts = []
+    recommendations = []
+    sources = set()
+    
+    for result in best_results:
+        context_parts.append(result["text"])
+        sources.add(result["metadata"]["source"])
+        sources.update(result["metadata"].get("duplicate_sources", []))
+        
+        # Extract recommendations
+        text = result["text"].lower()
+        if "preparación:" in text or "macros:" in text:
+            recommendations.append(result["text"][:200] + "...")
+    
+    context = "\n\n---\n\n".join(context_parts[:5])  # Top 5 results
+    
+    response = ContextResponse(
+        context=context,
+        recommendations=recommendations[:5],
+        relevant_sources=list(sources)
+    )
+    context_cache.put(key, response, generation)
+    return response
+
+async def _precompute_contexts():
+    """Build and memoize the contexts of the common profiles against the active index"""
+    profiles = [
+        (motor_type, objective, activity_level, "")
+        for motor_type in CONTEXT_MOTOR_TYPES
+        for objective in CONTEXT_OBJECTIVES
+        for activity_level in CONTEXT_ACTIVITY_LEVELS
+    ]
+    embeddings = None
+    if rag_indexer.search_mode in SEMANTIC_CACHE_MODES:
+        # Profiles share most of their queries; embed each distinct one once
+        queries = sorted({query for profile in profiles for query in _context_queries(*profile)})
+        embeddings = dict(zip(queries, await run_blocking(rag_indexer.embed_queries, queries)))
+    await asyncio.gather(*(_profile_context(rag_indexer, profile, embeddings) for profile in profiles))
+    logger.info(f"Precomputed context for {len(profiles)} profiles (generation {rag_indexer.generation})")
+
 @app.get("/stats")
-async def get_knowledge_stats(indexer: NutritionRAGIndexer = Depends(get_rag_indexer)):
+async def get_knowledge_stats(indexer: "NutritionRAGIndexer" = Depends(get_rag_indexer)):
     """Get knowledge base statistics"""
     try:
-        stats = indexer.get_stats()
+        stats = await run_blocking(indexer.get_stats)
+        stats["semantic_cache"] = semantic_cache.stats()
+        stats["response_cache"] = response_cache.stats()
+        stats["search_cache"] = await search_cache.stats() if search_cache is not None else None
+        stats["search_flights"] = search_flights.stats()
+        stats["context_cache"] = context_cache.stats()
         return stats
     except Exception as e:
         logger.error(f"Stats error: {e}")
         raise HTTPException(status_code=500, detail=f"Stats retrieval failed: {str(e)}")
 
-@app.post("/reindex")
-async def reindex_knowledge(indexer: NutritionRAGIndexer = Depends(get_rag_indexer)):
-    """Reindex the knowledge base"""
+@app.post("/reindex", status_code=202)
+async def reindex_knowledge(
+    request: Optional[ReindexRequest] = None,
+    runner: ReindexJobRunner = Depends(get_reindex_runner)
+):
+    """Start a background reindex of the knowledge base"""
     try:
-        logger.info("Starting reindexing...")
-        indexer.load_and_index_files()
-        stats = indexer.get_stats()
-        logger.info("Reindexing completed")
-        return {"status": "success", "stats": stats}
+        job = runner.start(full=request.full if request else False)
+        logger.info(f"Reindex job {job.id} queued")
+        return job.to_dict()
+    except JobAlreadyRunning as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "job_id": e.job_id})
     except Exception as e:
         logger.error(f"Reindexing error: {e}")
         raise HTTPException(status_code=500, detail=f"Reindexing failed: {str(e)}")
 
+@app.get("/reindex/{job_id}")
+async def get_reindex_job(job_id: str, runner: ReindexJobRunner = Depends(get_reindex_runner)):
+    """Get progress of a reindex job"""
+    job = runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Reindex job not found")
+    return job.to_dict()
+
+@app.delete("/reindex/{job_id}")
+async def cancel_reindex_job(job_id: str, runner: ReindexJobRunner = Depends(get_reindex_runner)):
+    """Cancel a running reindex job"""
+    job = runner.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Reindex job not found")
+    return job.to_dict()
+
 @app.get("/categories")
-async def get_categories(indexer: NutritionRAGIndexer = Depends(get_rag_indexer)):
+async def get_categories(indexer: "NutritionRAGIndexer" = Depends(get_rag_indexer)):
     """Get available categories in knowledge base"""
     try:
-        stats = indexer.get_stats()
-        return {"categories": stats.get("categories", [])}
+        stats = await run_blocking(indexer.get_stats)
+        return {
+            "categories": stats.get("categories", []),
+            "chunks_per_category": stats.get("chunks_per_category", {})
+        }
     except Exception as e:
         logger.error(f"Categories error: {e}")
         raise HTTPException(status_code=500, detail=f"Categories retrieval failed: {str(e)}")
@@ -351,7 +761,7 @@ async def get_categories(indexer: NutritionRAGIndexer = Depends(get_rag_indexer)
 @app.post("/telegram/webhook")
 async def telegram_webhook(
     request: Request,
-    bot: TelegramBot = Depends(get_telegram_bot)
+    bot: "TelegramBot" = Depends(get_telegram_bot)
 ):
     """Handle Telegram webhook updates"""
     try:
@@ -370,7 +780,7 @@ async def telegram_webhook(
         # Parse update
         try:
             update_data = json.loads(body_str)
-            update = TelegramUpdate(**update_data)
+            update = _timed_import("telegram_webhook").TelegramUpdate(**update_data)
         except Exception as e:
             logger.error(f"Error parsing Telegram update: {e}")
             raise HTTPException(status_code=400, detail="Invalid update format")
@@ -392,7 +802,7 @@ async def telegram_webhook(
         raise HTTPException(status_code=500, detail=f"Webhook processing failed: {str(e)}")
 
 @app.get("/telegram/info")
-async def telegram_info(bot: TelegramBot = Depends(get_telegram_bot)):
+async def telegram_info(bot: "TelegramBot" = Depends(get_telegram_bot)):
     """Get Telegram bot information"""
     try:
         import requests
@@ -406,7 +816,7 @@ async def telegram_info(bot: TelegramBot = Depends(get_telegram_bot)):
 @app.post("/telegram/set-webhook")
 async def set_telegram_webhook(
     webhook_url: str,
-    bot: TelegramBot = Depends(get_telegram_bot)
+    bot: "TelegramBot" = Depends(get_telegram_bot)
 ):
     """Set Telegram webhook URL"""
     try:
@@ -434,6 +844,8 @@ async def set_telegram_webhook(
         raise HTTPException(status_code=500, detail=f"Failed to set webhook: {str(e)}")
 
 if __name__ == "__main__":
+    import uvicorn
+
     # Run the server
     uvicorn.run(
         "rag_api:app",
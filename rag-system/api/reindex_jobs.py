@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Background reindex jobs for the RAG API
+Runs NutritionRAGIndexer.load_and_index_files off the event loop, one job at a time
+"""
+
+import uuid
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs kept around so their status can still be queried
+MAX_FINISHED_JOBS = 20
+
+
+class JobAlreadyRunning(Exception):
+    """Raised when a reindex is requested while another one is in progress"""
+
+    def __init__(self, job_id: str):
+        super().__init__(f"Reindex job {job_id} is already running")
+        self.job_id = job_id
+
+
+class ReindexJob:
+    def __init__(self, full: bool = False):
+        self.id = uuid.uuid4().hex
+        self.full = full
+        self.status = "pending"
+        self.created_at = datetime.now().isoformat()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.progress: Dict = {"files_total": 0, "files_processed": 0, "chunks_total": 0, "chunks_processed": 0}
+        self.summary: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled")
+
+    def to_dict(self) -> Dict:
+        """Job status with progress and throughput"""
+        elapsed = 0.0
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.monotonic()) - self.started_at
+
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "full": self.full,
+            "created_at": self.created_at,
+            "elapsed_seconds": round(elapsed, 3),
+            **self.progress,
+            "files_per_second": round(self.progress["files_processed"] / elapsed, 2) if elapsed else 0.0,
+            "chunks_per_second": round(self.progress["chunks_processed"] / elapsed, 2) if elapsed else 0.0,
+            "cancel_requested": self.cancel_event.is_set(),
+            "summary": self.summary,
+            "error": self.error
+        }
+
+
+class ReindexJobRunner:
+    """Runs at most one reindex at a time in a background thread.
+
+    ``on_complete`` is called with the summary of every completed job.
+    """
+
+    def __init__(self, indexer, on_complete: Optional[Callable[[Dict], None]] = None):
+        self.indexer = indexer
+        self.on_complete = on_complete
+        self.jobs: "OrderedDict[str, ReindexJob]" = OrderedDict()
+        self.current: Optional[ReindexJob] = None
+        self._lock = threading.Lock()
+
+    def start(self, full: bool = False) -> ReindexJob:
+        with self._lock:
+            if self.current is not None and not self.current.finished:
+                raise JobAlreadyRunning(self.current.id)
+
+            job = ReindexJob(full=full)
+            self.current = job
+            self.jobs[job.id] = job
+            self._prune()
+
+        thread = threading.Thread(target=self._run, args=(job,), name=f"reindex-{job.id[:8]}", daemon=True)
+        thread.start()
+        return job
+
+    def get(self, job_id: str) -> Optional[ReindexJob]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[ReindexJob]:
+        job = self.jobs.get(job_id)
+        if job is not None and not job.finished:
+            job.cancel_event.set()
+            logger.info(f"Cancellation requested for reindex job {job_id}")
+        return job
+
+    def _run(self, job: ReindexJob):
+        # Imported here so loading this module does not pull in the indexer's dependencies
+        from rag_indexer import IndexingCancelled
+
+        job.status = "running"
+        job.started_at = time.monotonic()
+        logger.info(f"Reindex job {job.id} started (full={job.full})")
+
+        try:
+            job.summary = self.indexer.load_and_index_files(
+                full=job.full,
+                progress_callback=job.progress.update,
+                cancel_event=job.cancel_event
+            )
+            job.status = "completed"
+            logger.info(f"Reindex job {job.id} completed")
+            if self.on_complete is not None:
+                try:
+                    self.on_complete(job.summary)
+                except Exception as e:
+                    logger.error(f"Reindex job {job.id} completion hook failed: {e}")
+        except IndexingCancelled:
+            job.status = "cancelled"
+            logger.info(f"Reindex job {job.id} cancelled")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.error(f"Reindex job {job.id} failed: {e}")
+        finally:
+            job.finished_at = time.monotonic()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
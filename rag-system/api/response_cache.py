@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+In-process response cache for the RAG API
+Byte-bounded LRU of ready-to-serve /search response bodies in front of the Redis cache
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from search_cache import INVALIDATION_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_MB", "32")) * 1024 * 1024
+# Upper bound on how long a body is served without going back to Redis
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+# Rough per-entry bookkeeping cost (dict slot, tuple, key string)
+ENTRY_OVERHEAD = 200
+
+
+class ResponseCache:
+    """LRU of serialized responses, bounded by total bytes instead of entry count.
+
+    Values are the exact JSON bodies to send, so a hit skips Redis, JSON parsing and
+    model validation. Entries are tagged with the index generation and follow the same
+    rule as the Redis cache: an older-generation body is served only after this
+    process heard the invalidation broadcast for the active generation. Bodies expire
+    after ``ttl`` seconds so a refresh written by another process is picked up.
+    """
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES, ttl: float = RESPONSE_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.swept_generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidated = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, generation: int) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                body, entry_generation, expires_at = entry
+                if expires_at > time.monotonic() and (
+                    entry_generation == generation
+                    or entry_generation < generation <= self.swept_generation
+                ):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return body
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def put(self, key: str, body: bytes, generation: int):
+        cost = len(body) + len(key) + ENTRY_OVERHEAD
+        if cost > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (body, generation, time.monotonic() + self.ttl)
+            self.size += cost
+            while self.size > self.max_bytes:
+                evicted, (evicted_body, _, _) = self._entries.popitem(last=False)
+                self.size -= len(evicted_body) + len(evicted) + ENTRY_OVERHEAD
+                self.evictions += 1
+
+    def invalidate(self, keys: Optional[List[str]], generation: int):
+        """Drop ``keys`` (every entry if None) and accept the survivors for ``generation``"""
+        with self._lock:
+            if keys is None:
+                self.invalidated += len(self._entries)
+                self._entries.clear()
+                self.size = 0
+            else:
+                for key in keys:
+                    if key in self._entries:
+                        self._remove(key)
+                        self.invalidated += 1
+            self.swept_generation = max(self.swept_generation, generation)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidated": self.invalidated
+        }
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0]) + len(key) + ENTRY_OVERHEAD
+
+
+async def listen_for_invalidations(client, cache: ResponseCache):
+    """Apply invalidation broadcasts from every API process (including this one) to ``cache``"""
+    while True:
+        pubsub = client.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                data = json.loads(message["data"])
+                cache.invalidate(data.get("keys"), data["generation"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Entries could be missing invalidations while disconnected
+            cache.invalidate(None, 0)
+            logger.warning(f"Response cache invalidation listener error, retrying: {e}")
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
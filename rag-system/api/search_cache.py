@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Search result cache for the RAG API
+Redis entries tagged with the index generation and the chunk ids they contain, for targeted invalidation
+"""
+
+import os
+import json
+import time
+import uuid
+import zlib
+import struct
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "3600"))
+# Entries are kept this long past their TTL and served while one caller refreshes them
+SEARCH_CACHE_STALE_SECONDS = int(os.getenv("SEARCH_CACHE_STALE_SECONDS", "300"))
+# Lifetime of the per-key lock held by the process computing a search
+SEARCH_LOCK_SECONDS = float(os.getenv("SEARCH_LOCK_SECONDS", "10"))
+LOCK_POLL_SECONDS = 0.05
+# Delete the lock only if this process still holds it
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+# Hash with the invalidation state shared by every API process
+STATE_KEY = "searchcache:state"
+# Entry payloads larger than this are stored zlib-compressed
+SEARCH_CACHE_COMPRESS_BYTES = int(os.getenv("SEARCH_CACHE_COMPRESS_BYTES", "512"))
+# version, flags, generation, fresh_until, number of hits
+_HEADER = struct.Struct("<BBIdH")
+_VERSION = 1
+_COMPRESSED = 1
+# Pub/sub channel announcing invalidated keys to the in-process caches of every API process
+INVALIDATION_CHANNEL = "searchcache:invalidations"
+
+
+def encode_entry(hits: List[Tuple[str, float]], generation: int, fresh_until: float,
+                 compress_bytes: int = SEARCH_CACHE_COMPRESS_BYTES) -> bytes:
+    """Pack search hits as a fixed header, float64 distances and NUL-separated chunk ids"""
+    body = struct.pack(f"<{len(hits)}d", *(distance for _, distance in hits))
+    body += "\0".join(chunk_id for chunk_id, _ in hits).encode("utf-8")
+    flags = 0
+    if len(body) > compress_bytes:
+        compressed = zlib.compress(body)
+        if len(compressed) < len(body):
+            body, flags = compressed, _COMPRESSED
+    return _HEADER.pack(_VERSION, flags, generation, fresh_until, len(hits)) + body
+
+
+def decode_entry(raw: bytes) -> Optional[Tuple[List[Tuple[str, float]], int, float]]:
+    """Hits, generation and fresh_until of an entry; None if it was written in another format"""
+    if len(raw) < _HEADER.size or raw[0] != _VERSION:
+        return None
+    _, flags, generation, fresh_until, count = _HEADER.unpack_from(raw)
+    body = raw[_HEADER.size:]
+    if flags & _COMPRESSED:
+        body = zlib.decompress(body)
+    distances = struct.unpack_from(f"<{count}d", body)
+    ids = body[count * 8:].decode("utf-8").split("\0") if count else []
+    return list(zip(ids, distances)), generation, fresh_until
+
+
+class SearchResultCache:
+    """Cached ``/search`` responses that survive reindexing when their chunks did not change.
+
+    Each entry ``search:{key}`` stores only the chunk ids and distances of the results,
+    with the generation that produced them, packed by ``encode_entry``; callers rebuild
+    text and metadata from the index. ``searchref:{chunk_id}`` is the set of entries containing a
+    chunk. After a reindex, ``invalidate`` deletes only the entries that reference
+    changed or deleted chunks, records the generation as swept and publishes the
+    deleted keys on ``INVALIDATION_CHANNEL``. An entry from an
+    older generation is served only once the active generation has been swept and it
+    is not older than ``valid_since`` (moved forward when a reindex cannot say which
+    chunks changed); otherwise it is a miss and ages out with its TTL.
+
+    ``client`` is a ``redis.asyncio`` client, so cache I/O never blocks the event loop;
+    ``binary_client`` is one on the same server without response decoding, for entries.
+
+    Entries stay in Redis ``stale_seconds`` past their TTL: ``get`` still returns them,
+    flagged as not fresh, so the caller can answer right away and refresh once. The
+    process computing a key holds ``searchlock:{key}``; others ``wait`` for its result
+    instead of running the same search.
+    """
+
+    def __init__(self, client, binary_client, ttl: int = SEARCH_CACHE_TTL,
+                 stale_seconds: int = SEARCH_CACHE_STALE_SECONDS, lock_seconds: float = SEARCH_LOCK_SECONDS):
+        self.client = client
+        self.binary_client = binary_client
+        self.ttl = ttl
+        self.stale_seconds = stale_seconds
+        self.lock_seconds = lock_seconds
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.stale_served = 0
+        self.lock_waits = 0
+        self.invalidated = 0
+        self.writes = 0
+        self.bytes_written = 0
+
+    async def get(self, key: str, generation: int) -> Optional[Tuple[List[Tuple[str, float]], bool]]:
+        """Cached ``(chunk_id, distance)`` hits for ``key`` still valid for the active ``generation``, and whether they are fresh"""
+        cached = await self._read(key, generation)
+        if cached is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if not cached[1]:
+            self.stale_served += 1
+        return cached
+
+    async def put(self, key: str, hits: List[Tuple[str, float]], generation: int):
+        expires = self.ttl + self.stale_seconds
+        payload = encode_entry(hits, generation, time.time() + self.ttl)
+        pipe = self.binary_client.pipeline(transaction=False)
+        pipe.setex(f"search:{key}", expires, payload)
+        for chunk_id in {chunk_id for chunk_id, _ in hits}:
+            pipe.sadd(f"searchref:{chunk_id}", key)
+            pipe.expire(f"searchref:{chunk_id}", expires)
+        await pipe.execute()
+        self.writes += 1
+        self.bytes_written += len(payload)
+
+    async def acquire(self, key: str) -> Optional[str]:
+        """Take the lock for computing ``key``; returns its token, or None if another caller holds it"""
+        token = uuid.uuid4().hex
+        if await self.client.set(f"searchlock:{key}", token, nx=True, px=int(self.lock_seconds * 1000)):
+            return token
+        return None
+
+    async def release(self, key: str, token: str):
+        await self.client.eval(_RELEASE_SCRIPT, 1, f"searchlock:{key}", token)
+
+    async def wait(self, key: str, generation: int) -> Optional[Tuple[List[Tuple[str, float]], bool]]:
+        """Wait for the lock holder to write a fresh entry; None if it gave up or the lock expired"""
+        self.lock_waits += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.lock_seconds
+        while loop.time() < deadline:
+            await asyncio.sleep(LOCK_POLL_SECONDS)
+            cached = await self._read(key, generation)
+            if cached is not None and cached[1]:
+                return cached
+            if not await self.client.exists(f"searchlock:{key}"):
+                return cached
+        return None
+
+    async def invalidate(self, chunk_ids: Optional[List[str]], generation: int) -> int:
+        """Delete the entries that contain ``chunk_ids`` and mark ``generation`` as swept.
+
+        ``chunk_ids=None`` means the changed chunks are unknown: entries from earlier
+        generations stop being served and expire on their own.
+        """
+        if chunk_ids is None:
+            await self.client.hset(STATE_KEY, mapping={"swept_generation": generation, "valid_since": generation})
+            await self.client.publish(INVALIDATION_CHANNEL, json.dumps({"keys": None, "generation": generation}))
+            logger.info(f"Search cache: entries before generation {generation} are no longer served")
+            return 0
+
+        chunk_ids = list(chunk_ids)
+        keys = set()
+        for i in range(0, len(chunk_ids), 500):
+            pipe = self.client.pipeline(transaction=False)
+            for chunk_id in chunk_ids[i:i+500]:
+                pipe.smembers(f"searchref:{chunk_id}")
+            for members in await pipe.execute():
+                keys.update(members)
+
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.delete(f"search:{key}")
+        for chunk_id in chunk_ids:
+            pipe.delete(f"searchref:{chunk_id}")
+        pipe.hset(STATE_KEY, "swept_generation", generation)
+        pipe.publish(INVALIDATION_CHANNEL, json.dumps({"keys": sorted(keys), "generation": generation}))
+        await pipe.execute()
+
+        self.invalidated += len(keys)
+        logger.info(f"Search cache: invalidated {len(keys)} entries referencing {len(chunk_ids)} changed chunks "
+                    f"(generation {generation})")
+        return len(keys)
+
+    async def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        state = await self.client.hgetall(STATE_KEY) or {}
+        return {
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "stale_served": self.stale_served,
+            "lock_waits": self.lock_waits,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidated": self.invalidated,
+            "avg_entry_bytes": round(self.bytes_written / self.writes, 1) if self.writes else 0.0,
+            "swept_generation": int(state.get("swept_generation", 0)),
+            "valid_since": int(state.get("valid_since", 0))
+        }
+
+    async def _read(self, key: str, generation: int) -> Optional[Tuple[List[Tuple[str, float]], bool]]:
+        raw = await self.binary_client.get(f"search:{key}")
+        entry = decode_entry(raw) if raw else None
+        if entry is None:
+            return None
+
+        hits, entry_generation, fresh_until = entry
+        if entry_generation != generation and not await self._still_valid(entry_generation, generation):
+            self.stale += 1
+            return None
+        return hits, fresh_until > time.time()
+
+    async def _still_valid(self, entry_generation: Optional[int], generation: int) -> bool:
+        if entry_generation is None or entry_generation > generation:
+            return False
+        state = await self.client.hgetall(STATE_KEY) or {}
+        return (int(state.get("swept_generation", 0)) >= generation
+                and entry_generation >= int(state.get("valid_since", 0)))
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Semantic result cache for the RAG API
+Reuses the results of a recently answered query whose embedding is close enough to a new one
+"""
+
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1024"))
+# Minimum cosine similarity between query embeddings to reuse cached results
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+
+
+class SemanticCache:
+    """Bounded in-memory cache keyed by query embedding.
+
+    Embeddings are kept L2-normalized in a preallocated float32 matrix, one row per
+    entry, and grouped by filters (category, mode, recipe filters). A lookup scores
+    only the rows of its filter group with a single matrix-vector product; for a
+    cache of a few thousand queries this exact scan is as fast as an approximate
+    index. An entry answers a request for at most as many results as it was stored
+    with. The least recently used entry is evicted when the cache is full, and all
+    entries are dropped when the active index generation changes.
+    """
+
+    def __init__(self, max_entries: int = SEMANTIC_CACHE_SIZE, threshold: float = SEMANTIC_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.generation: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: List[Optional[Dict]] = [None] * max_entries
+        self._groups: Dict[tuple, set] = {}
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, embedding: List[float], filters: tuple, n_results: int, generation: int) -> Optional[List[Dict]]:
+        """Cached results of the closest query with the same filters, or None"""
+        with self._lock:
+            self._check_generation(generation)
+            query = self._normalize(embedding)
+            rows = [
+                slot for slot in self._groups.get(filters, ())
+                if self._entries[slot]["n_results"] >= n_results
+            ]
+            if not rows or query is None or len(query) != self._vectors.shape[1]:
+                self.misses += 1
+                return None
+
+            scores = self._vectors[rows] @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            slot = rows[best]
+            self._lru.move_to_end(slot)
+            self.hits += 1
+            return self._entries[slot]["results"][:n_results]
+
+    def store(self, embedding: List[float], filters: tuple, n_results: int, results: List[Dict], generation: int):
+        with self._lock:
+            self._check_generation(generation)
+            if self.max_entries <= 0 or generation != self.generation:
+                # Results computed against a generation that is no longer active
+                return
+
+            vector = np.asarray(embedding, dtype=np.float32)
+            if self._vectors is None or self._vectors.shape[1] != len(vector):
+                self._reset(len(vector))
+            query = self._normalize(vector)
+            if query is None:
+                return
+
+            if len(self._lru) < self.max_entries:
+                slot = len(self._lru)
+            else:
+                slot, _ = self._lru.popitem(last=False)
+                self._groups[self._entries[slot]["filters"]].discard(slot)
+                self.evictions += 1
+
+            self._vectors[slot] = query
+            self._entries[slot] = {"filters": filters, "n_results": n_results, "results": results}
+            self._groups.setdefault(filters, set()).add(slot)
+            self._lru[slot] = None
+
+    def clear(self):
+        with self._lock:
+            self._reset(None if self._vectors is None else self._vectors.shape[1])
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "generation": self.generation,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+    def _check_generation(self, generation: int):
+        if self.generation is None or generation > self.generation:
+            if self._lru:
+                self.invalidations += 1
+                logger.info(f"Semantic cache invalidated for generation {generation} ({len(self._lru)} entries)")
+            self._reset(None if self._vectors is None else self._vectors.shape[1])
+            self.generation = generation
+
+    def _reset(self, dim: Optional[int]):
+        self._vectors = np.zeros((self.max_entries, dim), dtype=np.float32) if dim and self.max_entries > 0 else None
+        self._entries = [None] * self.max_entries
+        self._groups = {}
+        self._lru = OrderedDict()
+
+    def _normalize(self, embedding) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Single-flight call coalescing for the RAG API
+Concurrent callers asking for the same key share one running computation
+"""
+
+import asyncio
+import logging
+import functools
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """At most one task per key; later callers await the task already running.
+
+    The computation runs as its own task, so a caller that goes away (or a request
+    that is cancelled) does not cancel it for the others, and ``start`` can launch a
+    background refresh that later callers for the same key join.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.started = 0
+        self.shared = 0
+
+    def start(self, key: str, func: Callable[[], Awaitable]) -> asyncio.Task:
+        """Task computing ``key``, launching ``func`` only if none is running"""
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._tasks[key] = task
+            self.started += 1
+            task.add_done_callback(functools.partial(self._done, key))
+        return task
+
+    async def do(self, key: str, func: Callable[[], Awaitable]) -> Tuple[Any, bool]:
+        """Result of the computation for ``key`` and whether it was shared with another caller"""
+        shared = key in self._tasks
+        if shared:
+            self.shared += 1
+        return await asyncio.shield(self.start(key, func)), shared
+
+    def stats(self) -> Dict:
+        return {"in_flight": len(self._tasks), "started": self.started, "shared": self.shared}
+
+    def _done(self, key: str, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Background refreshes have no caller to report their errors
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Single-flight computation for {key} failed: {task.exception()}")
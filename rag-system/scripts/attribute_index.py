@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Attribute Index for Nutrition Bot
+Bitmaps precalculados por valor de metadata para restringir la búsqueda vectorial antes de puntuar
+"""
+
+from typing import List, Dict
+
+import numpy as np
+
+from lexical_index import matches
+
+# Equality filters answered from one bitmap per value
+BITMAP_FIELDS = ("category", "meal_type", "difficulty", "type")
+# Range filters answered from cumulative bitmaps over the sorted distinct values
+RANGE_FIELDS = ("prep_minutes",)
+RANGE_OPERATORS = ("$lt", "$lte", "$gt", "$gte")
+
+class AttributeIndex:
+    """Bitmaps de filas por valor de atributo (1 bit por chunk, empaquetados con NumPy).
+
+    Un filtro se resuelve combinando bitmaps con AND/OR sobre bytes, sin recorrer la
+    metadata; el resultado son las filas candidatas que se le pasan al producto punto.
+    Para ``prep_minutes`` se guarda, por cada valor distinto ordenado, el bitmap de las
+    filas con valor <= a él, así ``$lte``/``$lt``/``$gt``/``$gte`` son una búsqueda
+    binaria y a lo sumo una negación. Campos sin índice se evalúan fila por fila.
+    """
+
+    def __init__(self, metadatas: List[Dict]):
+        self.metadatas = metadatas
+        self.size = len(metadatas)
+        self.bitmaps: Dict[str, Dict] = {}
+        self.ranges: Dict[str, tuple] = {}
+
+        for field in BITMAP_FIELDS:
+            rows: Dict = {}
+            for row, meta in enumerate(metadatas):
+                value = (meta or {}).get(field)
+                if value is not None:
+                    rows.setdefault(value, []).append(row)
+            self.bitmaps[field] = {value: self._pack(value_rows) for value, value_rows in rows.items()}
+
+        for field in RANGE_FIELDS:
+            values = np.array([_number((meta or {}).get(field)) for meta in metadatas], dtype=np.float64)
+            present = np.flatnonzero(~np.isnan(values))
+            order = present[np.argsort(values[present], kind="stable")]
+            distinct, first = np.unique(values[order], return_index=True)
+            cumulative = []
+            mask = np.zeros(self.size, dtype=bool)
+            ends = list(first[1:]) + [len(order)]
+            for start, end in zip(first, ends):
+                mask[order[start:end]] = True
+                cumulative.append(np.packbits(mask))
+            self.ranges[field] = (distinct, cumulative, self._pack(present))
+
+    def rows(self, where: Dict) -> np.ndarray:
+        """Filas (ordenadas) que cumplen el filtro"""
+        return np.flatnonzero(np.unpackbits(self.bitmap(where), count=self.size))
+
+    def bitmap(self, where: Dict) -> np.ndarray:
+        result = self._full()
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    result &= self.bitmap(clause)
+            elif key == "$or":
+                union = self._empty()
+                for clause in condition:
+                    union |= self.bitmap(clause)
+                result &= union
+            else:
+                result &= self._field_bitmap(key, condition)
+        return result
+
+    def _field_bitmap(self, field: str, condition) -> np.ndarray:
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+
+        result = self._full()
+        for operator, operand in condition.items():
+            if field in self.bitmaps and operator == "$eq":
+                result &= self.bitmaps[field].get(operand, self._empty())
+            elif field in self.bitmaps and operator == "$in":
+                union = self._empty()
+                for value in operand:
+                    union |= self.bitmaps[field].get(value, self._empty())
+                result &= union
+            elif field in self.ranges and operator in RANGE_OPERATORS:
+                result &= self._range_bitmap(field, operator, operand)
+            else:
+                result &= self._pack([row for row, meta in enumerate(self.metadatas)
+                                      if matches(meta, {field: {operator: operand}})])
+        return result
+
+    def _range_bitmap(self, field: str, operator: str, operand: float) -> np.ndarray:
+        distinct, cumulative, present = self.ranges[field]
+        # Number of distinct values that satisfy "<=" (or "<") operand
+        side = "right" if operator in ("$lte", "$gt") else "left"
+        count = int(np.searchsorted(distinct, operand, side=side))
+        at_most = cumulative[count - 1].copy() if count else self._empty()
+        if operator in ("$lte", "$lt"):
+            return at_most
+        return present & ~at_most
+
+    def _pack(self, rows) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        mask[list(rows)] = True
+        return np.packbits(mask)
+
+    def _full(self) -> np.ndarray:
+        return np.packbits(np.ones(self.size, dtype=bool))
+
+    def _empty(self) -> np.ndarray:
+        return np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+def _number(value) -> float:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return np.nan
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark del chunker
+Compara el chunker por offsets de tokens con el anterior (decode por ventana)
+"""
+
+import time
+import argparse
+from pathlib import Path
+from typing import List
+
+import tiktoken
+
+from rag_indexer import _iter_chunks
+
+def decode_per_chunk(text: str, encoding, chunk_size: int = 500, overlap: int = 50) -> List[str]:
+    """Chunker anterior: decodifica cada ventana de tokens por separado"""
+    tokens = encoding.encode(text)
+    chunks = []
+
+    start = 0
+    while start < len(tokens):
+        end = min(start + chunk_size, len(tokens))
+        chunks.append(encoding.decode(tokens[start:end]).strip())
+
+        if end >= len(tokens):
+            break
+
+        start = end - overlap
+
+    return [chunk for chunk in chunks if len(chunk.strip()) > 20]
+
+def load_corpus(data_path: Path, target_bytes: int) -> str:
+    """Repite los .txt de la base de conocimiento hasta llegar al tamaño pedido"""
+    texts = [p.read_text(encoding='utf-8') for p in sorted(data_path.rglob("*.txt"))]
+    if not texts:
+        raise SystemExit(f"No .txt files found in {data_path}")
+
+    base = "\n\n".join(texts)
+    repeats = max(1, target_bytes // len(base.encode('utf-8')))
+    return "\n\n".join([base] * repeats)
+
+def best_of(fn, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunk_text implementations")
+    parser.add_argument("--data-path", default=str(Path(__file__).resolve().parent.parent / "data"))
+    parser.add_argument("--size-mb", type=float, default=5.0, help="Corpus size to chunk")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--overlap", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    encoding = tiktoken.encoding_for_model("gpt-4")
+    text = load_corpus(Path(args.data_path), int(args.size_mb * 1024 * 1024))
+
+    old = decode_per_chunk(text, encoding, args.chunk_size, args.overlap)
+    new = list(_iter_chunks(text, encoding, args.chunk_size, args.overlap))
+    if old != new:
+        raise SystemExit("Chunkers disagree: offset-based output differs from decode-per-chunk")
+
+    old_time = best_of(lambda: decode_per_chunk(text, encoding, args.chunk_size, args.overlap), args.runs)
+    new_time = best_of(lambda: sum(1 for _ in _iter_chunks(text, encoding, args.chunk_size, args.overlap)), args.runs)
+
+    print(f"Corpus: {len(text.encode('utf-8')) / 1024 / 1024:.1f} MB, {len(new)} chunks (identical output)")
+    print(f"decode per chunk: {old_time * 1000:.1f} ms")
+    print(f"token offsets:    {new_time * 1000:.1f} ms")
+    print(f"speedup:          {old_time / new_time:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Benchmark de particiones por categoría
+Compara búsquedas filtradas sobre el índice completo contra la partición de la categoría
+"""
+
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from vector_store import FlatVectorStore
+from partitioned_search import PartitionedSearcher
+
+def ms_per_query(searcher, queries, k: int, where=None) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        searcher.query(query_embeddings=[query], n_results=k, where=where)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Filtered latency: whole flat store vs category partitions")
+    parser.add_argument("--chunks-per-category", type=int, default=5000)
+    parser.add_argument("--categories", type=int, nargs="+", default=[3, 6, 12, 24])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    queries = rng.normal(size=(args.queries, args.dim)).astype(np.float32).tolist()
+    print(f"{args.chunks_per_category} chunks per category, dim {args.dim}, k={args.k}")
+
+    for categories in args.categories:
+        total = categories * args.chunks_per_category
+        ids = [f"c{i}" for i in range(total)]
+        metadatas = [{"category": f"cat{i % categories}"} for i in range(total)]
+        embeddings = rng.normal(size=(total, args.dim)).astype(np.float32)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store = FlatVectorStore.build(Path(tmp) / "store", ids, [""] * total, metadatas, embeddings)
+            partitioned = PartitionedSearcher(store, {c: store.partition(c) for c in store.partitions})
+            where = {"category": "cat0"}
+
+            whole = ms_per_query(store, queries, args.k, where)
+            routed = ms_per_query(partitioned, queries, args.k, where)
+            fan_out = ms_per_query(partitioned, queries, args.k)
+            unfiltered = ms_per_query(store, queries, args.k)
+
+            expected = store.query(query_embeddings=queries, n_results=args.k, where=where)["ids"]
+            found = partitioned.query(query_embeddings=queries, n_results=args.k, where=where)["ids"]
+            if expected != found:
+                raise SystemExit("Partitioned results differ from the filtered whole-store search")
+
+        print(f"{categories:>3} categories ({total} chunks): filtered whole {whole:.3f} ms, "
+              f"partition {routed:.3f} ms ({whole / routed:.1f}x) | unfiltered whole {unfiltered:.3f} ms, "
+              f"fan-out {fan_out:.3f} ms")
+
+if __name__ == "__main__":
+    main()
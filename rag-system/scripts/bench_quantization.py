@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Reporte de cuantización del motor plano
+Mide memoria residente, latencia y recall@k de float16/int8 contra float32 exacto
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from vector_store import FlatVectorStore, QUANTIZATION_MODES
+
+def active_store_path(embeddings_path: Path) -> Path:
+    with open(embeddings_path / "active_generation.json", 'r', encoding='utf-8') as f:
+        generation = json.load(f)["generation"]
+    return embeddings_path / "flat" / f"g{generation}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k and memory report for quantized flat search")
+    parser.add_argument("--embeddings-path", default="/app/embeddings")
+    parser.add_argument("--store", help="Flat store directory (defaults to the active generation)")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--noise", type=float, default=0.05, help="Gaussian noise added to sampled vectors")
+    args = parser.parse_args()
+
+    store_path = Path(args.store) if args.store else active_store_path(Path(args.embeddings_path))
+    exact = FlatVectorStore.load(store_path)
+    if exact.count() == 0:
+        sys.exit("Flat store is empty")
+
+    # Queries: perturbed copies of indexed vectors, so neighbours are meaningful
+    rng = np.random.default_rng(42)
+    rows = rng.integers(0, exact.count(), size=args.queries)
+    queries = np.asarray(exact.vectors[rows]) + rng.normal(0, args.noise, size=(args.queries, exact.vectors.shape[1]))
+    queries = queries.astype(np.float32).tolist()
+
+    truth = exact.query(query_embeddings=queries, n_results=args.k)["ids"]
+    print(f"Store: {store_path} ({exact.count()} x {exact.vectors.shape[1]}), queries: {args.queries}, k={args.k}")
+
+    for mode in QUANTIZATION_MODES:
+        store = FlatVectorStore.load(store_path, quantization=mode, rescore_factor=args.rescore_factor)
+        start = time.perf_counter()
+        found = store.query(query_embeddings=queries, n_results=args.k)["ids"]
+        elapsed = time.perf_counter() - start
+
+        recall = sum(len(set(a) & set(b)) for a, b in zip(truth, found)) / (len(truth) * args.k)
+        print(f"{mode:>8}: resident {store.resident_bytes() / 1024:.1f} KiB "
+              f"({exact.resident_bytes() / store.resident_bytes():.1f}x smaller), "
+              f"{elapsed / len(queries) * 1000:.3f} ms/query, recall@{args.k} {recall:.4f}")
+
+if __name__ == "__main__":
+    main()
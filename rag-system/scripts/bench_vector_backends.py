@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark de backends de búsqueda
+Compara Chroma (HNSW) con el motor plano de NumPy sobre el índice activo
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from typing import List, Callable
+
+from rag_indexer import NutritionRAGIndexer
+from partitioned_search import PartitionedSearcher
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def timed(fn: Callable, queries: List[List[float]], n_results: int):
+    timings, results = [], []
+    for embedding in queries:
+        start = time.perf_counter()
+        results.append(fn(query_embeddings=[embedding], n_results=n_results)["ids"][0])
+        timings.append(time.perf_counter() - start)
+    return timings, results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Chroma vs flat NumPy search")
+    parser.add_argument("--data-path", default="/app/data")
+    parser.add_argument("--embeddings-path", default="/app/embeddings")
+    parser.add_argument("--queries", type=int, default=200, help="Queries sampled from indexed chunks")
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    indexer = NutritionRAGIndexer(args.data_path, args.embeddings_path, os.getenv("OPENAI_API_KEY", ""), search_backend="flat")
+    collection, flat = indexer.collection, indexer.searcher
+    # With category partitions on, compare against the whole flat store like Chroma's single collection
+    if isinstance(flat, PartitionedSearcher):
+        flat = flat.base
+    if flat.count() == 0:
+        sys.exit("Index is empty, run rag_indexer.py first")
+
+    random.seed(42)
+    sample = random.choices(flat.documents, k=args.queries)
+    queries = indexer.embedding_function(sample)
+
+    # Warm up both paths
+    collection.query(query_embeddings=queries[:1], n_results=args.k)
+    flat.query(query_embeddings=queries[:1], n_results=args.k)
+
+    chroma_times, chroma_ids = timed(collection.query, queries, args.k)
+    flat_times, flat_ids = timed(flat.query, queries, args.k)
+
+    overlap = sum(len(set(a) & set(b)) for a, b in zip(chroma_ids, flat_ids))
+    print(f"Vectors: {flat.count()}, queries: {len(queries)}, k={args.k}")
+    for name, timings in (("chroma", chroma_times), ("flat", flat_times)):
+        print(f"{name:>7}: p50 {percentile(timings, 50) * 1000:.2f} ms, "
+              f"p95 {percentile(timings, 95) * 1000:.2f} ms, "
+              f"{len(timings) / sum(timings):.0f} qps")
+    print(f"HNSW recall@{args.k} vs exact: {overlap / (len(queries) * args.k):.3f}")
+
+if __name__ == "__main__":
+    main()
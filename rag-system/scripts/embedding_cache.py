@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Embedding Cache for Nutrition Bot
+Cache persistente de embeddings direccionado por contenido, respaldado en SQLite
+"""
+
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from array import array
+from pathlib import Path
+from typing import List, Dict, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingCache:
+    """Mapea sha256(modelo + texto) a un vector float32.
+
+    Los vectores se guardan como bytes float32 en SQLite (modo WAL, así lo comparten
+    varios procesos). Cuando el tamaño supera ``max_bytes`` se eliminan las entradas
+    usadas hace más tiempo hasta volver al 90% del límite.
+    """
+
+    def __init__(self, path: str, model_name: str, max_bytes: int = 512 * 1024 * 1024):
+        self.path = Path(path)
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key BLOB PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    def key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode('utf-8')).digest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Devuelve el vector cacheado de cada texto o None"""
+        keys = [self.key(text) for text in texts]
+        found = {}
+
+        with self._lock:
+            found.update(self._select("vector", keys))
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+                self._conn.commit()
+
+            self.hits += sum(1 for k in keys if k in found)
+            self.misses += sum(1 for k in keys if k not in found)
+
+        return [_decode(found[k]) if k in found else None for k in keys]
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]):
+        """Guarda vectores y aplica la política de desalojo"""
+        now = time.time()
+        rows = [(self.key(text), array('f', vector).tobytes(), now) for text, vector in zip(texts, vectors)]
+
+        with self._lock:
+            existing = dict(self._select("LENGTH(vector)", [row[0] for row in rows]))
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+            self._size += sum(len(row[1]) for row in rows) - sum(existing.values())
+            if self._size > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def embed(self, texts: List[str], compute: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """Devuelve embeddings, calculando con ``compute`` sólo los textos que no están en cache"""
+        vectors = self.get_many(texts)
+
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            computed = dict(zip(missing, compute(missing)))
+            self.put_many(missing, [computed[text] for text in missing])
+            vectors = [vector if vector is not None else list(computed[text]) for text, vector in zip(texts, vectors)]
+
+        return vectors
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "entries": entries,
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions
+        }
+
+    def _select(self, column: str, keys: List[bytes]) -> List[tuple]:
+        rows = []
+        # Stay well below SQLite's bound parameter limit
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i+500]
+            rows.extend(self._conn.execute(
+                f"SELECT key, {column} FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                batch
+            ).fetchall())
+        return rows
+
+    def _evict(self):
+        target = int(self.max_bytes * 0.9)
+        while self._size > target:
+            rows = self._conn.execute(
+                "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._size = 0
+                break
+            self._conn.executemany("DELETE FROM embeddings WHERE key = ?", [(row[0],) for row in rows])
+            self._size -= sum(row[1] for row in rows)
+            self.evictions += len(rows)
+        logger.info(f"Embedding cache evicted down to {self._size} bytes")
+
+def _decode(blob: bytes) -> List[float]:
+    vector = array('f')
+    vector.frombytes(blob)
+    return vector.tolist()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Lexical Index for Nutrition Bot
+Índice invertido BM25 con tokenización para español y fusión RRF con la búsqueda vectorial
+"""
+
+import re
+import json
+import math
+import unicodedata
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+
+LEXICAL_FILENAME = "lexical.json"
+RRF_K = 60
+
+STOPWORDS = {
+    "a", "al", "algo", "ante", "antes", "aqui", "asi", "bajo", "bien", "cada", "como", "con", "contra",
+    "cual", "cuando", "de", "del", "desde", "donde", "dos", "durante", "e", "el", "ella", "ellas",
+    "ellos", "en", "entre", "era", "es", "esa", "ese", "eso", "esta", "este", "esto", "estos", "fue",
+    "ha", "hay", "hasta", "la", "las", "le", "les", "lo", "los", "mas", "me", "mi", "muy", "nada", "ni",
+    "no", "nos", "o", "otra", "otro", "para", "pero", "poco", "por", "que", "quien", "se", "ser", "si",
+    "sin", "sobre", "son", "su", "sus", "tambien", "te", "tiene", "todo", "tu", "u", "un", "una",
+    "uno", "unos", "y", "ya", "yo"
+}
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+def _strip_accents(text: str) -> str:
+    # ñ is kept apart from n before dropping the remaining combining marks
+    text = text.replace("ñ", "\0")
+    text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return text.replace("\0", "ny")
+
+def _stem(word: str) -> str:
+    """Stemming liviano: plurales regulares en español (limones -> limon, luces -> luz)"""
+    if len(word) > 3 and word.endswith("s"):
+        word = word[:-1]
+    if len(word) > 3 and word.endswith("ce"):
+        return word[:-2] + "z"
+    if len(word) > 3 and word.endswith("e") and word[-2] in "lnrdj":
+        return word[:-1]
+    return word
+
+def tokenize(text: str) -> List[str]:
+    """Minúsculas, sin tildes, sin stopwords y con plurales normalizados"""
+    words = _WORD.findall(_strip_accents(text.lower()))
+    return [_stem(word) for word in words if word not in STOPWORDS]
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Fusiona rankings de ids sumando 1 / (k + posición)"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+def fuse_hits(rankings: List[List[Dict]], n_results: int, k: int = RRF_K) -> List[Tuple[Dict, float]]:
+    """Fusiona listas de hits (dicts con ``id``) con RRF; puntaje normalizado a [0, 1]"""
+    by_id: Dict[str, Dict] = {}
+    for ranking in rankings:
+        for hit in ranking:
+            by_id.setdefault(hit["id"], hit)
+
+    max_score = len(rankings) / (k + 1)
+    fused = reciprocal_rank_fusion([[hit["id"] for hit in ranking] for ranking in rankings], k=k)
+    return [(by_id[doc_id], score / max_score) for doc_id, score in fused[:n_results]]
+
+class BM25Index:
+    """Índice invertido en memoria con puntaje BM25.
+
+    ``postings`` mapea término -> {posición del documento: frecuencia}. ids, textos y
+    metadata son listas paralelas a las posiciones, así una búsqueda léxica puede
+    responderse sin pasar por el vector store.
+    """
+
+    def __init__(self, ids: List[str], documents: List[str], metadatas: List[Dict],
+                 postings: Dict[str, Dict[int, int]], doc_lengths: List[int], k1: float = 1.5, b: float = 0.75):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+        total = len(doc_lengths)
+        self.idf = {
+            term: math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in postings.items()
+        }
+
+    @classmethod
+    def build(cls, ids: List[str], documents: List[str], metadatas: List[Dict], **params) -> "BM25Index":
+        postings: Dict[str, Dict[int, int]] = {}
+        doc_lengths = []
+        for position, document in enumerate(documents):
+            terms = tokenize(document)
+            doc_lengths.append(len(terms))
+            for term in terms:
+                docs = postings.setdefault(term, {})
+                docs[position] = docs.get(position, 0) + 1
+        return cls(ids, documents, metadatas, postings, doc_lengths, **params)
+
+    def state(self) -> Dict:
+        """Términos y longitudes serializables (ids/textos/metadata se guardan aparte)"""
+        return {
+            "k1": self.k1,
+            "b": self.b,
+            "doc_lengths": self.doc_lengths,
+            "postings": {term: list(docs.items()) for term, docs in self.postings.items()}
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict, ids: List[str], documents: List[str], metadatas: List[Dict]) -> "BM25Index":
+        postings = {term: dict(docs) for term, docs in state["postings"].items()}
+        return cls(ids, documents, metadatas, postings, state["doc_lengths"], k1=state["k1"], b=state["b"])
+
+    def save(self, directory: Path):
+        """Guarda términos y longitudes (ids/textos/metadata viven en records.json)"""
+        with open(Path(directory) / LEXICAL_FILENAME, 'w', encoding='utf-8') as f:
+            json.dump(self.state(), f)
+
+    @classmethod
+    def load(cls, directory: Path, ids: List[str], documents: List[str], metadatas: List[Dict]) -> "BM25Index":
+        with open(Path(directory) / LEXICAL_FILENAME, 'r', encoding='utf-8') as f:
+            return cls.from_state(json.load(f), ids, documents, metadatas)
+
+    def search(self, query: str, n_results: int = 5, where: Optional[Dict] = None) -> List[Dict]:
+        """Documentos con mayor puntaje BM25, con la fracción de términos de la consulta que contienen"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        scores: Dict[int, float] = {}
+        matched: Dict[int, int] = {}
+
+        for term in terms:
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = self.idf[term]
+            for position, frequency in docs.items():
+                if where and not matches(self.metadatas[position], where):
+                    continue
+                length_norm = 1 - self.b + self.b * self.doc_lengths[position] / (self.avg_length or 1.0)
+                scores[position] = scores.get(position, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+                matched[position] = matched.get(position, 0) + 1
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+        return [{
+            "id": self.ids[position],
+            "text": self.documents[position],
+            "metadata": self.metadatas[position],
+            "score": score,
+            "coverage": matched[position] / len(terms)
+        } for position, score in ranked]
+
+    @staticmethod
+    def is_confident(query: str, hits: List[Dict], n_results: int, max_terms: int = 4) -> bool:
+        """Camino rápido: consulta corta (nombres de ingredientes o recetas) y cada resultado contiene todos sus términos"""
+        if len(hits) < n_results or len(set(tokenize(query))) > max_terms:
+            return False
+        return all(hit["coverage"] == 1.0 for hit in hits[:n_results])
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+_OPERATORS = {
+    "$eq": lambda value, operand: value == operand,
+    "$ne": lambda value, operand: value != operand,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+    "$lt": lambda value, operand: _is_number(value) and value < operand,
+    "$lte": lambda value, operand: _is_number(value) and value <= operand,
+    "$gt": lambda value, operand: _is_number(value) and value > operand,
+    "$gte": lambda value, operand: _is_number(value) and value >= operand,
+}
+
+def matches(metadata: Dict, where: Dict) -> bool:
+    """Filtro estilo Chroma: igualdad, operadores ($eq, $in, $lte, ...) y $and/$or"""
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            ok = all(matches(metadata, clause) for clause in condition)
+        elif key == "$or":
+            ok = any(matches(metadata, clause) for clause in condition)
+        elif isinstance(condition, dict):
+            ok = all(_OPERATORS[operator](metadata.get(key), operand) for operator, operand in condition.items())
+        else:
+            ok = metadata.get(key) == condition
+        if not ok:
+            return False
+    return True
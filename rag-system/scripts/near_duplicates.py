@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Near-Duplicate Detection for Nutrition Bot
+MinHash + LSH para colapsar chunks casi idénticos al indexar
+"""
+
+import re
+import zlib
+from typing import List, Dict, Optional
+
+import numpy as np
+
+_WORD = re.compile(r"\w+")
+# Carter-Wegman universal hashing modulo a prime just above 2**32
+_PRIME = np.uint64(4294967311)
+
+class NearDuplicateIndex:
+    """Índice LSH sobre firmas MinHash de shingles de palabras.
+
+    Cada texto se reduce a ``num_perm`` mínimos de funciones hash universales sobre sus
+    shingles de ``shingle_size`` palabras; la fracción de mínimos iguales entre dos
+    firmas estima la similitud de Jaccard. La firma se divide en ``bands`` bandas: dos
+    textos son candidatos si coinciden en alguna banda completa, y un candidato es
+    duplicado si su Jaccard estimado alcanza ``threshold``. Con 16 bandas de 4 filas
+    un par con Jaccard 0.8 es candidato con probabilidad > 0.999.
+    """
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 64, bands: int = 16, shingle_size: int = 3, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2**32 - 1, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 2**32 - 1, size=num_perm, dtype=np.uint64)
+        self._buckets: List[Dict[bytes, List[str]]] = [{} for _ in range(bands)]
+        self._signatures: Dict[str, np.ndarray] = {}
+
+    def signature(self, text: str) -> np.ndarray:
+        words = _WORD.findall(text.lower())
+        size = min(self.shingle_size, len(words)) or 1
+        shingles = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+        return ((np.outer(self._a, hashes) + self._b[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+    def add(self, chunk_id: str, text: str) -> Optional[str]:
+        """Devuelve el id del chunk ya indexado del que ``text`` es casi duplicado, o lo indexa y devuelve None"""
+        signature = self.signature(text)
+        keys = [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+        seen = set()
+        for band, key in enumerate(keys):
+            for candidate in self._buckets[band].get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                    return candidate
+
+        self._signatures[chunk_id] = signature
+        for band, key in enumerate(keys):
+            self._buckets[band].setdefault(key, []).append(chunk_id)
+        return None
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Partitioned Search for Nutrition Bot
+Un sub-índice vectorial por categoría, con consultas en paralelo sobre todas las particiones
+"""
+
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PARTITION_FIELD = "category"
+# Partitions queried concurrently by an unfiltered search (NumPy and hnswlib release the GIL)
+PARTITION_WORKERS = int(os.getenv("RAG_PARTITION_WORKERS", str(min(8, os.cpu_count() or 1))))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Pool de hilos compartido por todas las generaciones"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max(1, PARTITION_WORKERS), thread_name_prefix="partition")
+    return _executor
+
+class PartitionedSearcher:
+    """Enruta consultas estilo ``Collection.query`` a un sub-índice por categoría.
+
+    Un filtro ``{"category": X}`` consulta sólo la partición de X (el resto del filtro
+    se aplica dentro de ella), así su costo depende del tamaño de esa categoría y no
+    del total. Sin filtro de categoría se consultan todas las particiones en paralelo y
+    se combinan los k mejores por distancia. Los filtros que no se pueden enrutar van a
+    ``base``, el índice completo.
+    """
+
+    def __init__(self, base, partitions: Dict[str, object]):
+        self.base = base
+        self.name = base.name
+        self.partitions = partitions
+
+    def count(self) -> int:
+        return self.base.count()
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10, where: Optional[Dict] = None, **kwargs) -> Dict:
+        category, rest = _split_category(where)
+
+        if isinstance(category, str):
+            partition = self.partitions.get(category)
+            if partition is None:
+                return _empty(len(query_embeddings))
+            return partition.query(query_embeddings=query_embeddings, n_results=n_results, where=rest, **kwargs)
+
+        if category is not None or not self.partitions:
+            return self.base.query(query_embeddings=query_embeddings, n_results=n_results, where=where or None, **kwargs)
+
+        futures = [
+            _get_executor().submit(partition.query, query_embeddings=query_embeddings, n_results=n_results,
+                                   where=rest, **kwargs)
+            for partition in self.partitions.values()
+        ]
+        return _merge([future.result() for future in futures], len(query_embeddings), n_results)
+
+def _split_category(where: Optional[Dict]):
+    """Separa la condición de categoría (directa o dentro de un ``$and``) del resto del filtro"""
+    if not where:
+        return None, None
+
+    clauses = list(where["$and"]) if set(where) == {"$and"} else [{key: value} for key, value in where.items()]
+    category = None
+    for clause in clauses:
+        value = clause.get(PARTITION_FIELD) if len(clause) == 1 else None
+        if isinstance(value, dict) and set(value) == {"$eq"}:
+            value = value["$eq"]
+        if value is not None:
+            category = value
+            clauses.remove(clause)
+            break
+
+    if not isinstance(category, str):
+        return category, where
+    if not clauses:
+        return category, None
+    return category, clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def _empty(queries: int) -> Dict:
+    return {key: [[] for _ in range(queries)] for key in ("ids", "documents", "metadatas", "distances")}
+
+def _merge(results: List[Dict], queries: int, n_results: int) -> Dict:
+    """Top-k global a partir de los top-k de cada partición"""
+    merged = _empty(queries)
+    for q in range(queries):
+        hits = []
+        for result in results:
+            hits.extend(zip(result["distances"][q], result["ids"][q], result["documents"][q], result["metadatas"][q]))
+        hits.sort(key=lambda hit: hit[0])
+        for distance, doc_id, document, metadata in hits[:n_results]:
+            merged["distances"][q].append(distance)
+            merged["ids"][q].append(doc_id)
+            merged["documents"][q].append(document)
+            merged["metadatas"][q].append(metadata)
+    return merged
@@ -5,83 +5,463 @@ Indexes nutrition knowledge base for semantic search
 """
 
 import os
+import re
 import json
+import fcntl
 import logging
-from typing import List, Dict, Optional
+import hashlib
+import shutil
+import threading
+import queue
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Callable, Iterator
+from itertools import accumulate
 from datetime import datetime
-import chromadb
-from chromadb.config import Settings
-import tiktoken
-import openai
 from pathlib import Path
 
+from embedding_cache import EmbeddingCache
+from vector_store import FlatVectorStore
+from lexical_index import BM25Index, fuse_hits
+from partitioned_search import PartitionedSearcher
+from snapshot import IndexSnapshot
+from near_duplicates import NearDuplicateIndex
+from attribute_index import BITMAP_FIELDS, RANGE_FIELDS
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+COLLECTION_NAME = "nutrition_knowledge"
+# Bumped when chunk text, chunk metadata or dedup rules change, so the next reindex re-chunks every file
+MANIFEST_VERSION = 4
+POINTER_FILENAME = "active_generation.json"
+# Held (flock) by whichever process is building and publishing a generation
+INDEX_LOCK_FILENAME = "index.lock"
+# Previous generations kept after a swap so other worker processes can finish on them
+RETAIN_GENERATIONS = int(os.getenv("RAG_RETAIN_GENERATIONS", "1"))
+# Ingestion pipeline: chunking workers, chunks per Chroma write, files buffered for the writer
+INDEX_WORKERS = int(os.getenv("INDEX_WORKERS", str(os.cpu_count() or 1)))
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "100"))
+INDEX_QUEUE_SIZE = int(os.getenv("INDEX_QUEUE_SIZE", "16"))
+# "chroma" (HNSW) or "flat" (exact NumPy search over a memory-mapped matrix)
+SEARCH_BACKEND = os.getenv("RAG_SEARCH_BACKEND", "chroma")
+# Flat backend only: "none", "float16" or "int8" codes for the first pass, re-scored in float32
+VECTOR_QUANTIZATION = os.getenv("RAG_VECTOR_QUANTIZATION", "none")
+RESCORE_FACTOR = int(os.getenv("RAG_RESCORE_FACTOR", "4"))
+# One vector sub-index per top-level data category (Chroma collections or flat store row ranges)
+CATEGORY_PARTITIONS = os.getenv("RAG_CATEGORY_PARTITIONS", "true").lower() == "true"
+# "vector", "hybrid" (BM25 + vector fused with RRF), "auto" (lexical fast path, else hybrid) or "lexical"
+SEARCH_MODE = os.getenv("RAG_SEARCH_MODE", "vector")
+SEARCH_MODES = ("vector", "hybrid", "auto", "lexical")
+# Serve read-only from a single-file snapshot instead of Chroma (replicas)
+SNAPSHOT_PATH = os.getenv("RAG_SNAPSHOT_PATH")
+# Export a snapshot here after every published generation (primary)
+SNAPSHOT_EXPORT_PATH = os.getenv("RAG_SNAPSHOT_EXPORT_PATH")
+# Chroma's default embedding function; part of the embedding cache key
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# Near-duplicate chunks (estimated Jaccard over word shingles >= threshold) are stored once
+DEDUP_ENABLED = os.getenv("RAG_DEDUP", "true").lower() == "true"
+DEDUP_THRESHOLD = float(os.getenv("RAG_DEDUP_THRESHOLD", "0.9"))
+
+class IndexingCancelled(Exception):
+    """El reindexado fue cancelado antes de publicar la nueva generación"""
+
+@contextmanager
+def _file_lock(path: Path):
+    """Lock exclusivo entre procesos sobre ``path`` (se libera al cerrar el archivo)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+_encoding = None
+
+def _get_encoding():
+    """Encoding de tiktoken, uno por proceso"""
+    global _encoding
+    if _encoding is None:
+        import tiktoken
+        _encoding = tiktoken.encoding_for_model("gpt-4")
+    return _encoding
+
+def _iter_chunks(text: str, encoding, chunk_size: int = 500, overlap: int = 50) -> Iterator[str]:
+    """Genera chunks con overlap de forma perezosa"""
+    return (chunk for chunk, _ in _iter_windows(text, encoding, chunk_size, overlap))
+
+def _iter_windows(text: str, encoding, chunk_size: int = 500, overlap: int = 50) -> Iterator[tuple]:
+    """Genera pares (chunk, cantidad de tokens) con overlap de forma perezosa.
+
+    El texto se tokeniza una sola vez y cada ventana se corta del texto original usando
+    los offsets en bytes de los tokens, en lugar de decodificar cada ventana (y dos veces
+    los tokens del overlap). El resultado es idéntico a ``encoding.decode`` por ventana.
+    """
+    tokens = encoding.encode(text)
+    if not tokens:
+        return
+
+    data = text.encode('utf-8')
+    offsets = [0]
+    offsets.extend(accumulate(len(token_bytes) for token_bytes in encoding.decode_tokens_bytes(tokens)))
+    if offsets[-1] != len(data):
+        # Tokens don't map back onto the raw bytes, slice the token bytes instead
+        data = b"".join(encoding.decode_tokens_bytes(tokens))
+
+    start = 0
+    while start < len(tokens):
+        end = min(start + chunk_size, len(tokens))
+        chunk = data[offsets[start]:offsets[end]].decode('utf-8', errors='replace').strip()
+        if len(chunk) > 20:
+            yield chunk, end - start
+
+        if end >= len(tokens):
+            break
+
+        start = end - overlap
+
+def _build_chunks(content: str, file: str, file_path: str, category: str, encoding):
+    """Genera ids, textos y metadata de los chunks de un archivo"""
+    documents = []
+    metadatas = []
+    ids = []
+    stats = {"chunks": 0, "tokens": 0, "bytes": 0, "meal_types": {}}
+
+    for i, (chunk, token_count) in enumerate(_iter_windows(content, encoding)):
+        doc_id = f"{file.replace('.txt', '')}_{i}_{category}"
+
+        metadata = {
+            "source": file,
+            "category": category,
+            "chunk_index": i,
+            "timestamp": datetime.now().isoformat(),
+            "file_path": file_path
+        }
+
+        # Add specific metadata for recipes
+        if category == "recetas":
+            recipe_meta = NutritionRAGIndexer.extract_recipe_metadata(chunk, file)
+            metadata.update(recipe_meta)
+
+        documents.append(chunk)
+        metadatas.append(metadata)
+        ids.append(doc_id)
+
+        stats["chunks"] += 1
+        stats["tokens"] += token_count
+        stats["bytes"] += len(chunk.encode('utf-8'))
+        if "meal_type" in metadata:
+            stats["meal_types"][metadata["meal_type"]] = stats["meal_types"].get(metadata["meal_type"], 0) + 1
+
+    return documents, metadatas, ids, stats
+
+def _aggregate_stats(files: Dict[str, Dict]) -> Dict:
+    """Suma las estadísticas por archivo del manifest"""
+    totals = {
+        "total_chunks": 0,
+        "total_tokens": 0,
+        "total_bytes": 0,
+        "total_files": len(files),
+        "chunks_per_category": {},
+        "chunks_per_source": {},
+        "chunks_per_meal_type": {},
+        "duplicate_chunks": 0,
+        "duplicate_bytes": 0,
+        "duplicate_vector_bytes": 0
+    }
+
+    for rel_path, entry in files.items():
+        file_stats = entry.get("stats") or {"chunks": len(entry["chunk_ids"])}
+        source = os.path.basename(rel_path)
+        totals["total_chunks"] += file_stats["chunks"]
+        totals["total_tokens"] += file_stats.get("tokens", 0)
+        totals["total_bytes"] += file_stats.get("bytes", 0)
+        for key, name in (("chunks_per_category", entry["category"]), ("chunks_per_source", source)):
+            totals[key][name] = totals[key].get(name, 0) + file_stats["chunks"]
+        for meal_type, count in file_stats.get("meal_types", {}).items():
+            totals["chunks_per_meal_type"][meal_type] = totals["chunks_per_meal_type"].get(meal_type, 0) + count
+        for key in ("duplicate_chunks", "duplicate_bytes", "duplicate_vector_bytes"):
+            totals[key] += file_stats.get(key, 0)
+
+    return totals
+
+def _changed_chunk_ids(previous: Dict[str, Dict], files: Dict[str, Dict]) -> List[str]:
+    """Chunks de la generación anterior que cambiaron de contenido o ya no se almacenan"""
+    changed = set()
+    for rel_path, entry in previous.items():
+        current = files.get(rel_path)
+        if current is None or current.get("sha256") != entry.get("sha256"):
+            changed.update(entry["chunk_ids"])
+        else:
+            changed.update(set(entry["chunk_ids"]) - set(current["chunk_ids"]))
+    return sorted(changed)
+
+def _duplicate_references(files: Dict[str, Dict]) -> Dict[str, List[str]]:
+    """Archivos cuyos chunks se colapsaron en cada chunk canónico"""
+    references: Dict[str, set] = {}
+    for rel_path, entry in files.items():
+        for canonical_id in entry.get("duplicates", {}).values():
+            references.setdefault(canonical_id, set()).add(os.path.basename(rel_path))
+    return {canonical_id: sorted(sources) for canonical_id, sources in references.items()}
+
+def _process_file(task: Dict) -> Dict:
+    """Lee, hashea y chunkea un archivo; corre dentro del pool de workers"""
+    result = {
+        "rel_path": task["rel_path"],
+        "documents": [],
+        "metadatas": [],
+        "ids": [],
+        "stats": {"chunks": 0, "tokens": 0, "bytes": 0, "meal_types": {}}
+    }
+    try:
+        with open(task["file_path"], 'rb') as f:
+            raw = f.read()
+        result["sha256"] = hashlib.sha256(raw).hexdigest()
+
+        if result["sha256"] == task["previous_sha256"]:
+            # Touched but not modified
+            result["status"] = "unchanged"
+            return result
+
+        # Same universal-newline translation as a text-mode open(), so chunks and their ids don't change
+        content = raw.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+        if not content.strip():
+            result["status"] = "empty"
+            return result
+
+        file = os.path.basename(task["file_path"])
+        result["documents"], result["metadatas"], result["ids"], result["stats"] = _build_chunks(
+            content, file, task["file_path"], task["category"], _get_encoding()
+        )
+        result["status"] = "indexed"
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+    return result
+
+def _where_clause(category: Optional[str] = None, meal_type: Optional[str] = None,
+                  difficulty: Optional[str] = None, max_prep_minutes: Optional[int] = None) -> Dict:
+    """Filtro de metadata en el formato de Chroma (``$and`` sólo si hay más de una condición).
+
+    El motor plano lo resuelve con los bitmaps de ``AttributeIndex``; Chroma lo aplica con
+    su propio índice de metadata (SQLite) antes de recorrer el HNSW.
+    """
+    conditions = [{key: value} for key, value in (
+        ("category", category), ("meal_type", meal_type), ("difficulty", difficulty)
+    ) if value]
+    if max_prep_minutes is not None:
+        conditions.append({"prep_minutes": {"$lte": max_prep_minutes}})
+    if len(conditions) > 1:
+        return {"$and": conditions}
+    return conditions[0] if conditions else {}
+
+def _fuse(rankings: List[List[Dict]], n_results: int) -> List[Dict]:
+    """Fusiona listas de resultados con RRF; distance = 1 - puntaje normalizado"""
+    return [{
+        "id": hit["id"],
+        "text": hit["text"],
+        "metadata": hit["metadata"],
+        "distance": 1.0 - score
+    } for hit, score in fuse_hits(rankings, n_results)]
+
+class _BatchWriter(threading.Thread):
+    """Único escritor hacia Chroma: recibe chunks por una cola acotada y los agrega en lotes"""
+
+    def __init__(
+        self,
+        open_collection: Callable,
+        embed: Callable[[List[str]], List[List[float]]],
+        batch_size: int,
+        queue_size: int,
+        on_batch: Callable[[int], None]
+    ):
+        super().__init__(name="index-writer", daemon=True)
+        self._open_collection = open_collection
+        self._embed = embed
+        self._batch_size = batch_size
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._on_batch = on_batch
+        self._buffer = ([], [], [])
+        self.collection = None
+        self.error: Optional[BaseException] = None
+
+    def put(self, documents: List[str], metadatas: List[Dict], ids: List[str]):
+        # Blocks while the queue is full, which in turn stops new files from being submitted
+        self._queue.put((documents, metadatas, ids))
+
+    def ensure_collection(self):
+        if self.collection is None:
+            self.collection = self._open_collection()
+        return self.collection
+
+    def close(self):
+        """Escribe lo pendiente y espera al escritor"""
+        self._queue.put(None)
+        self.join()
+        self.raise_if_failed()
+
+    def close_quietly(self):
+        """Detiene el escritor descartando lo pendiente"""
+        self.error = self.error or IndexingCancelled("Writer stopped")
+        self._queue.put(None)
+        self.join()
+
+    def raise_if_failed(self):
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self.error is not None:
+                # Keep draining so producers never block on a dead writer
+                continue
+            try:
+                for buffered, new in zip(self._buffer, item):
+                    buffered.extend(new)
+                if len(self._buffer[2]) >= self._batch_size:
+                    self._flush()
+            except BaseException as e:
+                self.error = e
+        if self.error is None:
+            try:
+                self._flush()
+            except BaseException as e:
+                self.error = e
+
+    def _flush(self):
+        documents, metadatas, ids = self._buffer
+        while ids:
+            collection = self.ensure_collection()
+            collection.add(
+                documents=documents[:self._batch_size],
+                metadatas=metadatas[:self._batch_size],
+                ids=ids[:self._batch_size],
+                embeddings=self._embed(documents[:self._batch_size])
+            )
+            written = len(ids[:self._batch_size])
+            del documents[:self._batch_size], metadatas[:self._batch_size], ids[:self._batch_size]
+            self._on_batch(written)
+
 class NutritionRAGIndexer:
-    def __init__(self, data_path: str, embeddings_path: str, openai_api_key: str):
+    def __init__(self, data_path: str, embeddings_path: str, openai_api_key: str,
+                 workers: Optional[int] = None, search_backend: Optional[str] = None,
+                 snapshot_path: Optional[str] = None):
         self.data_path = Path(data_path)
         self.embeddings_path = Path(embeddings_path)
+        snapshot_path = snapshot_path or SNAPSHOT_PATH
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else None
         
-        # Initialize OpenAI
-        openai.api_key = openai_api_key
-        self.client = openai.OpenAI(api_key=openai_api_key)
+        # OpenAI, ChromaDB and the embedding model are imported and opened on first use;
+        # a snapshot replica never touches Chroma
+        self.openai_api_key = openai_api_key
+        self._client = None
+        self._chroma_client = None
+        self._embedding_function = None
+        self._client_lock = threading.Lock()
         
-        # Initialize ChromaDB
-        self.chroma_client = chromadb.PersistentClient(
-            path=str(embeddings_path),
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True
-            )
+        # Embeddings are computed here (not inside Chroma) so they can be cached by content
+        self.embedding_cache = EmbeddingCache(
+            str(self.embeddings_path / "embedding_cache.sqlite"),
+            EMBEDDING_MODEL,
+            max_bytes=int(os.getenv("EMBEDDING_CACHE_MAX_MB", "512")) * 1024 * 1024
         )
+
+        # Active generation: searches read self.collection, reindexing builds a
+        # shadow collection and flips the pointer file once it is complete
+        self.generation = 0
+        self.collection = None
+        self.searcher = None
+        self.stats: Dict = {}
+        self.duplicate_references: Dict[str, List[str]] = {}
+        self.search_backend = "flat" if self.snapshot_path else (search_backend or SEARCH_BACKEND)
+        self.search_mode = SEARCH_MODE
+        self.search_counters = {"vector": 0, "hybrid": 0, "lexical": 0, "lexical_fast_path": 0, "queries_embedded": 0}
+        # Optional cache of query embeddings (``embed(queries, compute)``), set by the API
+        self.query_embedding_cache = None
+        self._lexical: Optional[tuple] = None
+        self._pointer_mtime = None
+        self._generation_lock = threading.Lock()
+        # Serializes reindexes in this process; _file_lock does it across processes
+        self._index_lock = threading.Lock()
+        self._inflight: Dict[int, int] = {}
+        self._retired = set()
+        self._refresh_generation()
+        logger.info(f"Loaded {self.searcher.name} (generation {self.generation})")
         
-        # Create or get collection
-        try:
-            self.collection = self.chroma_client.get_collection("nutrition_knowledge")
-            logger.info("Loaded existing collection")
-        except:
-            self.collection = self.chroma_client.create_collection(
-                name="nutrition_knowledge",
-                metadata={"hnsw:space": "cosine"}
-            )
-            logger.info("Created new collection")
-        
-        self.encoding = tiktoken.encoding_for_model("gpt-4")
+        self.workers = max(1, workers if workers is not None else INDEX_WORKERS)
         
+    @property
+    def client(self):
+        """Cliente de OpenAI"""
+        with self._client_lock:
+            if self._client is None:
+                import openai
+                openai.api_key = self.openai_api_key
+                self._client = openai.OpenAI(api_key=self.openai_api_key)
+            return self._client
+
+    @property
+    def embedding_function(self):
+        """Función de embeddings por defecto de Chroma (all-MiniLM-L6-v2)"""
+        with self._client_lock:
+            if self._embedding_function is None:
+                from chromadb.utils import embedding_functions
+                self._embedding_function = embedding_functions.DefaultEmbeddingFunction()
+            return self._embedding_function
+
+    @property
+    def chroma_client(self):
+        """Cliente persistente de Chroma (carga SQLite y los segmentos HNSW al abrirse)"""
+        with self._client_lock:
+            if self._chroma_client is None:
+                import chromadb
+                from chromadb.config import Settings
+                self._chroma_client = chromadb.PersistentClient(
+                    path=str(self.embeddings_path),
+                    settings=Settings(
+                        anonymized_telemetry=False,
+                        allow_reset=True
+                    )
+                )
+            return self._chroma_client
+
+    @property
+    def encoding(self):
+        """Encoding de tiktoken, construido recién al chunkear"""
+        return _get_encoding()
+
     def chunk_text(self, text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
         """Divide texto en chunks con overlap para mejor contexto"""
-        tokens = self.encoding.encode(text)
-        chunks = []
-        
-        start = 0
-        while start < len(tokens):
-            end = min(start + chunk_size, len(tokens))
-            chunk_tokens = tokens[start:end]
-            chunk_text = self.encoding.decode(chunk_tokens)
-            chunks.append(chunk_text.strip())
-            
-            if end >= len(tokens):
-                break
-                
-            start = end - overlap
-            
-        return [chunk for chunk in chunks if len(chunk.strip()) > 20]
+        return list(self.iter_chunks(text, chunk_size, overlap))
+
+    def iter_chunks(self, text: str, chunk_size: int = 500, overlap: int = 50) -> Iterator[str]:
+        """Versión perezosa de chunk_text"""
+        return _iter_chunks(text, self.encoding, chunk_size, overlap)
     
-    def extract_recipe_metadata(self, text: str, filename: str) -> Dict:
+    @staticmethod
+    def extract_recipe_metadata(text: str, filename: str) -> Dict:
         """Extrae metadata específica de recetas"""
         metadata = {
             "source": filename,
             "type": "recipe",
-            "meal_type": self._detect_meal_type(filename, text),
-            "difficulty": self._detect_difficulty(text),
-            "prep_time": self._extract_prep_time(text),
-            "servings": self._extract_servings(text)
+            "meal_type": NutritionRAGIndexer._detect_meal_type(filename, text),
+            "difficulty": NutritionRAGIndexer._detect_difficulty(text),
+            "prep_time": NutritionRAGIndexer._extract_prep_time(text),
+            "servings": NutritionRAGIndexer._extract_servings(text)
         }
+        prep_minutes = NutritionRAGIndexer._prep_minutes(metadata["prep_time"])
+        if prep_minutes is not None:
+            metadata["prep_minutes"] = prep_minutes
         return metadata
     
-    def _detect_meal_type(self, filename: str, text: str) -> str:
+    @staticmethod
+    def _detect_meal_type(filename: str, text: str) -> str:
         """Detecta tipo de comida basado en archivo y contenido"""
         filename_lower = filename.lower()
         text_lower = text.lower()
@@ -97,7 +477,8 @@ class NutritionRAGIndexer:
         else:
             return 'general'
     
-    def _detect_difficulty(self, text: str) -> str:
+    @staticmethod
+    def _detect_difficulty(text: str) -> str:
         """Detecta dificultad de preparación"""
         text_lower = text.lower()
         
@@ -110,148 +491,973 @@ class NutritionRAGIndexer:
         else:
             return 'moderado'
     
-    def _extract_prep_time(self, text: str) -> Optional[str]:
+    @staticmethod
+    def _extract_prep_time(text: str) -> Optional[str]:
         """Extrae tiempo de preparación si está mencionado"""
         import re
         time_pattern = r'(\d+)\s*(minutos?|min|horas?|hs?)'
         match = re.search(time_pattern, text.lower())
         return match.group(0) if match else None
     
-    def _extract_servings(self, text: str) -> Optional[str]:
+    @staticmethod
+    def _prep_minutes(prep_time: Optional[str]) -> Optional[int]:
+        """Convierte el tiempo de preparación extraído ("1 hora", "25 min") a minutos"""
+        import re
+        match = re.match(r'(\d+)\s*(\w+)', prep_time or "")
+        if not match:
+            return None
+        return int(match.group(1)) * (60 if match.group(2).startswith('h') else 1)
+    
+    @staticmethod
+    def _extract_servings(text: str) -> Optional[str]:
         """Extrae número de porciones si está mencionado"""
         import re
         servings_pattern = r'(\d+)\s*(porcion|porción|persona|serving)'
         match = re.search(servings_pattern, text.lower())
         return match.group(1) if match else None
     
-    def load_and_index_files(self):
-        """Carga y indexa todos los archivos de conocimiento"""
-        documents = []
-        metadatas = []
-        ids = []
-        
-        logger.info(f"Scanning directory: {self.data_path}")
-        
-        for root, dirs, files in os.walk(self.data_path):
-            for file in files:
+    @staticmethod
+    def _collection_name(generation: int) -> str:
+        return COLLECTION_NAME if generation == 0 else f"{COLLECTION_NAME}_g{generation}"
+
+    @staticmethod
+    def _generation_of(collection_name: str) -> Optional[int]:
+        if collection_name == COLLECTION_NAME:
+            return 0
+        prefix = f"{COLLECTION_NAME}_g"
+        if collection_name.startswith(prefix) and collection_name[len(prefix):].isdigit():
+            return int(collection_name[len(prefix):])
+        return None
+
+    def _pointer_path(self) -> Path:
+        return self.embeddings_path / POINTER_FILENAME
+
+    def _manifest_path(self, generation: int) -> Path:
+        return self.embeddings_path / f"index_manifest_g{generation}.json"
+
+    def _flat_store_path(self, generation: int) -> Path:
+        return self.embeddings_path / "flat" / f"g{generation}"
+
+    def _flat_lock_path(self, generation: int) -> Path:
+        return self.embeddings_path / "flat" / f"g{generation}.lock"
+
+    @staticmethod
+    def _partition_name(generation: int, category: str) -> str:
+        """Colección de Chroma con los chunks de una categoría de la generación"""
+        slug = re.sub(r"[^A-Za-z0-9_-]+", "-", category).strip("-_")[:30] or "uncategorized"
+        return f"{NutritionRAGIndexer._collection_name(generation)}__{slug}"
+
+    @staticmethod
+    def _export_collection(collection, batch_size: int = 1000) -> Dict[str, List]:
+        """Lee todos los chunks de una colección con sus embeddings"""
+        records = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+        total = collection.count()
+        for offset in range(0, total, batch_size):
+            batch = collection.get(include=["documents", "metadatas", "embeddings"], limit=batch_size, offset=offset)
+            for key in records:
+                records[key].extend(batch[key])
+        return records
+
+    def _build_flat_store(self, generation: int, collection, records: Optional[Dict[str, List]] = None,
+                          **options) -> FlatVectorStore:
+        """Exporta una colección de Chroma a la matriz del motor plano"""
+        records = records or self._export_collection(collection)
+        logger.info(f"Built flat vector store for generation {generation} ({len(records['ids'])} vectors)")
+        # The BM25 index shares records.json (and its row order) with the flat store
+        return FlatVectorStore.build(
+            self._flat_store_path(generation), records["ids"], records["documents"], records["metadatas"],
+            records["embeddings"], write_extra=lambda directory, ids, documents, metadatas: BM25Index.build(
+                ids, documents, metadatas
+            ).save(directory), **options
+        )
+
+    def _build_partitions(self, generation: int, collection, records: Optional[Dict[str, List]] = None) -> Dict:
+        """Copia los chunks de la generación a una colección por categoría, reutilizando sus embeddings"""
+        records = records or self._export_collection(collection)
+        rows: Dict[str, List[int]] = {}
+        for row, meta in enumerate(records["metadatas"]):
+            rows.setdefault((meta or {}).get("category", "unknown"), []).append(row)
+
+        self._drop_partitions(generation)
+        partitions = {}
+        for category, category_rows in sorted(rows.items()):
+            partition = self.chroma_client.create_collection(
+                name=self._partition_name(generation, category),
+                metadata={"hnsw:space": "cosine", "category": category},
+                embedding_function=self.embedding_function
+            )
+            for i in range(0, len(category_rows), INDEX_BATCH_SIZE):
+                batch = category_rows[i:i+INDEX_BATCH_SIZE]
+                partition.add(**{key: [records[key][row] for row in batch] for key in records})
+            partitions[category] = partition
+        logger.info(f"Built {len(partitions)} category partitions for generation {generation}")
+        return partitions
+
+    def _open_partitions(self, generation: int, collection) -> Dict:
+        """Particiones por categoría de una generación, creándolas si faltan o están incompletas"""
+        prefix = f"{self._collection_name(generation)}__"
+        partitions = {}
+        for existing in self.chroma_client.list_collections():
+            if existing.name.startswith(prefix):
+                partition = self.chroma_client.get_collection(existing.name, embedding_function=self.embedding_function)
+                partitions[(partition.metadata or {}).get("category", existing.name[len(prefix):])] = partition
+
+        if sum(partition.count() for partition in partitions.values()) != collection.count():
+            partitions = self._build_partitions(generation, collection)
+        return partitions
+
+    def _drop_partitions(self, generation: int):
+        prefix = f"{self._collection_name(generation)}__"
+        for existing in self.chroma_client.list_collections():
+            if existing.name.startswith(prefix):
+                self.chroma_client.delete_collection(existing.name)
+
+    def _collapse_duplicates(self, collection, records: Dict[str, List], files: Dict[str, Dict]) -> Dict:
+        """Guarda una sola vez los chunks casi duplicados de la generación.
+
+        Los chunks se recorren ordenados por archivo y posición, así el canónico de cada
+        grupo es siempre el primero y no depende del orden en que se escribieron. Sólo se
+        colapsan chunks con la misma metadata filtrable (categoría, tipo de comida,
+        dificultad, tiempo de preparación...), para que una búsqueda filtrada siga
+        encontrando el contenido de cualquiera de los archivos. Los
+        descartados se borran de la colección y de ``records``; el archivo que los generó
+        guarda en el manifest ``duplicates`` (chunk descartado -> canónico) y sus
+        estadísticas descuentan lo que ya no se almacena.
+        """
+        owners = {chunk_id: rel_path for rel_path, entry in files.items() for chunk_id in entry["chunk_ids"]}
+        rows = sorted(range(len(records["ids"])), key=lambda row: (
+            owners.get(records["ids"][row], ""),
+            (records["metadatas"][row] or {}).get("chunk_index", 0),
+            records["ids"][row]
+        ))
+
+        indexes: Dict[tuple, NearDuplicateIndex] = {}
+        dropped: Dict[str, str] = {}
+        dropped_rows: Dict[str, List[int]] = {}
+        for row in rows:
+            meta = records["metadatas"][row] or {}
+            group = tuple(meta.get(field) for field in BITMAP_FIELDS + RANGE_FIELDS)
+            index = indexes.setdefault(group, NearDuplicateIndex(threshold=DEDUP_THRESHOLD))
+            canonical_id = index.add(records["ids"][row], records["documents"][row])
+            if canonical_id is not None:
+                dropped[records["ids"][row]] = canonical_id
+                dropped_rows.setdefault(owners.get(records["ids"][row]), []).append(row)
+
+        report = {"chunks": len(dropped), "text_bytes": 0, "vector_bytes": 0}
+        if not dropped:
+            return report
+
+        dropped_ids = list(dropped)
+        for i in range(0, len(dropped_ids), INDEX_BATCH_SIZE):
+            collection.delete(ids=dropped_ids[i:i+INDEX_BATCH_SIZE])
+
+        vector_bytes = 4 * len(records["embeddings"][0])
+        encoding = _get_encoding()
+        for rel_path, file_rows in dropped_rows.items():
+            text_bytes = [len(records["documents"][row].encode('utf-8')) for row in file_rows]
+            report["text_bytes"] += sum(text_bytes)
+            report["vector_bytes"] += vector_bytes * len(file_rows)
+            if rel_path is None:
+                continue
+
+            entry = files[rel_path]
+            file_stats = dict(entry.get("stats") or {"chunks": len(entry["chunk_ids"])})
+            meal_types = dict(file_stats.get("meal_types", {}))
+            file_stats["chunks"] -= len(file_rows)
+            if "bytes" in file_stats:
+                file_stats["bytes"] -= sum(text_bytes)
+            if "tokens" in file_stats:
+                file_stats["tokens"] -= sum(len(encoding.encode(records["documents"][row])) for row in file_rows)
+            for row in file_rows:
+                meal_type = (records["metadatas"][row] or {}).get("meal_type")
+                if meal_types.get(meal_type):
+                    meal_types[meal_type] -= 1
+            file_stats["meal_types"] = {meal_type: count for meal_type, count in meal_types.items() if count}
+            file_stats["duplicate_chunks"] = file_stats.get("duplicate_chunks", 0) + len(file_rows)
+            file_stats["duplicate_bytes"] = file_stats.get("duplicate_bytes", 0) + sum(text_bytes)
+            file_stats["duplicate_vector_bytes"] = file_stats.get("duplicate_vector_bytes", 0) + vector_bytes * len(file_rows)
+
+            files[rel_path] = dict(
+                entry,
+                chunk_ids=[chunk_id for chunk_id in entry["chunk_ids"] if chunk_id not in dropped],
+                duplicates={**entry.get("duplicates", {}), **{records["ids"][row]: dropped[records["ids"][row]] for row in file_rows}},
+                stats=file_stats
+            )
+
+        # A canonical kept by an earlier generation can itself be collapsed into a new chunk
+        for rel_path, entry in files.items():
+            duplicates = entry.get("duplicates", {})
+            if any(canonical_id in dropped for canonical_id in duplicates.values()):
+                files[rel_path] = dict(entry, duplicates={
+                    chunk_id: dropped.get(canonical_id, canonical_id) for chunk_id, canonical_id in duplicates.items()
+                })
+
+        keep = [row for row in range(len(records["ids"])) if records["ids"][row] not in dropped]
+        for key in records:
+            records[key] = [records[key][row] for row in keep]
+
+        logger.info(
+            f"Collapsed {report['chunks']} near-duplicate chunks, saving {report['text_bytes']} bytes of text "
+            f"and {report['vector_bytes']} bytes of vectors"
+        )
+        return report
+
+    def _lexical_index(self) -> BM25Index:
+        """Índice BM25 de la generación activa (se carga la primera vez que se usa)"""
+        self._refresh_generation()
+        with self._generation_lock:
+            generation, collection = self.generation, self.collection
+            cached = self._lexical
+
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+
+        store = self._flat_store(generation, collection)
+        try:
+            index = BM25Index.load(store.directory, store.ids, store.documents, store.metadatas)
+        except FileNotFoundError:
+            # Store written before lexical.json was part of it
+            index = BM25Index.build(store.ids, store.documents, store.metadatas)
+
+        self._lexical = (generation, index)
+        return index
+
+    def _open_searcher(self, generation: int, collection):
+        """Objeto con ``query`` estilo Chroma según el backend configurado"""
+        if self.search_backend != "flat":
+            if not CATEGORY_PARTITIONS:
+                return collection
+            return PartitionedSearcher(collection, self._open_partitions(generation, collection))
+
+        store = self._flat_store(generation, collection, quantization=VECTOR_QUANTIZATION, rescore_factor=RESCORE_FACTOR)
+        return self._partitioned(store)
+
+    def _flat_store(self, generation: int, collection, **options) -> FlatVectorStore:
+        """Abre el motor plano de una generación, exportándolo de Chroma si todavía no existe.
+
+        La exportación toma un lock por generación (entre hilos y procesos) y vuelve a
+        intentar abrirlo con el lock tomado: sólo el primero la construye, el resto carga
+        el directorio que publicó.
+        """
+        path = self._flat_store_path(generation)
+        try:
+            return FlatVectorStore.load(path, **options)
+        except FileNotFoundError:
+            pass
+        with _file_lock(self._flat_lock_path(generation)):
+            try:
+                return FlatVectorStore.load(path, **options)
+            except FileNotFoundError:
+                return self._build_flat_store(generation, collection, **options)
+
+    @staticmethod
+    def _partitioned(store: FlatVectorStore):
+        if not CATEGORY_PARTITIONS or not store.partitions:
+            return store
+        return PartitionedSearcher(store, {category: store.partition(category) for category in store.partitions})
+
+    def _load_manifest(self, generation: int) -> Dict[str, Dict]:
+        """Carga el manifest de archivos indexados (ruta -> tamaño, mtime, hash, chunk ids)"""
+        manifest = self._read_manifest(generation)
+        if manifest and manifest.get("version") != MANIFEST_VERSION:
+            logger.info(f"Index manifest version {manifest.get('version')} is outdated, re-chunking all files")
+            return {}
+        return manifest.get("files", {})
+
+    def _read_manifest(self, generation: int) -> Dict:
+        try:
+            with open(self._manifest_path(generation), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Could not read index manifest, forcing full rebuild: {e}")
+            return {}
+
+    def _save_manifest(self, generation: int, files: Dict[str, Dict]) -> Dict:
+        """Guarda el manifest de una generación de forma atómica, con sus estadísticas agregadas"""
+        stats = _aggregate_stats(files)
+        path = self._manifest_path(generation)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "version": MANIFEST_VERSION,
+                "generation": generation,
+                "updated_at": datetime.now().isoformat(),
+                "stats": stats,
+                "files": files
+            }, f)
+        os.replace(tmp_path, path)
+        return stats
+
+    def _open_collection(self, generation: int):
+        return self.chroma_client.get_or_create_collection(
+            name=self._collection_name(generation),
+            metadata={"hnsw:space": "cosine"},
+            embedding_function=self.embedding_function
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embeddings de chunks, consultando primero el cache por contenido"""
+        return self.embedding_cache.embed(texts, self.embedding_function)
+
+    def _refresh_generation(self):
+        """Sigue el puntero de generación activa (otro proceso puede haberlo movido)"""
+        if self.snapshot_path is not None:
+            self._refresh_snapshot()
+            return
+
+        try:
+            pointer_mtime = os.stat(self._pointer_path()).st_mtime_ns
+        except FileNotFoundError:
+            pointer_mtime = None
+
+        if self.collection is not None and pointer_mtime == self._pointer_mtime:
+            return
+
+        generation = 0
+        if pointer_mtime is not None:
+            with open(self._pointer_path(), 'r', encoding='utf-8') as f:
+                generation = int(json.load(f)["generation"])
+
+        if self.collection is None or generation != self.generation:
+            self._activate(generation, self._open_collection(generation))
+        self._pointer_mtime = pointer_mtime
+
+    def warm_up(self):
+        """Carga el modelo de embeddings, el índice activo y (si se usa) el BM25 antes de recibir tráfico"""
+        self._vector_search(["plan alimentario"], 1, {})
+        if self.search_mode != "vector":
+            self._lexical_index()
+
+    def _refresh_snapshot(self):
+        """Mapea el snapshot configurado y lo vuelve a abrir cuando se reemplaza el archivo"""
+        snapshot_mtime = os.stat(self.snapshot_path).st_mtime_ns
+        if self.searcher is not None and snapshot_mtime == self._pointer_mtime:
+            return
+
+        snapshot = IndexSnapshot.load(
+            self.snapshot_path, quantization=VECTOR_QUANTIZATION, rescore_factor=RESCORE_FACTOR,
+            embedding_model=EMBEDDING_MODEL
+        )
+        manifest = snapshot.manifest
+        with self._generation_lock:
+            self.generation = snapshot.generation
+            self.searcher = self._partitioned(snapshot.store)
+            self.stats = manifest.get("stats") or _aggregate_stats(manifest.get("files", {}))
+            self.duplicate_references = _duplicate_references(manifest.get("files", {}))
+            self._lexical = (snapshot.generation, snapshot.lexical)
+        self._pointer_mtime = snapshot_mtime
+        logger.info(f"Mapped index snapshot {self.snapshot_path} (generation {snapshot.generation})")
+
+    def export_snapshot(self, path: str) -> Path:
+        """Exporta la generación activa (vectores, textos, metadata, BM25 y manifest) a un único archivo"""
+        if self.snapshot_path is not None:
+            raise RuntimeError("This indexer is serving a snapshot, export from the primary instead")
+        self._refresh_generation()
+        with self._generation_lock:
+            generation, collection = self.generation, self.collection
+
+        store = self._flat_store(generation, collection)
+        lexical = BM25Index.load(store.directory, store.ids, store.documents, store.metadatas)
+        manifest = self._read_manifest(generation) or {"generation": generation, "stats": self._scan_stats(collection)}
+        return IndexSnapshot.export(Path(path), store, lexical, manifest, generation, EMBEDDING_MODEL)
+
+    def _activate(self, generation: int, collection, stats: Optional[Dict] = None,
+                  references: Optional[Dict[str, List[str]]] = None):
+        if stats is None:
+            manifest = self._read_manifest(generation)
+            if manifest:
+                stats = manifest.get("stats") or _aggregate_stats(manifest.get("files", {}))
+            else:
+                stats = self._scan_stats(collection)
+            references = _duplicate_references(manifest.get("files", {}))
+        searcher = self._open_searcher(generation, collection)
+        with self._generation_lock:
+            if self.collection is not None and generation != self.generation:
+                self._retired.add(self.generation)
+            self.generation = generation
+            self.collection = collection
+            self.searcher = searcher
+            self.stats = stats
+            self.duplicate_references = references or {}
+
+    @staticmethod
+    def _scan_stats(collection) -> Dict:
+        """Estadísticas de una colección sin manifest (índices creados antes de llevarlo)"""
+        stats = _aggregate_stats({})
+        if not collection.count():
+            return stats
+
+        for meta in collection.get(include=["metadatas"])["metadatas"]:
+            meta = meta or {}
+            stats["total_chunks"] += 1
+            for key, name in (
+                ("chunks_per_category", meta.get("category", "unknown")),
+                ("chunks_per_source", meta.get("source", "unknown")),
+                ("chunks_per_meal_type", meta.get("meal_type"))
+            ):
+                if name is not None:
+                    stats[key][name] = stats[key].get(name, 0) + 1
+        stats["total_files"] = len(stats["chunks_per_source"])
+        return stats
+
+    def _publish_generation(self, generation: int, collection, stats: Dict,
+                            references: Optional[Dict[str, List[str]]] = None):
+        """Cambia atómicamente la generación activa al terminar de construirla"""
+        pointer_path = self._pointer_path()
+        tmp_path = pointer_path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "generation": generation,
+                "collection": collection.name,
+                "updated_at": datetime.now().isoformat()
+            }, f)
+        os.replace(tmp_path, pointer_path)
+
+        self._activate(generation, collection, stats, references)
+        self._pointer_mtime = os.stat(pointer_path).st_mtime_ns
+        logger.info(f"Switched to generation {generation} ({collection.name})")
+
+        # Generations left behind by earlier processes are retired too
+        for existing in self.chroma_client.list_collections():
+            existing_generation = self._generation_of(existing.name)
+            if existing_generation is not None and existing_generation < generation:
+                self._retired.add(existing_generation)
+        self._collect_garbage()
+
+    @contextmanager
+    def _reading(self):
+        """Fija la colección activa mientras dura una consulta"""
+        self._refresh_generation()
+        with self._generation_lock:
+            generation, searcher = self.generation, self.searcher
+            self._inflight[generation] = self._inflight.get(generation, 0) + 1
+        try:
+            yield searcher
+        finally:
+            with self._generation_lock:
+                self._inflight[generation] -= 1
+            if generation in self._retired:
+                self._collect_garbage()
+
+    def _collect_garbage(self):
+        """Elimina generaciones retiradas sin consultas en curso"""
+        with self._generation_lock:
+            drained = [
+                generation for generation in self._retired
+                if generation < self.generation - RETAIN_GENERATIONS and not self._inflight.get(generation)
+            ]
+            for generation in drained:
+                self._retired.discard(generation)
+                self._inflight.pop(generation, None)
+
+        for generation in drained:
+            try:
+                self.chroma_client.delete_collection(self._collection_name(generation))
+                self._drop_partitions(generation)
+                self._manifest_path(generation).unlink(missing_ok=True)
+                shutil.rmtree(self._flat_store_path(generation), ignore_errors=True)
+                self._flat_lock_path(generation).unlink(missing_ok=True)
+                logger.info(f"Dropped generation {generation}")
+            except Exception as e:
+                logger.warning(f"Could not drop generation {generation}: {e}")
+
+    def _next_generation(self) -> int:
+        generations = [self.generation]
+        for existing in self.chroma_client.list_collections():
+            existing_generation = self._generation_of(existing.name)
+            if existing_generation is not None:
+                generations.append(existing_generation)
+        return max(generations) + 1
+
+    def _copy_chunks(self, source, target, ids: List[str], batch_size: int = 100) -> int:
+        """Copia chunks ya embebidos de una generación a otra sin recalcular embeddings"""
+        copied = 0
+        for i in range(0, len(ids), batch_size):
+            batch = source.get(ids=ids[i:i+batch_size], include=["documents", "metadatas", "embeddings"])
+            if not batch["ids"]:
+                continue
+            target.add(
+                ids=batch["ids"],
+                documents=batch["documents"],
+                metadatas=batch["metadatas"],
+                embeddings=batch["embeddings"]
+            )
+            copied += len(batch["ids"])
+        return copied
+
+    def _discover_files(self) -> Dict[str, tuple]:
+        """Lista los archivos .txt de la base de conocimiento (ruta relativa -> (ruta, categoría))"""
+        files = {}
+        for root, dirs, filenames in os.walk(self.data_path):
+            for file in filenames:
                 if file.endswith('.txt'):
                     file_path = os.path.join(root, file)
-                    category = os.path.basename(root)
-                    
-                    logger.info(f"Processing: {file_path}")
-                    
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                        
-                        if not content.strip():
-                            logger.warning(f"Empty file: {file_path}")
-                            continue
-                        
-                        chunks = self.chunk_text(content)
-                        logger.info(f"Created {len(chunks)} chunks from {file}")
-                        
-                        for i, chunk in enumerate(chunks):
-                            doc_id = f"{file.replace('.txt', '')}_{i}_{category}"
-                            
-                            metadata = {
-                                "source": file,
-                                "category": category,
-                                "chunk_index": i,
-                                "timestamp": datetime.now().isoformat(),
-                                "file_path": file_path
-                            }
-                            
-                            # Add specific metadata for recipes
-                            if category == "recetas":
-                                recipe_meta = self.extract_recipe_metadata(chunk, file)
-                                metadata.update(recipe_meta)
-                            
-                            documents.append(chunk)
-                            metadatas.append(metadata)
-                            ids.append(doc_id)
-                            
-                    except Exception as e:
-                        logger.error(f"Error processing {file_path}: {e}")
-                        continue
-        
-        if not documents:
+                    rel_path = os.path.relpath(file_path, self.data_path)
+                    files[rel_path] = (file_path, os.path.basename(root))
+        return files
+
+    def load_and_index_files(
+        self,
+        full: bool = False,
+        progress_callback: Optional[Callable[[Dict], None]] = None,
+        cancel_event: Optional[threading.Event] = None
+    ) -> Dict:
+        """Indexa sólo los archivos nuevos, modificados o eliminados desde la última corrida.
+
+        Los archivos cuyo tamaño y mtime (o, si cambiaron, su hash sha256) coinciden con
+        el manifest no se vuelven a tokenizar ni embeber: sus chunks se copian a la nueva
+        generación. El índice se construye en una colección sombra y recién al final se
+        cambia el puntero de generación activa, así las búsquedas nunca ven un índice a
+        medio cargar. Con ``full=True`` se reconstruye todo el índice.
+
+        ``progress_callback`` recibe contadores de archivos y chunks procesados; si se
+        activa ``cancel_event`` se descarta la colección sombra y se lanza
+        ``IndexingCancelled`` sin tocar la generación activa.
+
+        El resumen incluye ``changed_chunk_ids``: los chunks de la generación anterior que
+        cambiaron o se eliminaron (``None`` si no hay manifest con qué compararlos).
+        Si no se encuentra ningún archivo o ninguno produce chunks, no se publica una
+        generación nueva y se sigue sirviendo la activa.
+
+        Un lock de archivo en ``embeddings_path`` serializa los reindexados de distintos
+        procesos (CLI y workers del API): el segundo espera y parte de la generación que
+        publicó el primero, en lugar de elegir el mismo número y borrarle la sombra.
+        """
+        if self.snapshot_path is not None:
+            raise RuntimeError("Snapshot replicas are read-only, reindex on the primary and export a new snapshot")
+        with self._index_lock, _file_lock(self.embeddings_path / INDEX_LOCK_FILENAME):
+            return self._build_generation(full, progress_callback, cancel_event)
+
+    def _build_generation(
+        self,
+        full: bool,
+        progress_callback: Optional[Callable[[Dict], None]],
+        cancel_event: Optional[threading.Event]
+    ) -> Dict:
+        progress = {"files_total": 0, "files_processed": 0, "chunks_total": 0, "chunks_processed": 0}
+
+        def report():
+            if progress_callback:
+                progress_callback(dict(progress))
+
+        def check_cancelled():
+            if cancel_event is not None and cancel_event.is_set():
+                raise IndexingCancelled("Reindexing cancelled")
+
+        self._refresh_generation()
+        live_generation, live_collection = self.generation, self.collection
+        # Without a manifest we can't tell which stored chunks are still valid
+        manifest = {} if full else self._load_manifest(live_generation)
+
+        stale_ids = []
+        new_manifest = {}
+        copy_ids = []
+        summary = {
+            "added": [], "changed": [], "removed": [], "unchanged": 0,
+            "chunks_indexed": 0, "chunks_copied": 0, "chunks_deleted": 0,
+            "generation": live_generation, "changed_chunk_ids": []
+        }
+
+        # Stage 1: discover files, skipping those whose size and mtime match the manifest
+        logger.info(f"Scanning directory: {self.data_path}")
+        files = self._discover_files()
+        if not files:
+            # A missing or empty data directory must not replace the live index with an empty one
             logger.warning("No documents to index!")
-            return
-        
-        # Clear existing collection and add new documents
+            return summary
+        progress["files_total"] = len(files)
+        tasks = []
+
+        for rel_path, (file_path, category) in sorted(files.items()):
+            previous = manifest.get(rel_path)
+            try:
+                stat = os.stat(file_path)
+            except OSError as e:
+                logger.error(f"Error processing {file_path}: {e}")
+                stat = None
+
+            if previous and (stat is None or (previous["size"] == stat.st_size and previous["mtime"] == stat.st_mtime)):
+                new_manifest[rel_path] = previous
+                copy_ids.extend(previous["chunk_ids"])
+                summary["unchanged"] += 1
+                progress["files_processed"] += 1
+            elif stat is not None:
+                tasks.append({
+                    "rel_path": rel_path,
+                    "file_path": file_path,
+                    "category": category,
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                    "previous_sha256": previous["sha256"] if previous else None
+                })
+
+        for rel_path in sorted(manifest.keys() - files.keys()):
+            stale_ids.extend(manifest[rel_path]["chunk_ids"])
+            summary["removed"].append(rel_path)
+
+        if DEDUP_ENABLED and manifest:
+            # Chunks collapsed into a chunk of a file that is re-chunked or removed may lose
+            # their canonical copy, so the files that produced them are chunked again too
+            owners = {chunk_id: rel_path for rel_path, entry in manifest.items() for chunk_id in entry["chunk_ids"]}
+            dirty = {task["rel_path"] for task in tasks} | set(summary["removed"])
+            forced = True
+            while forced:
+                forced = [rel_path for rel_path, entry in new_manifest.items()
+                          if any(owners.get(canonical_id) in dirty for canonical_id in entry.get("duplicates", {}).values())]
+                for rel_path in forced:
+                    entry = new_manifest.pop(rel_path)
+                    file_path, category = files[rel_path]
+                    tasks.append({
+                        "rel_path": rel_path,
+                        "file_path": file_path,
+                        "category": category,
+                        "size": entry["size"],
+                        "mtime": entry["mtime"],
+                        "previous_sha256": None
+                    })
+                    dirty.add(rel_path)
+                    summary["unchanged"] -= 1
+                    progress["files_processed"] -= 1
+            copy_ids = [chunk_id for entry in new_manifest.values() for chunk_id in entry["chunk_ids"]]
+        report()
+
+        def chunks_written(count: int):
+            progress["chunks_processed"] += count
+            summary["chunks_indexed"] += count
+            report()
+
+        # Stage 2 and 3: workers read and chunk files, a single writer batches them into the shadow
+        shadow = {}
+
+        def open_shadow():
+            generation = self._next_generation()
+            try:
+                self.chroma_client.delete_collection(self._collection_name(generation))
+            except Exception:
+                pass
+            shadow["generation"] = generation
+            shadow["collection"] = self._open_collection(generation)
+            logger.info(f"Building generation {generation} in {shadow['collection'].name}")
+            return shadow["collection"]
+
+        writer = _BatchWriter(open_shadow, self.embed_documents, INDEX_BATCH_SIZE, INDEX_QUEUE_SIZE, chunks_written)
+        writer.start()
+
         try:
-            self.collection.delete(where={})
-            logger.info("Cleared existing collection")
-        except:
-            pass
-        
-        # Add documents in batches
-        batch_size = 100
-        for i in range(0, len(documents), batch_size):
-            batch_docs = documents[i:i+batch_size]
-            batch_metas = metadatas[i:i+batch_size]
-            batch_ids = ids[i:i+batch_size]
-            
-            self.collection.add(
-                documents=batch_docs,
-                metadatas=batch_metas,
-                ids=batch_ids
-            )
-            logger.info(f"Indexed batch {i//batch_size + 1}/{(len(documents) + batch_size - 1)//batch_size}")
-        
-        logger.info(f"Successfully indexed {len(documents)} chunks from {len(set(m['source'] for m in metadatas))} files")
-        
-    def search(self, query: str, n_results: int = 5, category_filter: Optional[str] = None) -> List[Dict]:
+            for result in self._process_files(tasks, check_cancelled):
+                task = result["task"]
+                rel_path = task["rel_path"]
+                previous = manifest.get(rel_path)
+                progress["files_processed"] += 1
+
+                if result["status"] == "error":
+                    logger.error(f"Error processing {task['file_path']}: {result['error']}")
+                    # Keep serving whatever was indexed before for this file
+                    if previous:
+                        new_manifest[rel_path] = previous
+                        copy_ids.extend(previous["chunk_ids"])
+                    report()
+                    continue
+
+                if result["status"] == "unchanged":
+                    new_manifest[rel_path] = dict(previous, size=task["size"], mtime=task["mtime"])
+                    copy_ids.extend(previous["chunk_ids"])
+                    summary["unchanged"] += 1
+                    report()
+                    continue
+
+                if result["status"] == "empty":
+                    logger.warning(f"Empty file: {task['file_path']}")
+                else:
+                    logger.info(f"Created {len(result['ids'])} chunks from {os.path.basename(task['file_path'])}")
+
+                if previous:
+                    stale_ids.extend(set(previous["chunk_ids"]) - set(result["ids"]))
+                    summary["changed"].append(rel_path)
+                else:
+                    summary["added"].append(rel_path)
+
+                new_manifest[rel_path] = {
+                    "size": task["size"],
+                    "mtime": task["mtime"],
+                    "sha256": result["sha256"],
+                    "category": task["category"],
+                    "chunk_ids": result["ids"],
+                    "stats": result["stats"]
+                }
+                progress["chunks_total"] += len(result["ids"])
+                report()
+
+                writer.raise_if_failed()
+                if result["ids"]:
+                    writer.put(result["documents"], result["metadatas"], result["ids"])
+
+            writer.close()
+
+            if not summary["chunks_indexed"] and not copy_ids:
+                # Every file was empty or failed to load; keep serving the live generation
+                logger.warning("No documents to index!")
+                if "collection" in shadow:
+                    self.chroma_client.delete_collection(shadow["collection"].name)
+                summary.update(added=[], changed=[], removed=[])
+                return summary
+
+            if manifest and not (summary["added"] or summary["changed"] or summary["removed"]):
+                # Nothing to rebuild, just remember refreshed mtimes
+                self.stats = self._save_manifest(live_generation, new_manifest)
+                logger.info(f"Index up to date ({summary['unchanged']} files unchanged)")
+                return summary
+
+            check_cancelled()
+            collection = writer.ensure_collection()
+            progress["chunks_total"] += len(copy_ids)
+            summary["chunks_copied"] = self._copy_chunks(live_collection, collection, copy_ids)
+            progress["chunks_processed"] += summary["chunks_copied"]
+            report()
+        except BaseException:
+            if writer.is_alive():
+                writer.close_quietly()
+            # The live generation is untouched, just drop the half-built shadow
+            if "collection" in shadow:
+                self.chroma_client.delete_collection(shadow["collection"].name)
+            raise
+
+        generation = shadow["generation"]
+        # Only the structures the configured backend and mode serve from are built before the
+        # swap; any other (e.g. BM25 for a per-request lexical search) is built on first use
+        build_flat = self.search_backend == "flat" or self.search_mode != "vector" or bool(SNAPSHOT_EXPORT_PATH)
+        build_partitions = CATEGORY_PARTITIONS and self.search_backend != "flat"
+        records = None
+        if DEDUP_ENABLED or build_flat or build_partitions:
+            records = self._export_collection(collection)
+        if DEDUP_ENABLED:
+            duplicates = self._collapse_duplicates(collection, records, new_manifest)
+            summary["duplicates_collapsed"] = duplicates["chunks"]
+            summary["bytes_saved"] = duplicates["text_bytes"] + duplicates["vector_bytes"]
+        if build_flat:
+            self._build_flat_store(generation, collection, records)
+        if build_partitions:
+            self._build_partitions(generation, collection, records)
+        stats = self._save_manifest(generation, new_manifest)
+        # Lets result caches drop only the entries that referenced changed chunks
+        previous_files = manifest if not full else self._load_manifest(live_generation)
+        if previous_files or not live_collection.count():
+            summary["changed_chunk_ids"] = _changed_chunk_ids(previous_files, new_manifest)
+        else:
+            summary["changed_chunk_ids"] = None
+        self._publish_generation(generation, collection, stats, _duplicate_references(new_manifest))
+        if SNAPSHOT_EXPORT_PATH:
+            self.export_snapshot(SNAPSHOT_EXPORT_PATH)
+
+        summary["added"].sort()
+        summary["changed"].sort()
+        summary["generation"] = generation
+        summary["chunks_deleted"] = len(stale_ids)
+        logger.info(
+            f"Indexed {summary['chunks_indexed']} chunks from {len(summary['added']) + len(summary['changed'])} files "
+            f"({summary['unchanged']} unchanged, {len(summary['removed'])} removed)"
+        )
+        return summary
+
+    def _process_files(self, tasks: List[Dict], check_cancelled: Callable[[], None]):
+        """Procesa archivos en un pool de procesos, con un número acotado en vuelo"""
+        if self.workers <= 1 or len(tasks) <= 1:
+            for task in tasks:
+                check_cancelled()
+                logger.info(f"Processing: {task['file_path']}")
+                yield dict(_process_file(task), task=task)
+            return
+
+        max_in_flight = self.workers * 2
+        pending = {}
+        remaining = iter(tasks)
+        with ProcessPoolExecutor(
+            max_workers=min(self.workers, len(tasks)),
+            mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            try:
+                while True:
+                    check_cancelled()
+                    while len(pending) < max_in_flight:
+                        task = next(remaining, None)
+                        if task is None:
+                            break
+                        logger.info(f"Processing: {task['file_path']}")
+                        pending[pool.submit(_process_file, task)] = task
+                    if not pending:
+                        break
+
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        task = pending.pop(future)
+                        yield dict(future.result(), task=task)
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def search(self, query: str, n_results: int = 5, category_filter: Optional[str] = None,
+               mode: Optional[str] = None, query_embedding: Optional[List[float]] = None, **filters) -> List[Dict]:
         """Busca información relevante en la base de conocimiento"""
-        where_clause = {}
-        if category_filter:
-            where_clause["category"] = category_filter
-        
+        query_embeddings = [query_embedding] if query_embedding is not None else None
+        return self.search_many([query], n_results, category_filter, mode, query_embeddings=query_embeddings, **filters)[0]
+
+    def search_many(self, queries: List[str], n_results: int = 5, category_filter: Optional[str] = None,
+                    mode: Optional[str] = None, meal_type: Optional[str] = None, difficulty: Optional[str] = None,
+                    max_prep_minutes: Optional[int] = None,
+                    query_embeddings: Optional[List[List[float]]] = None) -> List[List[Dict]]:
+        """Busca varias consultas con un solo embedding por lotes y una sola consulta vectorial.
+
+        ``mode`` (por defecto RAG_SEARCH_MODE): ``vector``; ``hybrid`` fusiona BM25 y
+        vectores con RRF; ``auto`` responde sólo con BM25 (sin calcular embeddings) cuando
+        la coincidencia léxica es segura y si no usa ``hybrid``; ``lexical`` sólo BM25. En
+        los modos léxicos ``distance`` es 1 - puntaje RRF normalizado (0 = mejor).
+
+        ``meal_type``, ``difficulty`` y ``max_prep_minutes`` filtran recetas por su
+        metadata antes de puntuar (con el motor plano, usando los bitmaps de atributos).
+        Los chunks que representan a otros casi idénticos llevan en ``duplicate_sources``
+        los archivos de donde venían esas copias. ``query_embeddings``, si se pasan (uno
+        por consulta), evitan volver a calcular los embeddings.
+        """
+        if not queries:
+            return []
+
+        mode = mode or self.search_mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+
+        where_clause = _where_clause(category_filter, meal_type, difficulty, max_prep_minutes)
+
+        results: List[Optional[List[Dict]]] = [None] * len(queries)
+        lexical_hits: List[List[Dict]] = [[] for _ in queries]
+
         try:
-            results = self.collection.query(
-                query_texts=[query],
+            if mode != "vector":
+                lexical = self._lexical_index()
+                for i, query in enumerate(queries):
+                    hits = lexical.search(query, n_results * 2, where_clause or None)
+                    if mode == "lexical" or (mode == "auto" and lexical.is_confident(query, hits, n_results)):
+                        results[i] = _fuse([hits], n_results)
+                        self.search_counters["lexical_fast_path" if mode == "auto" else "lexical"] += 1
+                    else:
+                        lexical_hits[i] = hits
+
+            pending = [i for i, result in enumerate(results) if result is None]
+            if pending:
+                fetch = n_results if mode == "vector" else n_results * 2
+                vector_results = self._vector_search(
+                    [queries[i] for i in pending], fetch, where_clause,
+                    [query_embeddings[i] for i in pending] if query_embeddings is not None else None
+                )
+                for i, vector_hits in zip(pending, vector_results):
+                    if mode == "vector":
+                        results[i] = vector_hits
+                    else:
+                        results[i] = _fuse([vector_hits, lexical_hits[i]], n_results)
+                    self.search_counters["vector" if mode == "vector" else "hybrid"] += 1
+
+            references = self.duplicate_references
+            for hits in results:
+                for hit in hits:
+                    if hit["id"] in references:
+                        hit["metadata"] = dict(hit["metadata"] or {}, duplicate_sources=references[hit["id"]])
+            return results
+        except Exception as e:
+            logger.error(f"Search error: {e}")
+            return [[] for _ in queries]
+
+    def get_chunks(self, ids: List[str]) -> Dict[str, Dict]:
+        """Texto y metadata de chunks de la generación activa, por id (los que no existen se omiten).
+
+        Permite guardar resultados de búsqueda como ids y distancias y reconstruirlos después.
+        """
+        with self._reading() as searcher:
+            store = searcher.base if isinstance(searcher, PartitionedSearcher) else searcher
+            records = store.get(ids=list(ids), include=["documents", "metadatas"])
+
+        references = self.duplicate_references
+        chunks = {}
+        for doc_id, doc, meta in zip(records["ids"], records["documents"], records["metadatas"]):
+            if doc_id in references:
+                meta = dict(meta or {}, duplicate_sources=references[doc_id])
+            chunks[doc_id] = {"text": doc, "metadata": meta}
+        return chunks
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embeddings de consultas, pasando por el cache de consultas si hay uno configurado"""
+        def compute(texts: List[str]) -> List[List[float]]:
+            self.search_counters["queries_embedded"] += len(texts)
+            return self.embedding_function(texts)
+
+        if self.query_embedding_cache is not None:
+            return self.query_embedding_cache.embed(queries, compute)
+        return compute(queries)
+
+    def _vector_search(self, queries: List[str], n_results: int, where_clause: Dict,
+                       query_embeddings: Optional[List[List[float]]] = None) -> List[List[Dict]]:
+        if query_embeddings is None:
+            query_embeddings = self.embed_queries(queries)
+        with self._reading() as searcher:
+            results = searcher.query(
+                query_embeddings=query_embeddings,
                 n_results=n_results,
                 where=where_clause if where_clause else None
             )
-            
-            return [{
-                "text": doc,
-                "metadata": meta,
-                "distance": dist
-            } for doc, meta, dist in zip(
-                results['documents'][0],
-                results['metadatas'][0],
-                results['distances'][0]
+
+        return [[{
+            "id": doc_id,
+            "text": doc,
+            "metadata": meta,
+            "distance": dist
+        } for doc_id, doc, meta, dist in zip(ids, documents, metadatas, distances)]
+            for ids, documents, metadatas, distances in zip(
+                results['ids'],
+                results['documents'],
+                results['metadatas'],
+                results['distances']
             )]
-        except Exception as e:
-            logger.error(f"Search error: {e}")
-            return []
 
-    def get_stats(self) -> Dict:
-        """Obtiene estadísticas de la colección"""
+    def active_generation(self) -> int:
+        """Generación activa, siguiendo el puntero si otro proceso lo movió"""
+        self._refresh_generation()
+        return self.generation
+
+    def generation_is_current(self) -> bool:
+        """Si ``generation`` sigue siendo la publicada; sólo hace un ``stat``, sin abrir ningún índice"""
+        if self.searcher is None:
+            return False
+        path = self.snapshot_path if self.snapshot_path is not None else self._pointer_path()
         try:
-            count = self.collection.count()
-            
-            # Get sample to analyze categories
-            sample = self.collection.peek(limit=min(count, 100))
-            categories = set()
-            sources = set()
-            
-            for meta in sample.get('metadatas', []):
-                if meta:
-                    categories.add(meta.get('category', 'unknown'))
-                    sources.add(meta.get('source', 'unknown'))
-            
-            return {
-                "total_chunks": count,
-                "categories": list(categories),
-                "sources": list(sources),
-                "collection_name": self.collection.name
-            }
-        except Exception as e:
-            logger.error(f"Stats error: {e}")
-            return {"error": str(e)}
+            return os.stat(path).st_mtime_ns == self._pointer_mtime
+        except FileNotFoundError:
+            return self._pointer_mtime is None
+
+    def get_stats(self) -> Dict:
+        """Obtiene estadísticas de la colección (mantenidas al indexar, sin consultar Chroma)"""
+        self._refresh_generation()
+        with self._generation_lock:
+            generation, collection, searcher, stats = self.generation, self.collection, self.searcher, self.stats
+
+        if isinstance(searcher, PartitionedSearcher):
+            stats = dict(stats, search_partitions=sorted(searcher.partitions))
+            searcher = searcher.base
+        if isinstance(searcher, FlatVectorStore):
+            stats = dict(stats, vector_quantization=searcher.quantization, vector_resident_bytes=searcher.resident_bytes())
+
+        return {
+            **stats,
+            "categories": sorted(stats.get("chunks_per_category", {})),
+            "sources": sorted(stats.get("chunks_per_source", {})),
+            "collection_name": collection.name if collection is not None else None,
+            "snapshot": str(self.snapshot_path) if self.snapshot_path else None,
+            "generation": generation,
+            "search_backend": self.search_backend,
+            "search_mode": self.search_mode,
+            "search_counters": dict(self.search_counters),
+            "query_embedding_cache": self.query_embedding_cache.stats() if self.query_embedding_cache else None,
+            "embedding_cache": self.embedding_cache.stats()
+        }
 
 if __name__ == "__main__":
     import sys
@@ -268,7 +1474,10 @@ if __name__ == "__main__":
     # Create indexer and run
     indexer = NutritionRAGIndexer(data_path, embeddings_path, openai_api_key)
     
-    if len(sys.argv) > 1 and sys.argv[1] == "search":
+    if len(sys.argv) > 2 and sys.argv[1] == "export-snapshot":
+        path = indexer.export_snapshot(sys.argv[2])
+        print(f"Snapshot of generation {indexer.generation} written to {path} ({path.stat().st_size} bytes)")
+    elif len(sys.argv) > 1 and sys.argv[1] == "search":
         # Test search
         query = " ".join(sys.argv[2:]) if len(sys.argv) > 2 else "desayuno proteico"
         results = indexer.search(query, n_results=3)
@@ -282,12 +1491,17 @@ if __name__ == "__main__":
             print(f"   Text: {result['text'][:200]}...")
             print()
     else:
-        # Index files
-        indexer.load_and_index_files()
+        # Index files ("full" forces a complete rebuild)
+        summary = indexer.load_and_index_files(full=len(sys.argv) > 1 and sys.argv[1] == "full")
         
         # Show stats
         stats = indexer.get_stats()
         print(f"\nIndexing complete!")
+        print(f"Files: {len(summary['added'])} added, {len(summary['changed'])} changed, "
+              f"{len(summary['removed'])} removed, {summary['unchanged']} unchanged")
         print(f"Total chunks: {stats.get('total_chunks', 0)}")
+        if stats.get("duplicate_chunks"):
+            saved = stats["duplicate_bytes"] + stats["duplicate_vector_bytes"]
+            print(f"Near-duplicates collapsed: {stats['duplicate_chunks']} chunks ({saved / 1024:.1f} KB saved)")
         print(f"Categories: {', '.join(stats.get('categories', []))}")
         print(f"Sources: {len(stats.get('sources', []))} files")
\ No newline at end of file
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Index Snapshot for Nutrition Bot
+Exporta e importa el índice completo como un único archivo versionado y mapeable en memoria
+"""
+
+import os
+import json
+import struct
+import logging
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+
+from vector_store import FlatVectorStore, quantize
+from lexical_index import BM25Index
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"RAGSNAP\0"
+SNAPSHOT_VERSION = 1
+# magic, format version, reserved, header offset, header length
+PREFIX = struct.Struct("<8sIIQQ")
+# Sections start on a 64-byte boundary so the arrays can be memory-mapped directly
+ALIGNMENT = 64
+
+class SnapshotError(Exception):
+    """El archivo no es un snapshot válido o tiene una versión incompatible"""
+
+class IndexSnapshot:
+    """Snapshot abierto: motor plano, índice BM25 y manifest de una generación.
+
+    Layout del archivo::
+
+        prefijo fijo | vectores float32 | códigos float16 | códigos int8 | escalas int8 |
+        records (JSON) | índice léxico (JSON) | header (JSON)
+
+    El header, al final, guarda offset, dtype y forma de cada sección junto con la
+    generación, el modelo de embeddings y el manifest. Las matrices se abren con
+    ``np.memmap`` sin copiarlas: una réplica puede servir apenas lee el header y los
+    records, y todos los procesos que mapean el mismo archivo comparten sus páginas.
+    """
+
+    def __init__(self, path: Path, header: Dict, store: FlatVectorStore, lexical: BM25Index):
+        self.path = path
+        self.header = header
+        self.store = store
+        self.lexical = lexical
+
+    @property
+    def generation(self) -> int:
+        return self.header["generation"]
+
+    @property
+    def manifest(self) -> Dict:
+        return self.header["manifest"]
+
+    @classmethod
+    def export(cls, path: Path, store: FlatVectorStore, lexical: BM25Index, manifest: Dict,
+               generation: int, embedding_model: str) -> Path:
+        """Escribe el snapshot en ``path`` de forma atómica (los lectores conservan el archivo anterior)"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+
+        vectors = np.ascontiguousarray(store.vectors, dtype=np.float32)
+        arrays = {"vectors": vectors, **quantize(vectors)}
+        blobs = {
+            "records": json.dumps({
+                "ids": store.ids,
+                "documents": store.documents,
+                "metadatas": store.metadatas,
+                "partitions": store.partitions
+            }).encode('utf-8'),
+            "lexical": json.dumps(lexical.state()).encode('utf-8')
+        }
+
+        sections = {}
+        with open(tmp_path, 'wb') as f:
+            f.write(b"\0" * PREFIX.size)
+            for name, array in arrays.items():
+                offset = _align(f)
+                f.write(array.tobytes())
+                sections[name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+            for name, blob in blobs.items():
+                offset = _align(f)
+                f.write(blob)
+                sections[name] = {"offset": offset, "length": len(blob)}
+
+            header = json.dumps({
+                "version": SNAPSHOT_VERSION,
+                "created_at": datetime.now().isoformat(),
+                "generation": generation,
+                "embedding_model": embedding_model,
+                "count": store.count(),
+                "sections": sections,
+                "manifest": manifest
+            }).encode('utf-8')
+            header_offset = _align(f)
+            f.write(header)
+            f.seek(0)
+            f.write(PREFIX.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, header_offset, len(header)))
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, path)
+        logger.info(f"Exported index snapshot of generation {generation} to {path} ({store.count()} chunks)")
+        return path
+
+    @classmethod
+    def load(cls, path: Path, quantization: str = "none", rescore_factor: int = 4,
+             embedding_model: Optional[str] = None) -> "IndexSnapshot":
+        path = Path(path)
+        with open(path, 'rb') as f:
+            magic, version, _, header_offset, header_length = PREFIX.unpack(f.read(PREFIX.size))
+            if magic != SNAPSHOT_MAGIC:
+                raise SnapshotError(f"{path} is not an index snapshot")
+            if version != SNAPSHOT_VERSION:
+                raise SnapshotError(f"Unsupported snapshot version {version} (expected {SNAPSHOT_VERSION})")
+            f.seek(header_offset)
+            header = json.loads(f.read(header_length))
+            sections = header["sections"]
+
+            def blob(name: str) -> Dict:
+                f.seek(sections[name]["offset"])
+                return json.loads(f.read(sections[name]["length"]))
+
+            records = blob("records")
+            lexical_state = blob("lexical")
+
+        if embedding_model and header["embedding_model"] != embedding_model:
+            raise SnapshotError(
+                f"Snapshot was built with {header['embedding_model']}, this indexer uses {embedding_model}"
+            )
+
+        def array(name: str) -> np.ndarray:
+            section = sections[name]
+            shape = tuple(section["shape"])
+            if not all(shape):
+                return np.zeros(shape, dtype=section["dtype"])
+            return np.memmap(path, dtype=section["dtype"], mode="r", offset=section["offset"], shape=shape)
+
+        codes, scales = None, None
+        if quantization == "float16":
+            codes = array("float16")
+        elif quantization == "int8":
+            codes, scales = array("int8"), array("scales")
+
+        store = FlatVectorStore(
+            path, array("vectors"), records["ids"], records["documents"], records["metadatas"],
+            quantization=quantization, rescore_factor=rescore_factor, codes=codes, scales=scales,
+            partitions=records.get("partitions")
+        )
+        lexical = BM25Index.from_state(lexical_state, store.ids, store.documents, store.metadatas)
+        return cls(path, header, store, lexical)
+
+def _align(f) -> int:
+    """Rellena con ceros hasta el próximo múltiplo de ALIGNMENT y devuelve el offset"""
+    offset = f.tell()
+    padding = -offset % ALIGNMENT
+    f.write(b"\0" * padding)
+    return offset + padding
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Flat Vector Store for Nutrition Bot
+Búsqueda exacta por producto punto sobre una matriz float32 mapeada en memoria
+"""
+
+import os
+import json
+import shutil
+import logging
+import tempfile
+from pathlib import Path
+from typing import Callable, List, Dict, Optional
+
+import numpy as np
+
+from partitioned_search import PARTITION_FIELD
+from attribute_index import AttributeIndex
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILENAME = "vectors.npy"
+FLOAT16_FILENAME = "codes_float16.npy"
+INT8_FILENAME = "codes_int8.npy"
+INT8_SCALES_FILENAME = "scales_int8.npy"
+RECORDS_FILENAME = "records.json"
+QUANTIZATION_MODES = ("none", "float16", "int8")
+# Rows scored per block when reading quantized codes, bounds the float32 temporaries
+SCORE_BLOCK_ROWS = 8192
+
+class FlatVectorStore:
+    """Índice exacto en memoria para colecciones chicas.
+
+    Los embeddings normalizados viven en un ``.npy`` contiguo que se abre con
+    ``mmap_mode="r"``: todos los workers de uvicorn comparten las mismas páginas a
+    través del page cache. ids, textos y metadata se guardan como listas paralelas a
+    las filas de la matriz. ``query`` imita la firma y el formato de
+    ``chromadb.Collection.query`` (distancia coseno = 1 - similitud).
+
+    Con ``quantization`` en ``float16`` o ``int8`` (un factor de escala por vector) la
+    primera pasada recorre sólo los códigos compactos cargados en memoria; los
+    ``rescore_factor * k`` mejores candidatos se vuelven a puntuar contra la matriz
+    float32, de la que sólo se leen del disco esas filas.
+    """
+
+    def __init__(self, directory: Path, vectors: np.ndarray, ids: List[str], documents: List[str], metadatas: List[Dict],
+                 quantization: str = "none", rescore_factor: int = 4, codes: Optional[np.ndarray] = None,
+                 scales: Optional[np.ndarray] = None, partitions: Optional[Dict[str, List[int]]] = None):
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode: {quantization}")
+        self.directory = directory
+        self.name = directory.name
+        self.vectors = vectors
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.quantization = quantization
+        self.rescore_factor = max(1, rescore_factor)
+        self.codes = codes
+        self.scales = scales
+        # Category -> [start, end) rows; rows are stored grouped by category
+        self.partitions = partitions or {}
+        self._attributes: Optional[AttributeIndex] = None
+        self._rows: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def build(cls, directory: Path, ids: List[str], documents: List[str], metadatas: List[Dict],
+              embeddings: List[List[float]], write_extra: Optional[Callable] = None, **options) -> "FlatVectorStore":
+        """Escribe el índice en ``directory`` de forma atómica y lo abre.
+
+        Las filas se ordenan por categoría para que cada una ocupe un rango contiguo
+        de la matriz; ``partition`` devuelve ese rango como un índice independiente.
+        ``write_extra(tmp_directory, ids, documents, metadatas)`` agrega archivos que
+        comparten ese orden de filas (p. ej. el BM25) antes de publicar el directorio,
+        que sólo aparece en ``directory`` una vez completo.
+        """
+        directory = Path(directory)
+        order = sorted(range(len(ids)), key=lambda i: str((metadatas[i] or {}).get(PARTITION_FIELD, "")))
+        ids = [ids[i] for i in order]
+        documents = [documents[i] for i in order]
+        metadatas = [metadatas[i] for i in order]
+        embeddings = [embeddings[i] for i in order]
+        partitions: Dict[str, List[int]] = {}
+        for row, meta in enumerate(metadatas):
+            category = (meta or {}).get(PARTITION_FIELD)
+            if category is not None:
+                partitions.setdefault(category, [row, row])[1] = row + 1
+
+        # One scratch directory per builder, so concurrent builds never write into each other's files
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        tmp_directory = Path(tempfile.mkdtemp(prefix=directory.name + ".tmp", dir=directory.parent))
+
+        try:
+            if ids:
+                vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+            else:
+                vectors = np.zeros((0, 0), dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors /= np.where(norms == 0, 1.0, norms)
+            np.save(tmp_directory / VECTORS_FILENAME, vectors)
+
+            # Compact codes for every mode, so the quantization setting can change without a rebuild
+            codes = quantize(vectors)
+            np.save(tmp_directory / FLOAT16_FILENAME, codes["float16"])
+            np.save(tmp_directory / INT8_FILENAME, codes["int8"])
+            np.save(tmp_directory / INT8_SCALES_FILENAME, codes["scales"])
+
+            with open(tmp_directory / RECORDS_FILENAME, 'w', encoding='utf-8') as f:
+                json.dump({"ids": ids, "documents": documents, "metadatas": metadatas, "partitions": partitions}, f)
+            if write_extra is not None:
+                write_extra(tmp_directory, ids, documents, metadatas)
+
+            shutil.rmtree(directory, ignore_errors=True)
+            os.replace(tmp_directory, directory)
+        except BaseException:
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+            raise
+        return cls.load(directory, **options)
+
+    @classmethod
+    def load(cls, directory: Path, quantization: str = "none", rescore_factor: int = 4) -> "FlatVectorStore":
+        directory = Path(directory)
+        vectors = np.load(directory / VECTORS_FILENAME, mmap_mode="r")
+        codes, scales = None, None
+        if quantization == "float16":
+            codes = np.load(directory / FLOAT16_FILENAME)
+        elif quantization == "int8":
+            codes = np.load(directory / INT8_FILENAME)
+            scales = np.load(directory / INT8_SCALES_FILENAME)
+        with open(directory / RECORDS_FILENAME, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        # Stores written before partitioning have no "partitions" and are searched as a whole
+        return cls(directory, vectors, records["ids"], records["documents"], records["metadatas"],
+                   quantization=quantization, rescore_factor=rescore_factor, codes=codes, scales=scales,
+                   partitions=records.get("partitions"))
+
+    def partition(self, category: str) -> "FlatVectorStore":
+        """Sub-índice de una categoría: vistas sobre su rango de filas, sin copiar datos"""
+        start, end = self.partitions[category]
+        return FlatVectorStore(
+            self.directory, self.vectors[start:end], self.ids[start:end], self.documents[start:end],
+            self.metadatas[start:end], quantization=self.quantization, rescore_factor=self.rescore_factor,
+            codes=self.codes[start:end] if self.codes is not None else None,
+            scales=self.scales[start:end] if self.scales is not None else None
+        )
+
+    def resident_bytes(self) -> int:
+        """Bytes que la primera pasada necesita tener en memoria"""
+        if self.codes is None:
+            return self.vectors.nbytes
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10, where: Optional[Dict] = None, **kwargs) -> Dict:
+        """Top-k exacto por similitud coseno"""
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1.0, norms)
+
+        candidates = self._filter(where)
+        if self.count() == 0 or (candidates is not None and len(candidates) == 0):
+            for key in results:
+                results[key] = [[] for _ in range(len(queries))]
+            return results
+
+        k = min(n_results, self.count() if candidates is None else len(candidates))
+        for query in queries:
+            top, scores = self._top_k(query, k, candidates)
+            positions = top if candidates is None else candidates[top]
+
+            results["ids"].append([self.ids[i] for i in positions])
+            results["documents"].append([self.documents[i] for i in positions])
+            results["metadatas"].append([self.metadatas[i] for i in positions])
+            results["distances"].append([float(1.0 - score) for score in scores])
+
+        return results
+
+    def _top_k(self, query: np.ndarray, k: int, candidates: Optional[np.ndarray]):
+        """Índices (relativos a ``candidates``) y similitudes de los k mejores"""
+        if self.codes is None:
+            matrix = self.vectors if candidates is None else self.vectors[candidates]
+            return _best(matrix @ query, k)
+
+        # First pass over the compact codes, then exact re-scoring of the shortlist
+        approximate = self._approximate_scores(query, candidates)
+        shortlist, _ = _best(approximate, min(len(approximate), k * self.rescore_factor))
+        rows = shortlist if candidates is None else candidates[shortlist]
+        exact = np.asarray(self.vectors[np.sort(rows)], dtype=np.float32) @ query
+        order = np.argsort(rows)
+        exact_scores = np.empty(len(rows), dtype=np.float32)
+        exact_scores[order] = exact
+        best, scores = _best(exact_scores, k)
+        return shortlist[best], scores
+
+    def _approximate_scores(self, query: np.ndarray, candidates: Optional[np.ndarray]) -> np.ndarray:
+        rows = np.arange(self.count()) if candidates is None else candidates
+        scores = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), SCORE_BLOCK_ROWS):
+            block = rows[start:start + SCORE_BLOCK_ROWS]
+            codes = self.codes[block] if candidates is not None else self.codes[start:start + SCORE_BLOCK_ROWS]
+            block_scores = codes.astype(np.float32) @ query
+            if self.scales is not None:
+                block_scores *= self.scales[block]
+            scores[start:start + len(block)] = block_scores
+        return scores
+
+    def _filter(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        """Filas que cumplen un filtro estilo Chroma, resuelto con los bitmaps de atributos"""
+        if not where:
+            return None
+        return self.attributes().rows(where)
+
+    def get(self, ids: List[str], include: Optional[List[str]] = None, **kwargs) -> Dict:
+        """Documentos y metadata por id, como ``Collection.get`` (los ids que no existen se omiten)"""
+        if self._rows is None:
+            self._rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        rows = [self._rows[doc_id] for doc_id in ids if doc_id in self._rows]
+        return {
+            "ids": [self.ids[row] for row in rows],
+            "documents": [self.documents[row] for row in rows],
+            "metadatas": [self.metadatas[row] for row in rows]
+        }
+
+    def attributes(self) -> AttributeIndex:
+        """Bitmaps de metadata, construidos la primera vez que se filtra"""
+        if self._attributes is None:
+            self._attributes = AttributeIndex(self.metadatas)
+        return self._attributes
+
+def quantize(vectors: np.ndarray) -> Dict[str, np.ndarray]:
+    """Códigos float16 e int8 (con un factor de escala por vector) de una matriz normalizada"""
+    scales = np.abs(vectors).max(axis=1) / 127.0 if len(vectors) else np.zeros(0, dtype=np.float32)
+    scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+    return {
+        "float16": vectors.astype(np.float16),
+        "int8": np.round(vectors / scales[:, None]).astype(np.int8),
+        "scales": scales
+    }
+
+def _best(scores: np.ndarray, k: int):
+    """Top-k por puntaje descendente con argpartition"""
+    top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return top, scores[top]
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Embedding Batcher for Nutrition Bot
+Agrupa los embeddings de consultas concurrentes en una sola llamada al proveedor
+"""
+
+import asyncio
+import logging
+from typing import List, Dict, Callable
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the batch-size histogram buckets (larger batches fall in "inf")
+HISTOGRAM_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+class EmbeddingBatcher:
+    """Micro-batcher asíncrono de embeddings de consultas.
+
+    La primera consulta que llega abre una ventana de ``window_ms``; las que llegan
+    mientras tanto esperan en la misma tanda, que se envía al cerrarse la ventana o
+    apenas junta ``max_batch`` consultas. ``embed`` (sincrónica, corre en un hilo)
+    recibe los textos sin repetir y cada consulta recibe su vector por un future, así
+    un pico de búsquedas cuesta una llamada por ventana en lugar de una por request.
+    """
+
+    def __init__(self, embed: Callable[[List[str]], List[List[float]]], window_ms: float = 5, max_batch: int = 64):
+        self._embed = embed
+        self.window = max(0.0, window_ms) / 1000
+        self.max_batch = max(1, max_batch)
+        self._pending: List[tuple] = []
+        self._timer = None
+        self._tasks = set()
+        self.batches = 0
+        self.requests = 0
+        self.texts = 0
+        self.histogram = {str(bound): 0 for bound in HISTOGRAM_BUCKETS}
+        self.histogram["inf"] = 0
+
+    async def embed(self, text: str) -> List[float]:
+        """Vector de ``text``, calculado junto con las demás consultas de la ventana"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[tuple]):
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        self._record(len(batch), len(texts))
+        try:
+            vectors = await asyncio.to_thread(self._embed, texts)
+        except Exception as e:
+            logger.error(f"Error embedding batch of {len(texts)} queries: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_text = dict(zip(texts, vectors))
+        for text, future in batch:
+            # Requests whose client went away have a cancelled future
+            if not future.done():
+                future.set_result(by_text[text])
+
+    def _record(self, requests: int, texts: int):
+        self.batches += 1
+        self.requests += requests
+        self.texts += texts
+        bucket = next((str(bound) for bound in HISTOGRAM_BUCKETS if requests <= bound), "inf")
+        self.histogram[bucket] += 1
+
+    def stats(self) -> Dict:
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "requests": self.requests,
+            "texts": self.texts,
+            "mean_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "batch_size_histogram": dict(self.histogram)
+        }
@@ -5,13 +5,14 @@ Procesa documentos Word y proporciona búsqueda contextual para n8n
 """
 
 import os
+import sys
 import logging
 from typing import List, Dict, Optional
 from pathlib import Path
 
 from fastapi import FastAPI, HTTPException, UploadFile, File, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import chromadb
 from chromadb.config import Settings
 from openai import OpenAI
@@ -19,6 +20,13 @@ from docx import Document
 from dotenv import load_dotenv
 import uvicorn
 
+# Shared with the main RAG system: in a checkout they live in rag-system/scripts,
+# deploy-rag-api.sh copies them next to this file
+sys.path.append(str(Path(__file__).resolve().parent.parent / "rag-system" / "scripts"))
+from embedding_cache import EmbeddingCache
+from embedding_batcher import EmbeddingBatcher
+from lexical_index import BM25Index, fuse_hits
+
 # Load environment variables
 load_dotenv()
 
@@ -33,10 +41,21 @@ COLLECTION_NAME = os.getenv("COLLECTION_NAME", "nutrition_knowledge")
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "500"))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "50"))
 MAX_SEARCH_RESULTS = int(os.getenv("MAX_SEARCH_RESULTS", "5"))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.sqlite")
+EMBEDDING_CACHE_MAX_MB = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "512"))
+# vector | hybrid (BM25 + vector, RRF) | auto (lexical fast path, else hybrid) | lexical
+SEARCH_MODE = os.getenv("SEARCH_MODE", "vector")
+# Concurrent search queries are embedded together: one provider call per window or full batch
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "64"))
 
 # Initialize OpenAI client
 openai_client = OpenAI(api_key=OPENAI_API_KEY)
 
+# Content-addressed embedding cache shared by uploads and searches
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_MODEL, EMBEDDING_CACHE_MAX_MB * 1024 * 1024)
+
 # Initialize FastAPI
 app = FastAPI(
     title="Mini RAG API - Nutrición",
@@ -69,10 +88,27 @@ def get_chroma_client():
 # Global ChromaDB client
 chroma_client = get_chroma_client()
 
+# BM25 index over the collection, rebuilt lazily after uploads and deletes
+lexical_index: Optional[BM25Index] = None
+
+def get_lexical_index(collection) -> BM25Index:
+    """Return the BM25 index, building it from the collection if needed"""
+    global lexical_index
+    if lexical_index is None:
+        docs = collection.get()
+        lexical_index = BM25Index.build(docs['ids'], docs['documents'], docs['metadatas'])
+        logger.info(f"Built lexical index ({len(docs['ids'])} chunks)")
+    return lexical_index
+
+def invalidate_lexical_index():
+    global lexical_index
+    lexical_index = None
+
 # Pydantic models
 class SearchQuery(BaseModel):
     query: str
     max_results: Optional[int] = MAX_SEARCH_RESULTS
+    mode: Optional[str] = Field(None, pattern="^(vector|hybrid|auto|lexical)$")
 
 class SearchResult(BaseModel):
     content: str
@@ -141,11 +177,11 @@ def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVE
     
     return chunks
 
-def get_embeddings(texts: List[str]) -> List[List[float]]:
+def compute_embeddings(texts: List[str]) -> List[List[float]]:
     """Get embeddings from OpenAI"""
     try:
         response = openai_client.embeddings.create(
-            model="text-embedding-3-small",
+            model=EMBEDDING_MODEL,
             input=texts
         )
         return [item.embedding for item in response.data]
@@ -153,6 +189,20 @@ def get_embeddings(texts: List[str]) -> List[List[float]]:
         logger.error(f"Error getting embeddings: {e}")
         raise
 
+def get_embeddings(texts: List[str]) -> List[List[float]]:
+    """Get embeddings, only calling OpenAI for texts not in the embedding cache"""
+    return embedding_cache.embed(texts, compute_embeddings)
+
+# Coalesces query embeddings from concurrent /search requests
+embedding_batcher = EmbeddingBatcher(get_embeddings, EMBEDDING_BATCH_WINDOW_MS, EMBEDDING_BATCH_MAX_SIZE)
+
+def fuse_results(rankings: List[List[Dict]], max_results: int) -> List[SearchResult]:
+    """Merge ranked hits with reciprocal rank fusion; score is the normalized RRF score"""
+    return [
+        SearchResult(content=hit["text"], metadata=hit["metadata"], score=score)
+        for hit, score in fuse_hits(rankings, max_results)
+    ]
+
 # API endpoints
 @app.get("/")
 async def root():
@@ -185,6 +235,16 @@ async def health_check():
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Health check failed: {str(e)}")
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Embedding cache hit/miss counters"""
+    return embedding_cache.stats()
+
+@app.get("/embeddings/batches")
+async def embedding_batch_stats():
+    """Query embedding batch counters and batch-size histogram"""
+    return embedding_batcher.stats()
+
 @app.post("/upload", response_model=DocumentInfo)
 async def upload_document(file: UploadFile = File(...)):
     """Upload and process a Word document"""
@@ -238,6 +298,8 @@ async def upload_document(file: UploadFile = File(...)):
             ids=ids
         )
         
+        invalidate_lexical_index()
+
         # Clean up temporary file
         file_path.unlink()
         
@@ -264,28 +326,47 @@ async def search_documents(query: SearchQuery):
         except:
             raise HTTPException(status_code=404, detail="No documents found. Please upload documents first.")
         
-        # Get query embedding
-        query_embedding = get_embeddings([query.query])[0]
+        mode = query.mode or SEARCH_MODE
+        lexical_hits = []
+        if mode != "vector":
+            lexical_hits = get_lexical_index(collection).search(query.query, query.max_results * 2)
+            if mode == "lexical" or (mode == "auto" and BM25Index.is_confident(query.query, lexical_hits, query.max_results)):
+                # Exact ingredient/recipe names: answer without an embedding call
+                return SearchResponse(
+                    results=fuse_results([lexical_hits], query.max_results),
+                    query=query.query,
+                    total_results=min(len(lexical_hits), query.max_results)
+                )
+
+        # Get query embedding (batched with concurrent searches)
+        query_embedding = await embedding_batcher.embed(query.query)
         
         # Search ChromaDB
         results = collection.query(
             query_embeddings=[query_embedding],
-            n_results=query.max_results
+            n_results=query.max_results if mode == "vector" else query.max_results * 2
         )
         
         # Format results
         search_results = []
         if results['documents'] and results['documents'][0]:
-            for i, (doc, metadata, distance) in enumerate(zip(
-                results['documents'][0],
-                results['metadatas'][0],
-                results['distances'][0]
-            )):
-                search_results.append(SearchResult(
-                    content=doc,
-                    metadata=metadata,
-                    score=1 - distance  # Convert distance to similarity score
-                ))
+            if mode != "vector":
+                vector_hits = [
+                    {"id": doc_id, "text": doc, "metadata": metadata}
+                    for doc_id, doc, metadata in zip(results['ids'][0], results['documents'][0], results['metadatas'][0])
+                ]
+                search_results = fuse_results([vector_hits, lexical_hits], query.max_results)
+            else:
+                for i, (doc, metadata, distance) in enumerate(zip(
+                    results['documents'][0],
+                    results['metadatas'][0],
+                    results['distances'][0]
+                )):
+                    search_results.append(SearchResult(
+                        content=doc,
+                        metadata=metadata,
+                        score=1 - distance  # Convert distance to similarity score
+                    ))
         
         return SearchResponse(
             results=search_results,
@@ -300,10 +381,11 @@ async def search_documents(query: SearchQuery):
 @app.get("/search")
 async def search_documents_get(
     q: str = Query(..., description="Search query"),
-    max_results: int = Query(MAX_SEARCH_RESULTS, description="Maximum number of results")
+    max_results: int = Query(MAX_SEARCH_RESULTS, description="Maximum number of results"),
+    mode: Optional[str] = Query(None, description="vector, hybrid, auto or lexical")
 ):
     """Search documents via GET request (for n8n compatibility)"""
-    query = SearchQuery(query=q, max_results=max_results)
+    query = SearchQuery(query=q, max_results=max_results, mode=mode)
     return await search_documents(query)
 
 @app.get("/documents")
@@ -357,6 +439,7 @@ async def delete_document(filename: str):
         
         # Delete documents
         collection.delete(ids=ids_to_delete)
+        invalidate_lexical_index()
         
         return {
             "message": f"Deleted document: {filename}",
@@ -373,6 +456,7 @@ async def clear_all_documents():
     try:
         chroma_client.delete_collection(COLLECTION_NAME)
         chroma_client.create_collection(COLLECTION_NAME)
+        invalidate_lexical_index()
         
         return {"message": "All documents cleared"}
         
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga de /search en la RAG API
+Mide throughput y latencia con distintos niveles de concurrencia
+"""
+
+import time
+import asyncio
+import argparse
+import statistics
+from typing import List, Dict
+
+import httpx
+
+QUERIES = [
+    "desayuno proteico",
+    "plan alimentario bajar peso",
+    "merluza al horno",
+    "colación alta en fibra",
+    "cena liviana con verduras",
+    "reemplazo de carbohidratos",
+    "almuerzo con pollo y batata",
+    "merienda con yogur y avena"
+]
+
+async def run_level(client: httpx.AsyncClient, url: str, concurrency: int, total: int, use_cache: bool) -> Dict:
+    """Envía ``total`` búsquedas con ``concurrency`` requests en vuelo"""
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            payload = {"query": QUERIES[i % len(QUERIES)], "n_results": 5, "use_cache": use_cache}
+            started = time.perf_counter()
+            try:
+                response = await client.post(f"{url}/search", json=payload)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0.0
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test for the RAG API /search endpoint")
+    parser.add_argument("--url", default="http://localhost:8000", help="RAG API base URL")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--use-cache", action="store_true", help="Allow cached results (off by default)")
+    args = parser.parse_args()
+
+    url = args.url.rstrip('/')
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+        # Warm up connections, the embedding model and the index
+        await run_level(client, url, 1, len(QUERIES), args.use_cache)
+
+        baseline = None
+        print(f"{'conc':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7} {'speedup':>8}")
+        for concurrency in args.concurrency:
+            result = await run_level(client, url, concurrency, args.requests, args.use_cache)
+            baseline = baseline or result["throughput"]
+            print(f"{concurrency:>5} {result['throughput']:>9.1f} {result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} "
+                  f"{result['errors']:>7} {result['throughput'] / baseline if baseline else 0:>7.2f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
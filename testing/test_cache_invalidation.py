@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Pruebas de invalidación de caches entre generaciones del índice
+Usa un Redis de prueba (por defecto la base 15, que se vacía al empezar) y una copia
+de rag-system/data en un directorio temporal (correr con las dependencias de
+rag-system/requirements.txt y del API, p. ej. dentro del contenedor rag)
+"""
+
+import os
+import sys
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+
+import redis.asyncio as redis_asyncio
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / "rag-system" / "scripts"))
+sys.path.append(str(ROOT / "rag-system" / "api"))
+
+from rag_indexer import NutritionRAGIndexer
+from search_cache import SearchResultCache, encode_entry, decode_entry
+from response_cache import ResponseCache, listen_for_invalidations
+from semantic_cache import SemanticCache
+from context_cache import ContextCache, profile_key
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class CacheInvalidationTester:
+    """Test suite for search, response, semantic and context cache invalidation"""
+
+    def __init__(self, redis_url: str):
+        self.redis = redis_asyncio.Redis(connection_pool=redis_asyncio.ConnectionPool.from_url(
+            redis_url, decode_responses=True
+        ))
+        self.redis_binary = redis_asyncio.Redis(connection_pool=redis_asyncio.ConnectionPool.from_url(redis_url))
+        self.search_cache = SearchResultCache(self.redis, self.redis_binary)
+
+    def check(self, condition: bool, message: str) -> bool:
+        if condition:
+            logger.info(f"✅ {message}")
+        else:
+            logger.error(f"❌ {message}")
+        return condition
+
+    async def reset(self):
+        await self.redis.flushdb()
+        self.search_cache = SearchResultCache(self.redis, self.redis_binary)
+
+    async def test_entry_encoding(self) -> bool:
+        """Entries round-trip with and without compression"""
+        logger.info("🔍 Testing search cache entry encoding...")
+        hits = [(f"recetas_{i}_chunk_{i}", i / 10) for i in range(40)]
+        results = []
+        for compress_bytes in (1 << 20, 0):
+            raw = encode_entry(hits, 7, 123.5, compress_bytes=compress_bytes)
+            results.append(self.check(decode_entry(raw) == (hits, 7, 123.5),
+                                      f"round-trip ({'compressed' if not compress_bytes else 'plain'}, {len(raw)} bytes)"))
+        results.append(self.check(decode_entry(b'{"results": []}') is None, "foreign format is a miss"))
+        return all(results)
+
+    async def test_targeted_invalidation(self) -> bool:
+        """Only entries referencing changed chunks are dropped; the rest carry over once swept"""
+        logger.info("🔍 Testing targeted search cache invalidation...")
+        await self.reset()
+        await self.search_cache.put("q1", [("a", 0.1), ("b", 0.2)], 1)
+        await self.search_cache.put("q2", [("c", 0.1), ("d", 0.2)], 1)
+
+        unswept = await self.search_cache.get("q2", 2)
+        invalidated = await self.search_cache.invalidate(["a"], 2)
+        return all([
+            self.check(unswept is None, "old entry not served before generation 2 is swept"),
+            self.check(invalidated == 1, "one entry invalidated"),
+            self.check(await self.search_cache.get("q1", 2) is None, "entry with a changed chunk dropped"),
+            self.check(await self.search_cache.get("q2", 2) == ([("c", 0.1), ("d", 0.2)], True),
+                       "untouched entry served for generation 2"),
+            self.check(await self.search_cache.get("q2", 3) is None, "not served for an unswept generation 3")
+        ])
+
+    async def test_full_invalidation(self) -> bool:
+        """Unknown changes retire every entry from earlier generations"""
+        logger.info("🔍 Testing full search cache invalidation...")
+        await self.reset()
+        await self.search_cache.put("q1", [("a", 0.1)], 1)
+        await self.search_cache.invalidate([], 2)
+        await self.search_cache.put("q2", [("b", 0.1)], 2)
+        await self.search_cache.invalidate(None, 3)
+        await self.search_cache.put("q3", [("c", 0.1)], 3)
+        await self.search_cache.invalidate([], 4)
+
+        stats = await self.search_cache.stats()
+        return all([
+            self.check(await self.search_cache.get("q1", 4) is None, "generation 1 entry retired"),
+            self.check(await self.search_cache.get("q2", 4) is None, "generation 2 entry retired"),
+            self.check(await self.search_cache.get("q3", 4) is not None, "generation 3 entry carried over"),
+            self.check((stats["swept_generation"], stats["valid_since"]) == (4, 3), "swept 4, valid since 3")
+        ])
+
+    async def test_response_cache_broadcast(self) -> bool:
+        """In-process response bodies follow the invalidations published by any process"""
+        logger.info("🔍 Testing response cache invalidation broadcast...")
+        await self.reset()
+        response_cache = ResponseCache(max_bytes=1 << 20, ttl=60)
+        listener = asyncio.create_task(listen_for_invalidations(self.redis, response_cache))
+        try:
+            await asyncio.sleep(0.2)
+            for key in ("q1", "q2", "q3"):
+                response_cache.put(key, b'{"results": []}', 1)
+            early = response_cache.get("q3", 2)
+
+            await self.search_cache.put("q1", [("a", 0.1)], 1)
+            await self.search_cache.invalidate(["a"], 2)
+            for _ in range(50):
+                if response_cache.swept_generation >= 2:
+                    break
+                await asyncio.sleep(0.05)
+
+            results = [
+                self.check(early is None, "old body not served before the broadcast"),
+                self.check(response_cache.swept_generation == 2, "broadcast received"),
+                self.check(response_cache.get("q1", 2) is None, "invalidated body dropped"),
+                self.check(response_cache.get("q2", 2) is not None, "untouched body served for generation 2")
+            ]
+
+            await self.search_cache.invalidate(None, 3)
+            for _ in range(50):
+                if response_cache.swept_generation >= 3:
+                    break
+                await asyncio.sleep(0.05)
+            results.append(self.check(response_cache.stats()["entries"] == 0, "full invalidation empties the cache"))
+        finally:
+            listener.cancel()
+            await asyncio.gather(listener, return_exceptions=True)
+        return all(results)
+
+    async def test_semantic_cache(self) -> bool:
+        """The semantic cache never answers for another generation"""
+        logger.info("🔍 Testing semantic cache...")
+        semantic = SemanticCache(max_entries=8, threshold=0.95)
+        semantic.store([1.0, 0.0, 0.0], ("recetas",), 3, [{"id": "a"}], 1)
+        hit = semantic.lookup([0.99, 0.01, 0.0], ("recetas",), 3, 1)
+        miss = semantic.lookup([0.99, 0.01, 0.0], ("recetas",), 3, 2)
+        semantic.store([0.0, 1.0, 0.0], ("recetas",), 3, [{"id": "b"}], 1)
+        return all([
+            self.check(hit == [{"id": "a"}], "semantic hit within the generation"),
+            self.check(miss is None and semantic.stats()["entries"] == 0, "semantic cache reset on generation 2"),
+            self.check(semantic.stats()["entries"] == 0, "results from generation 1 not stored after the reset")
+        ])
+
+    async def test_context_cache(self) -> bool:
+        """Memoized /context answers are rebuilt for a new generation"""
+        logger.info("🔍 Testing context cache...")
+        context = ContextCache(max_entries=8, ttl=60)
+        key = profile_key(1, "bajar de peso", "moderada", "sin lactosa")
+        context.put(key, "contexto", 1)
+        return all([
+            self.check(context.get(key, 1) == "contexto", "context hit within the generation"),
+            self.check(context.get(key, 2) is None, "context rebuilt for generation 2"),
+            self.check(context.get(key, 1) is None, "stale context dropped")
+        ])
+
+    async def test_reindex_invalidation(self, data_source: Path) -> bool:
+        """A real reindex drops exactly the cached searches whose chunks changed"""
+        logger.info("🔍 Testing invalidation after a reindex...")
+        await self.reset()
+        with tempfile.TemporaryDirectory(prefix="rag-test-") as workdir:
+            data_path = Path(workdir) / "data"
+            shutil.copytree(data_source, data_path)
+            (Path(workdir) / "embeddings").mkdir()
+            indexer = NutritionRAGIndexer(str(data_path), str(Path(workdir) / "embeddings"),
+                                          os.getenv("OPENAI_API_KEY", ""), workers=1)
+            indexer.load_and_index_files()
+
+            cached = {}
+            for query in ("avena", "pollo", "merluza", "lentejas"):
+                hits = indexer.search(query, 3, mode="lexical")
+                cached[query] = [(h["id"], h["distance"]) for h in hits]
+                await self.search_cache.put(query, cached[query], indexer.generation)
+
+            metadata = indexer.search("avena", 1, mode="lexical")[0]["metadata"]
+            source = data_path / metadata["category"] / metadata["source"]
+            source.write_text(source.read_text(encoding="utf-8") + "\nVariante con banana.\n", encoding="utf-8")
+            summary = indexer.load_and_index_files()
+            await self.search_cache.invalidate(summary["changed_chunk_ids"], summary["generation"])
+
+            changed = set(summary["changed_chunk_ids"])
+            results = [self.check(summary["generation"] == 2 and bool(changed), f"{len(changed)} chunks changed")]
+            for query, hits in cached.items():
+                expect_kept = not changed.intersection(chunk_id for chunk_id, _ in hits)
+                kept = await self.search_cache.get(query, summary["generation"]) is not None
+                results.append(self.check(kept == expect_kept, f"'{query}' {'kept' if kept else 'dropped'}"))
+            return all(results)
+
+    async def run_all_tests(self, data_source: Path) -> bool:
+        """Run all tests"""
+        logger.info("🧪 Starting cache invalidation test suite")
+        tests = [
+            self.test_entry_encoding(),
+            self.test_targeted_invalidation(),
+            self.test_full_invalidation(),
+            self.test_response_cache_broadcast(),
+            self.test_semantic_cache(),
+            self.test_context_cache(),
+            self.test_reindex_invalidation(data_source)
+        ]
+        failed = []
+        for test in tests:
+            if not await test:
+                failed.append(test.__name__)
+        await self.redis.flushdb()
+
+        logger.info("=" * 50)
+        if failed:
+            logger.error(f"❌ FAILED: {', '.join(failed)}")
+        else:
+            logger.info("🎉 ALL TESTS PASSED!")
+        return not failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Test cache invalidation across index generations")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15", help="Redis database to use (flushed)")
+    parser.add_argument("--data-path", default=str(ROOT / "rag-system" / "data"), help="Knowledge base to copy")
+    args = parser.parse_args()
+
+    tester = CacheInvalidationTester(args.redis_url)
+    success = asyncio.run(tester.run_all_tests(Path(args.data_path)))
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Pruebas de las búsquedas filtradas por metadata
+Indexa una copia de rag-system/data con los backends de Chroma y plano y verifica
+los filtros de recetas y la construcción perezosa del motor plano y el BM25
+(correr con las dependencias de rag-system/requirements.txt, p. ej. dentro del contenedor rag)
+"""
+
+import os
+import sys
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / "rag-system" / "scripts"))
+
+from rag_indexer import NutritionRAGIndexer
+from lexical_index import LEXICAL_FILENAME, matches
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class FilteredSearchTester:
+    """Test suite for metadata-filtered search"""
+
+    def __init__(self, data_source: Path, workdir: Path):
+        self.data_source = data_source
+        self.workdir = workdir
+
+    def check(self, condition: bool, message: str) -> bool:
+        if condition:
+            logger.info(f"✅ {message}")
+        else:
+            logger.error(f"❌ {message}")
+        return condition
+
+    def indexer(self, name: str, backend: str) -> NutritionRAGIndexer:
+        data_path = self.workdir / name / "data"
+        shutil.copytree(self.data_source, data_path)
+        (self.workdir / name / "embeddings").mkdir()
+        indexer = NutritionRAGIndexer(str(data_path), str(self.workdir / name / "embeddings"),
+                                      os.getenv("OPENAI_API_KEY", ""), workers=1, search_backend=backend)
+        indexer.load_and_index_files()
+        return indexer
+
+    def test_filters_chroma(self) -> bool:
+        """Filters applied by Chroma's metadata index"""
+        return self.check_filters("chroma")
+
+    def test_filters_flat(self) -> bool:
+        """Filters resolved with the flat store's bitmaps"""
+        return self.check_filters("flat")
+
+    def check_filters(self, backend: str) -> bool:
+        """Every hit of a filtered search matches its filter"""
+        logger.info(f"🔍 Testing filtered search ({backend} backend)...")
+        indexer = self.indexer(backend, backend)
+        stats = indexer.get_stats()
+        meal_type = max(stats["chunks_per_meal_type"], key=stats["chunks_per_meal_type"].get)
+        results = []
+
+        hits = indexer.search("receta rápida", 5, category_filter="recetas")
+        results.append(self.check(hits and all(h["metadata"]["category"] == "recetas" for h in hits),
+                                  f"category filter ({len(hits)} hits)"))
+
+        hits = indexer.search("receta rápida", 5, meal_type=meal_type)
+        results.append(self.check(hits and all(h["metadata"].get("meal_type") == meal_type for h in hits),
+                                  f"meal_type={meal_type} filter ({len(hits)} hits)"))
+
+        for mode in ("vector", "hybrid", "lexical"):
+            hits = indexer.search("receta rápida", 5, mode=mode, category_filter="recetas", max_prep_minutes=30)
+            results.append(self.check(all(h["metadata"].get("prep_minutes", 31) <= 30 for h in hits),
+                                      f"max_prep_minutes filter, {mode} mode ({len(hits)} hits)"))
+
+        hits = indexer.search("receta rápida", 5, category_filter="no-existe")
+        results.append(self.check(hits == [], "unknown category returns nothing"))
+        return all(results)
+
+    def test_bitmaps_match_metadata(self) -> bool:
+        """The flat store's attribute bitmaps select exactly the rows a metadata scan would"""
+        logger.info("🔍 Testing attribute bitmaps...")
+        indexer = self.indexer("bitmaps", "flat")
+        store = indexer._flat_store(indexer.generation, indexer.collection)
+        wheres = [
+            {"category": "recetas"},
+            {"$and": [{"category": "recetas"}, {"prep_minutes": {"$lte": 30}}]},
+            {"$and": [{"meal_type": "desayuno"}, {"difficulty": "facil"}]},
+            {"meal_type": {"$in": ["cena", "almuerzo"]}}
+        ]
+        results = []
+        for where in wheres:
+            expected = [row for row, meta in enumerate(store.metadatas) if matches(meta, where)]
+            actual = sorted(int(row) for row in store.attributes().rows(where))
+            results.append(self.check(actual == expected, f"{where} ({len(expected)} rows)"))
+        return all(results)
+
+    def test_concurrent_lazy_build(self) -> bool:
+        """Concurrent lexical searches right after a reindex build the flat store and BM25 once"""
+        logger.info("🔍 Testing concurrent lazy build...")
+        indexer = self.indexer("lazy", "chroma")
+        flat_dir = indexer._flat_store_path(indexer.generation)
+        # Built at publish when RAG_SEARCH_MODE isn't "vector"; drop it to take the lazy path
+        shutil.rmtree(flat_dir, ignore_errors=True)
+        indexer._lexical = None
+
+        barrier = threading.Barrier(8)
+        empty = []
+
+        def search():
+            barrier.wait()
+            for _ in range(10):
+                empty.extend(hits for hits in indexer.search_many(["avena", "pollo"], 3, mode="lexical") if not hits)
+
+        threads = [threading.Thread(target=search) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        leftovers = [path.name for path in flat_dir.parent.iterdir() if ".tmp" in path.name]
+        return all([
+            self.check(not empty, "no lexical search came back empty"),
+            self.check((flat_dir / LEXICAL_FILENAME).exists(), "lexical index published with the store"),
+            self.check(not leftovers, "no scratch directories left behind")
+        ])
+
+    def run_all_tests(self) -> bool:
+        """Run all tests"""
+        logger.info("🧪 Starting filtered search test suite")
+        tests = [
+            self.test_filters_chroma,
+            self.test_filters_flat,
+            self.test_bitmaps_match_metadata,
+            self.test_concurrent_lazy_build
+        ]
+        failed = [test.__name__ for test in tests if not test()]
+
+        logger.info("=" * 50)
+        if failed:
+            logger.error(f"❌ FAILED: {', '.join(failed)}")
+        else:
+            logger.info("🎉 ALL TESTS PASSED!")
+        return not failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Test metadata-filtered search")
+    parser.add_argument("--data-path", default=str(ROOT / "rag-system" / "data"), help="Knowledge base to copy")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="rag-test-") as workdir:
+        success = FilteredSearchTester(Path(args.data_path), Path(workdir)).run_all_tests()
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    exit(main())
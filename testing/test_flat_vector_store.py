@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Pruebas del motor vectorial plano (FlatVectorStore)
+Compara la búsqueda exacta contra un cálculo directo con NumPy y contra el backend
+de Chroma sobre una copia de rag-system/data (correr con las dependencias de
+rag-system/requirements.txt, p. ej. dentro del contenedor rag)
+"""
+
+import os
+import sys
+import shutil
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / "rag-system" / "scripts"))
+
+from vector_store import FlatVectorStore
+from rag_indexer import NutritionRAGIndexer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+QUERIES = ["desayuno alto en proteínas", "receta con pollo", "avena", "cena liviana", "legumbres"]
+
+class FlatVectorStoreTester:
+    """Test suite for the exact NumPy flat vector engine"""
+
+    def __init__(self, data_source: Path, workdir: Path):
+        self.data_source = data_source
+        self.workdir = workdir
+
+    def check(self, condition: bool, message: str) -> bool:
+        if condition:
+            logger.info(f"✅ {message}")
+        else:
+            logger.error(f"❌ {message}")
+        return condition
+
+    def test_exact_top_k(self) -> bool:
+        """Top-k ids and cosine distances match a brute-force computation"""
+        logger.info("🔍 Testing exact top-k...")
+        rng = np.random.default_rng(7)
+        embeddings = rng.normal(size=(500, 64)).astype(np.float32)
+        ids = [f"doc_{i}" for i in range(len(embeddings))]
+        metadatas = [{"category": ("recetas", "ingredientes")[i % 2]} for i in range(len(embeddings))]
+        store = FlatVectorStore.build(self.workdir / "random", ids, [f"texto {i}" for i in ids], metadatas,
+                                      embeddings.tolist())
+
+        queries = rng.normal(size=(5, 64)).astype(np.float32)
+        results = store.query(queries.tolist(), n_results=10)
+        normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        checks = []
+        for query, result_ids, distances in zip(queries, results["ids"], results["distances"]):
+            similarities = normalized @ (query / np.linalg.norm(query))
+            expected = np.argsort(-similarities)[:10]
+            checks.append(result_ids == [ids[i] for i in expected] and
+                          np.allclose(distances, 1.0 - similarities[expected], atol=1e-5))
+
+        reopened = FlatVectorStore.load(self.workdir / "random")
+        return all([
+            self.check(all(checks), f"{len(queries)} queries match brute force"),
+            self.check(all(len(row) == 10 for row in results["documents"] + results["metadatas"]),
+                       "documents and metadata returned per hit"),
+            self.check(isinstance(reopened.vectors, np.memmap), "matrix is memory-mapped when reopened"),
+            self.check(reopened.query(queries.tolist(), n_results=10)["ids"] == results["ids"],
+                       "reopened store returns the same results")
+        ])
+
+    def test_edge_cases(self) -> bool:
+        """Empty stores, n_results above the row count and lookups by id"""
+        logger.info("🔍 Testing edge cases...")
+        empty = FlatVectorStore.build(self.workdir / "empty", [], [], [], [])
+        small = FlatVectorStore.build(self.workdir / "small", ["a", "b"], ["uno", "dos"], [{}, {}],
+                                      [[1.0, 0.0], [0.0, 1.0]])
+        return all([
+            self.check(empty.query([[1.0, 0.0]], n_results=3)["ids"] == [[]], "empty store returns no hits"),
+            self.check(small.query([[1.0, 0.0]], n_results=5)["ids"] == [["a", "b"]], "k capped at the row count"),
+            self.check(small.get(ids=["b", "missing"])["documents"] == ["dos"], "get skips unknown ids")
+        ])
+
+    def test_matches_chroma_backend(self) -> bool:
+        """The flat backend returns the same chunks as Chroma for the same index"""
+        logger.info("🔍 Testing flat backend against Chroma...")
+        data_path = self.workdir / "data"
+        shutil.copytree(self.data_source, data_path)
+        api_key = os.getenv("OPENAI_API_KEY", "")
+        chroma = NutritionRAGIndexer(str(data_path), str(self.workdir / "embeddings"), api_key,
+                                     workers=1, search_backend="chroma")
+        chroma.load_and_index_files()
+        flat = NutritionRAGIndexer(str(data_path), str(self.workdir / "embeddings"), api_key,
+                                   workers=1, search_backend="flat")
+
+        results = [self.check(flat.get_stats()["generation"] == chroma.generation, "flat backend follows the generation")]
+        for query in QUERIES:
+            expected = [hit["id"] for hit in chroma.search(query, 3, mode="vector")]
+            actual = [hit["id"] for hit in flat.search(query, 3, mode="vector")]
+            results.append(self.check(actual == expected, f"'{query}' ({len(actual)} hits)"))
+        return all(results)
+
+    def run_all_tests(self) -> bool:
+        """Run all tests"""
+        logger.info("🧪 Starting flat vector store test suite")
+        tests = [
+            self.test_exact_top_k,
+            self.test_edge_cases,
+            self.test_matches_chroma_backend
+        ]
+        failed = [test.__name__ for test in tests if not test()]
+
+        logger.info("=" * 50)
+        if failed:
+            logger.error(f"❌ FAILED: {', '.join(failed)}")
+        else:
+            logger.info("🎉 ALL TESTS PASSED!")
+        return not failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Test the flat vector store")
+    parser.add_argument("--data-path", default=str(ROOT / "rag-system" / "data"), help="Knowledge base to copy")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="rag-test-") as workdir:
+        success = FlatVectorStoreTester(Path(args.data_path), Path(workdir)).run_all_tests()
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    exit(main())
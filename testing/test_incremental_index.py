@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Pruebas del reindexado incremental
+Indexa una copia de rag-system/data en un directorio temporal (correr con las
+dependencias de rag-system/requirements.txt, p. ej. dentro del contenedor rag)
+"""
+
+import os
+import sys
+import shutil
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / "rag-system" / "scripts"))
+
+from rag_indexer import NutritionRAGIndexer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+NEW_RECIPE = (
+    "Budín de zanahoria y avena\n"
+    "Ingredientes: zanahoria rallada 150g, avena 40g, huevo 1 unidad, canela.\n"
+    "Preparación: mezclar todo y hornear 25 minutos a 180 grados.\n"
+)
+
+class IncrementalIndexTester:
+    """Test suite for incremental indexing"""
+
+    def __init__(self, data_source: Path, workdir: Path):
+        self.data_path = workdir / "data"
+        self.embeddings_path = workdir / "embeddings"
+        shutil.copytree(data_source, self.data_path)
+        self.embeddings_path.mkdir()
+        self.indexer = NutritionRAGIndexer(
+            str(self.data_path), str(self.embeddings_path), os.getenv("OPENAI_API_KEY", ""), workers=1
+        )
+
+    def check(self, condition: bool, message: str) -> bool:
+        if condition:
+            logger.info(f"✅ {message}")
+        else:
+            logger.error(f"❌ {message}")
+        return condition
+
+    def test_initial_index(self) -> bool:
+        """Every file is added and the stats match the collection"""
+        logger.info("🔍 Testing initial index...")
+        files = sorted(str(p.relative_to(self.data_path)) for p in self.data_path.rglob("*.txt"))
+        summary = self.indexer.load_and_index_files()
+        stats = self.indexer.get_stats()
+        return all([
+            self.check(summary["added"] == files, f"{len(files)} files added"),
+            self.check(summary["generation"] == 1, "generation 1 published"),
+            self.check(stats["total_chunks"] == self.indexer.collection.count(), "stats match the collection"),
+            self.check(summary["changed_chunk_ids"] == [], "no previous chunks changed")
+        ])
+
+    def test_noop_reindex(self) -> bool:
+        """A reindex without changes keeps the generation"""
+        logger.info("🔍 Testing reindex without changes...")
+        generation = self.indexer.generation
+        summary = self.indexer.load_and_index_files()
+        return all([
+            self.check(not (summary["added"] or summary["changed"] or summary["removed"]), "nothing reported as changed"),
+            self.check(self.indexer.generation == generation, "generation unchanged")
+        ])
+
+    def test_add_change_remove(self) -> bool:
+        """Only touched files are re-chunked and their old chunks are reported"""
+        logger.info("🔍 Testing add, change and remove...")
+        recipes = self.data_path / "recetas"
+        changed_file = sorted(recipes.glob("*.txt"))[0]
+        removed_file = sorted((self.data_path / "ingredientes").glob("*.txt"))[0]
+        removed_ids = [doc_id for doc_id in self.indexer.collection.get(include=[])["ids"]
+                       if doc_id.startswith(removed_file.stem + "_")]
+
+        (recipes / "zz_budin_zanahoria.txt").write_text(NEW_RECIPE, encoding="utf-8")
+        changed_file.write_text(changed_file.read_text(encoding="utf-8") + "\n" + NEW_RECIPE.replace("Budín", "Torta"),
+                                encoding="utf-8")
+        removed_file.unlink()
+
+        generation = self.indexer.generation
+        summary = self.indexer.load_and_index_files()
+        hits = self.indexer.search("budín de zanahoria y avena", 3, mode="lexical")
+        return all([
+            self.check(summary["added"] == ["recetas/zz_budin_zanahoria.txt"], "new file added"),
+            self.check(summary["changed"] == [f"recetas/{changed_file.name}"], "modified file re-chunked"),
+            self.check(summary["removed"] == [f"ingredientes/{removed_file.name}"], "deleted file removed"),
+            self.check(summary["unchanged"] > 0, f"{summary['unchanged']} files copied forward"),
+            self.check(set(removed_ids) <= set(summary["changed_chunk_ids"]), "removed chunks reported as changed"),
+            self.check(self.indexer.generation == generation + 1, "new generation published"),
+            self.check(not any(doc_id in removed_ids for doc_id in self.indexer.collection.get(include=[])["ids"]),
+                       "removed chunks are gone"),
+            self.check(any(hit["metadata"]["source"] == "zz_budin_zanahoria.txt" for hit in hits), "new file is searchable")
+        ])
+
+    def test_empty_data_dir(self) -> bool:
+        """A missing or empty data directory keeps serving the live generation"""
+        logger.info("🔍 Testing empty data directory...")
+        generation, count = self.indexer.generation, self.indexer.collection.count()
+        original = self.indexer.data_path
+        results = []
+        try:
+            for name in ("missing", "empty"):
+                self.indexer.data_path = original.parent / name
+                if name == "empty":
+                    (self.indexer.data_path / "recetas").mkdir(parents=True)
+                    (self.indexer.data_path / "recetas" / "vacio.txt").write_text("", encoding="utf-8")
+                summary = self.indexer.load_and_index_files()
+                results.extend([
+                    self.check(summary["removed"] == [] and self.indexer.generation == generation,
+                               f"{name} data dir: generation {generation} still active"),
+                    self.check(self.indexer.collection.count() == count, f"{name} data dir: {count} chunks still served")
+                ])
+        finally:
+            self.indexer.data_path = original
+        return all(results)
+
+    def run_all_tests(self) -> bool:
+        """Run all tests in order (each one builds on the index left by the previous)"""
+        logger.info("🧪 Starting incremental indexing test suite")
+        tests = [
+            self.test_initial_index,
+            self.test_noop_reindex,
+            self.test_add_change_remove,
+            self.test_empty_data_dir
+        ]
+        failed = [test.__name__ for test in tests if not test()]
+
+        logger.info("=" * 50)
+        if failed:
+            logger.error(f"❌ FAILED: {', '.join(failed)}")
+        else:
+            logger.info("🎉 ALL TESTS PASSED!")
+        return not failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Test incremental indexing")
+    parser.add_argument("--data-path", default=str(ROOT / "rag-system" / "data"), help="Knowledge base to copy")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="rag-test-") as workdir:
+        success = IncrementalIndexTester(Path(args.data_path), Path(workdir)).run_all_tests()
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    exit(main())
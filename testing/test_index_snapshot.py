@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Prueba de ida y vuelta del snapshot del índice
+Indexa una copia de rag-system/data, exporta la generación activa y verifica que una
+réplica que mapea el snapshot responde igual que el primario (correr con las
+dependencias de rag-system/requirements.txt, p. ej. dentro del contenedor rag)
+"""
+
+import os
+import sys
+import shutil
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / "rag-system" / "scripts"))
+
+from rag_indexer import NutritionRAGIndexer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+QUERIES = [
+    ("desayuno alto en proteínas", {}),
+    ("receta con pollo", {"category_filter": "recetas"}),
+    ("avena", {"mode": "lexical"}),
+    ("cena liviana", {"mode": "hybrid", "max_prep_minutes": 30})
+]
+
+class SnapshotTester:
+    """Test suite for exporting and serving index snapshots"""
+
+    def __init__(self, data_source: Path, workdir: Path):
+        self.data_path = workdir / "data"
+        self.snapshot_file = workdir / "snapshot" / "index.snap"
+        shutil.copytree(data_source, self.data_path)
+        (workdir / "embeddings").mkdir()
+        (workdir / "replica").mkdir()
+        api_key = os.getenv("OPENAI_API_KEY", "")
+        self.primary = NutritionRAGIndexer(str(self.data_path), str(workdir / "embeddings"), api_key, workers=1)
+        self.primary.load_and_index_files()
+        self.snapshot_file.parent.mkdir()
+        self.primary.export_snapshot(str(self.snapshot_file))
+        self.replica = NutritionRAGIndexer(str(self.data_path), str(workdir / "replica"), api_key,
+                                           snapshot_path=str(self.snapshot_file))
+
+    def check(self, condition: bool, message: str) -> bool:
+        if condition:
+            logger.info(f"✅ {message}")
+        else:
+            logger.error(f"❌ {message}")
+        return condition
+
+    def test_stats_match(self) -> bool:
+        """The replica serves the primary's generation and stats"""
+        logger.info("🔍 Testing snapshot stats...")
+        primary, replica = self.primary.get_stats(), self.replica.get_stats()
+        return all([
+            self.check(replica["generation"] == primary["generation"], f"generation {primary['generation']}"),
+            self.check(replica["total_chunks"] == primary["total_chunks"], f"{primary['total_chunks']} chunks"),
+            self.check(replica["chunks_per_category"] == primary["chunks_per_category"], "chunks per category"),
+            self.check(replica["snapshot"] == str(self.snapshot_file), "replica reports its snapshot")
+        ])
+
+    def test_search_matches(self) -> bool:
+        """Every query returns the same chunks, texts and metadata on both sides"""
+        logger.info("🔍 Testing snapshot search results...")
+        results = []
+        for query, options in QUERIES:
+            expected = self.primary.search(query, 5, **options)
+            actual = self.replica.search(query, 5, **options)
+            results.append(self.check(
+                [(h["id"], h["text"], h["metadata"]) for h in actual] ==
+                [(h["id"], h["text"], h["metadata"]) for h in expected],
+                f"'{query}' {options or ''} ({len(expected)} hits)"
+            ))
+        return all(results)
+
+    def test_replica_is_read_only(self) -> bool:
+        """A replica refuses to reindex or export"""
+        logger.info("🔍 Testing read-only replica...")
+        results = []
+        for name, call in (("reindex", self.replica.load_and_index_files),
+                           ("export", lambda: self.replica.export_snapshot(str(self.snapshot_file) + ".copy"))):
+            try:
+                call()
+                results.append(self.check(False, f"{name} refused"))
+            except RuntimeError:
+                results.append(self.check(True, f"{name} refused"))
+        return all(results)
+
+    def test_replaced_snapshot(self) -> bool:
+        """Replacing the snapshot file makes the replica serve the new generation"""
+        logger.info("🔍 Testing snapshot replacement...")
+        (self.data_path / "recetas" / "zz_snapshot.txt").write_text(
+            "Tostadas de pan integral con palta y huevo, listas en 10 minutos.\n", encoding="utf-8"
+        )
+        summary = self.primary.load_and_index_files()
+        staged = self.snapshot_file.with_suffix(".tmp")
+        self.primary.export_snapshot(str(staged))
+        os.replace(staged, self.snapshot_file)
+
+        hits = self.replica.search("tostadas con palta", 3, mode="lexical")
+        return all([
+            self.check(self.replica.active_generation() == summary["generation"],
+                       f"replica moved to generation {summary['generation']}"),
+            self.check(any(h["metadata"]["source"] == "zz_snapshot.txt" for h in hits), "new chunk is searchable")
+        ])
+
+    def run_all_tests(self) -> bool:
+        """Run all tests"""
+        logger.info("🧪 Starting snapshot test suite")
+        tests = [
+            self.test_stats_match,
+            self.test_search_matches,
+            self.test_replica_is_read_only,
+            self.test_replaced_snapshot
+        ]
+        failed = [test.__name__ for test in tests if not test()]
+
+        logger.info("=" * 50)
+        if failed:
+            logger.error(f"❌ FAILED: {', '.join(failed)}")
+        else:
+            logger.info("🎉 ALL TESTS PASSED!")
+        return not failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Test index snapshot export and loading")
+    parser.add_argument("--data-path", default=str(ROOT / "rag-system" / "data"), help="Knowledge base to copy")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="rag-test-") as workdir:
+        success = SnapshotTester(Path(args.data_path), Path(workdir)).run_all_tests()
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Pruebas del pipeline de ingesta del indexador
+Verifica que el pool de procesos y los finales de línea CRLF no cambian los chunks
+de una copia de rag-system/data (correr con las dependencias de
+rag-system/requirements.txt, p. ej. dentro del contenedor rag)
+"""
+
+import os
+import sys
+import shutil
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / "rag-system" / "scripts"))
+
+from rag_indexer import NutritionRAGIndexer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class IngestionTester:
+    """Test suite for the parallel ingestion pipeline"""
+
+    def __init__(self, data_source: Path, workdir: Path):
+        self.data_source = data_source
+        self.workdir = workdir
+
+    def check(self, condition: bool, message: str) -> bool:
+        if condition:
+            logger.info(f"✅ {message}")
+        else:
+            logger.error(f"❌ {message}")
+        return condition
+
+    def index(self, name: str, workers: int, newline: bytes = b"\n") -> dict:
+        """Index a copy of the data (with the given line endings); returns chunk id -> text"""
+        data_path = self.workdir / name / "data"
+        shutil.copytree(self.data_source, data_path)
+        if newline != b"\n":
+            for path in data_path.rglob("*.txt"):
+                path.write_bytes(path.read_bytes().replace(b"\r\n", b"\n").replace(b"\n", newline))
+        (self.workdir / name / "embeddings").mkdir()
+
+        indexer = NutritionRAGIndexer(str(data_path), str(self.workdir / name / "embeddings"),
+                                      os.getenv("OPENAI_API_KEY", ""), workers=workers)
+        summary = indexer.load_and_index_files()
+        chunks = indexer.collection.get(include=["documents"])
+        logger.info(f"Indexed {summary['chunks_indexed']} chunks ({name})")
+        return dict(zip(chunks["ids"], chunks["documents"]))
+
+    def test_parallel_matches_serial(self) -> bool:
+        """The process pool produces exactly the chunks of a single worker"""
+        logger.info("🔍 Testing parallel ingestion...")
+        serial = self.index("serial", workers=1)
+        parallel = self.index("parallel", workers=4)
+        return all([
+            self.check(len(serial) > 0, f"{len(serial)} chunks indexed"),
+            self.check(parallel == serial, "same chunk ids and texts with 4 workers")
+        ])
+
+    def test_crlf_files(self) -> bool:
+        """CRLF and CR line endings chunk like LF, as with a text-mode open()"""
+        logger.info("🔍 Testing line endings...")
+        expected = self.index("lf", workers=1)
+        results = []
+        for name, newline in (("crlf", b"\r\n"), ("cr", b"\r")):
+            chunks = self.index(name, workers=1, newline=newline)
+            results.extend([
+                self.check(chunks == expected, f"{name.upper()} files produce the same chunks"),
+                self.check(not any("\r" in text for text in chunks.values()), f"no carriage returns in {name.upper()} chunks")
+            ])
+        return all(results)
+
+    def run_all_tests(self) -> bool:
+        """Run all tests"""
+        logger.info("🧪 Starting ingestion test suite")
+        tests = [
+            self.test_parallel_matches_serial,
+            self.test_crlf_files
+        ]
+        failed = [test.__name__ for test in tests if not test()]
+
+        logger.info("=" * 50)
+        if failed:
+            logger.error(f"❌ FAILED: {', '.join(failed)}")
+        else:
+            logger.info("🎉 ALL TESTS PASSED!")
+        return not failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Test the indexer ingestion pipeline")
+    parser.add_argument("--data-path", default=str(ROOT / "rag-system" / "data"), help="Knowledge base to copy")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="rag-test-") as workdir:
+        success = IngestionTester(Path(args.data_path), Path(workdir)).run_all_tests()
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    exit(main())
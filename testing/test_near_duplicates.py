@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Pruebas del colapso de chunks casi duplicados al indexar
+Indexa una copia de rag-system/data con recetas copiadas dentro de la misma categoría
+y en otra (correr con las dependencias de rag-system/requirements.txt, p. ej. dentro del contenedor rag)
+"""
+
+import os
+import sys
+import shutil
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / "rag-system" / "scripts"))
+
+from rag_indexer import NutritionRAGIndexer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class NearDuplicateTester:
+    """Test suite for near-duplicate collapsing"""
+
+    def __init__(self, data_source: Path, workdir: Path):
+        self.data_path = workdir / "data"
+        shutil.copytree(data_source, self.data_path)
+        (workdir / "embeddings").mkdir()
+        self.indexer = NutritionRAGIndexer(str(self.data_path), str(workdir / "embeddings"),
+                                           os.getenv("OPENAI_API_KEY", ""), workers=1)
+        self.indexer.load_and_index_files()
+        self.source = sorted((self.data_path / "recetas").glob("*.txt"))[-1]
+        self.query = self.source.read_text(encoding="utf-8")[:200]
+        self.copy_name = f"zz_copia_{self.source.name}"
+
+    def check(self, condition: bool, message: str) -> bool:
+        if condition:
+            logger.info(f"✅ {message}")
+        else:
+            logger.error(f"❌ {message}")
+        return condition
+
+    def test_same_category_collapsed(self) -> bool:
+        """A copy in the same category is stored once and credited to both files"""
+        logger.info("🔍 Testing same-category copies...")
+        chunks_before = self.indexer.collection.count()
+        shutil.copy(self.source, self.data_path / "recetas" / self.copy_name)
+        summary = self.indexer.load_and_index_files()
+        stats = self.indexer.get_stats()
+        hits = self.indexer.search(self.query, 3, category_filter="recetas")
+        return all([
+            self.check(summary.get("duplicates_collapsed", 0) > 0, f"{summary.get('duplicates_collapsed')} chunks collapsed"),
+            self.check(self.indexer.collection.count() == chunks_before, "collection size unchanged"),
+            self.check(stats["duplicate_chunks"] == summary["duplicates_collapsed"] and summary["bytes_saved"] > 0,
+                       f"stats report {summary['bytes_saved']} bytes saved"),
+            self.check(any(self.copy_name in h["metadata"].get("duplicate_sources", []) for h in hits),
+                       "canonical chunk lists the collapsed copy")
+        ])
+
+    def test_other_category_kept(self) -> bool:
+        """A copy in another category is not collapsed, so its category filter still finds it"""
+        logger.info("🔍 Testing copies in another category...")
+        (self.data_path / "colaciones").mkdir(exist_ok=True)
+        shutil.copy(self.source, self.data_path / "colaciones" / self.source.name)
+        self.indexer.load_and_index_files()
+        hits = self.indexer.search(self.query, 3, category_filter="colaciones")
+        return self.check(hits and all(h["metadata"]["category"] == "colaciones" for h in hits),
+                          f"copy found with category_filter=colaciones ({len(hits)} hits)")
+
+    def test_canonical_removed(self) -> bool:
+        """Removing the file that held the canonical chunks re-chunks the collapsed copy"""
+        logger.info("🔍 Testing removal of the canonical file...")
+        self.source.unlink()
+        summary = self.indexer.load_and_index_files()
+        hits = self.indexer.search(self.query, 3, category_filter="recetas")
+        return all([
+            self.check(f"recetas/{self.copy_name}" in summary["changed"], "collapsed copy re-chunked"),
+            self.check(any(h["metadata"]["source"] == self.copy_name for h in hits), "copy's content still searchable")
+        ])
+
+    def run_all_tests(self) -> bool:
+        """Run all tests in order (each one builds on the index left by the previous)"""
+        logger.info("🧪 Starting near-duplicate test suite")
+        tests = [
+            self.test_same_category_collapsed,
+            self.test_other_category_kept,
+            self.test_canonical_removed
+        ]
+        failed = [test.__name__ for test in tests if not test()]
+
+        logger.info("=" * 50)
+        if failed:
+            logger.error(f"❌ FAILED: {', '.join(failed)}")
+        else:
+            logger.info("🎉 ALL TESTS PASSED!")
+        return not failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Test near-duplicate collapsing")
+    parser.add_argument("--data-path", default=str(ROOT / "rag-system" / "data"), help="Knowledge base to copy")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="rag-test-") as workdir:
+        success = NearDuplicateTester(Path(args.data_path), Path(workdir)).run_all_tests()
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    exit(main())